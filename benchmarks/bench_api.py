@@ -0,0 +1,148 @@
+"""
+Load test for the HTTP/JSON API against localhost.
+
+Starts an ApiServer on a fresh database with synthetic items in a separate
+process, then runs client threads, each on its own kept-alive connection,
+for a fixed time. Each scenario reports requests/sec and p50/p90/p99
+latency. Scenarios:
+- item: GET /items/<id> on random items
+- list: GET /items pages
+- list-304: conditional GET /items pages
+- stock: POST /items/<id>/stock
+- mixed: 80% item, 15% list, 5% stock
+
+Run with:
+python benchmarks/bench_api.py [--items N] [--clients N] [--seconds S] [--scenarios item list ...]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from classes.apiServer import ApiServer
+from database.databaseService import DatabaseService
+from enums.accountPermission import AccountPermission
+
+SCENARIOS = ["item", "list", "list-304", "stock", "mixed"]
+
+
+def serve(database_file: str, items: int, ready) -> None:
+    """Fill the database and serve it, telling the parent the port once listening."""
+    db_service = DatabaseService(database_file)
+    db_service.items.add_items(((f"Part {n}", 1 + n % 2, 1_000_000) for n in range(items)), chunk_size=5000)
+    server = ApiServer(("127.0.0.1", 0), db_service)
+    # A cheap hash keeps the login out of the measurements
+    server.auth.n = 2 ** 8
+    server.auth.create_account("bench", "password", AccountPermission.WRITE)
+    ready.send(server.server_address[1])
+    server.serve_forever()
+
+
+def login(port: int) -> str:
+    """Log in once for all clients, logins are rate limited per username."""
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    connection.request("POST", "/login", json.dumps({"username": "bench", "password": "password"}))
+    token = json.loads(connection.getresponse().read())["token"]
+    connection.close()
+    return token
+
+
+def client(port: int, token: str, scenario: str, items: int, deadline: float, seed: int,
+           latencies: list[float], errors: list[int]) -> None:
+    """Send requests of a scenario on one connection until the deadline."""
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    headers = {"Authorization": f"Bearer {token}"}
+    # ETag of each page seen, for the conditional scenario
+    tags: dict[str, str] = {}
+    pages = max(1, items // 100)
+    while time.perf_counter() < deadline:
+        kind = scenario
+        if scenario == "mixed":
+            roll = rng.random()
+            kind = "item" if roll < 0.8 else "list" if roll < 0.95 else "stock"
+        body = None
+        request_headers = headers
+        if kind == "item":
+            method, path = "GET", f"/items/{rng.randint(1, items)}"
+        elif kind in ("list", "list-304"):
+            method, path = "GET", f"/items?after_id={rng.randrange(pages) * 100}&limit=100"
+            if kind == "list-304" and path in tags:
+                request_headers = {**headers, "If-None-Match": tags[path]}
+        else:
+            method, path = "POST", f"/items/{rng.randint(1, items)}/stock"
+            body = json.dumps({"quantity_delta": rng.choice((-1, 1))})
+        start = time.perf_counter()
+        connection.request(method, path, body, request_headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status not in (200, 304):
+            errors.append(response.status)
+        if kind == "list-304":
+            tags[path] = response.headers["ETag"]
+    connection.close()
+
+
+def run(port: int, token: str, scenario: str, items: int, clients: int, seconds: float) -> dict[str, float]:
+    """Run one scenario with concurrent clients and summarise the latencies."""
+    latencies: list[float] = []
+    errors: list[int] = []
+    deadline = time.perf_counter() + seconds
+    threads = [
+        threading.Thread(target=client, args=(port, token, scenario, items, deadline, seed, latencies, errors))
+        for seed in range(clients)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "requests_per_sec": len(latencies) / elapsed,
+        "p50_ms": percentiles[49] * 1000,
+        "p90_ms": percentiles[89] * 1000,
+        "p99_ms": percentiles[98] * 1000,
+        "errors": len(errors),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--clients", type=int, default=8, help="concurrent kept-alive connections")
+    parser.add_argument("--seconds", type=float, default=5, help="duration of each scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    args = parser.parse_args()
+
+    context = get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        receiver, sender = context.Pipe(duplex=False)
+        # The server gets its own process, so the clients do not share its interpreter lock
+        server = context.Process(target=serve, args=(os.path.join(directory, "bench.db"), args.items, sender), daemon=True)
+        server.start()
+        port = receiver.recv()
+        token = login(port)
+        try:
+            print(f"{args.items:,} items, {args.clients} clients, {args.seconds:g}s per scenario")
+            print("=" * 50)
+            print(f"{'scenario':<10} {'req/s':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'errors':>7}")
+            for scenario in args.scenarios:
+                stats = run(port, token, scenario, args.items, args.clients, args.seconds)
+                print(f"{scenario:<10} {stats['requests_per_sec']:9.0f} {stats['p50_ms']:8.2f} "
+                      f"{stats['p90_ms']:8.2f} {stats['p99_ms']:8.2f} {stats['errors']:7d}")
+        finally:
+            server.terminate()
+            server.join()
@@ -0,0 +1,71 @@
+"""
+Benchmark of the SQLite and in-memory storage backends.
+
+Fills each backend with the same synthetic items and times single
+operations on random items: get_item, get_item_by_name, a 100 item page,
+a two word search and adjust_stock. The memory backend journals its writes
+to a snapshot file like it would in use, without fsync.
+
+Run with: python benchmarks/bench_backends.py [--items N] [--operations N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database.databaseService import DatabaseService
+from database.memoryDatabaseService import MemoryDatabaseService
+
+
+def operations(db, items: int, rng: random.Random) -> dict:
+    """Operation name -> function running it once on a random item."""
+    return {
+        "get_item": lambda: db.items.get_item(rng.randint(1, items)),
+        "get_item_by_name": lambda: db.items.get_item_by_name(f"part {rng.randrange(items)} m8"),
+        "page(100)": lambda: db.items.page(rng.randrange(items), 100),
+        "search(2 words)": lambda: db.items.search(f"part {rng.randrange(items)}", 20),
+        "adjust_stock": lambda: db.items.adjust_stock(rng.randint(1, items), rng.choice((-1, 1))),
+    }
+
+
+def measure(run, count: int) -> float:
+    """Microseconds per call of `run`, over `count` calls."""
+    start = time.perf_counter()
+    for _ in range(count):
+        run()
+    return (time.perf_counter() - start) / count * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--operations", type=int, default=20_000, help="calls timed per operation")
+    args = parser.parse_args()
+
+    rows = [(f"Part {n} M8", 1 + n % 2, 1_000_000) for n in range(args.items)]
+    results: dict[str, dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        sqlite = DatabaseService(os.path.join(directory, "bench.db"))
+        memory = MemoryDatabaseService(os.path.join(directory, "bench.json"))
+        for name, db in (("sqlite", sqlite), ("memory", memory)):
+            start = time.perf_counter()
+            db.items.add_items(rows, chunk_size=5000)
+            print(f"{name}: loaded {args.items:,} items in {time.perf_counter() - start:.2f}s")
+            for operation, run in operations(db, args.items, random.Random(1)).items():
+                results.setdefault(operation, {})[name] = measure(run, args.operations)
+        start = time.perf_counter()
+        memory.snapshot()
+        print(f"memory: snapshot in {time.perf_counter() - start:.2f}s, "
+              f"{os.path.getsize(memory.snapshot_file) / 1e6:.1f} MB")
+        sqlite.disconnect()
+        memory.disconnect()
+
+    print("=" * 50)
+    print(f"{'operation':<18} {'sqlite us':>10} {'memory us':>10} {'speedup':>8}")
+    for operation, timings in results.items():
+        print(f"{operation:<18} {timings['sqlite']:10.2f} {timings['memory']:10.2f} "
+              f"{timings['sqlite'] / timings['memory']:7.1f}x")
@@ -0,0 +1,60 @@
+"""
+Import-time benchmark guarding application startup cost.
+
+Runs `python -X importtime` on the application's modules in a fresh
+interpreter, prints the slowest imports and fails if the total exceeds the
+budget or if importing opened a database. Run with:
+python benchmarks/bench_import.py [--budget-ms MS] [--runs N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# main.py only starts the menu under __main__, so importing it measures startup without blocking on input
+IMPORT_CODE = "import sys; sys.path.insert(0, sys.argv[1]); import main"
+
+
+def measure_once(cwd: str) -> dict[str, int]:
+    """Import the application once and return cumulative microseconds per module."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_CODE, ROOT],
+        cwd=cwd, capture_output=True, text=True, check=True,
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        timings[module.strip()] = int(cumulative)
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budget-ms", type=float, default=150.0)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cwd:
+        runs = [measure_once(cwd) for _ in range(args.runs)]
+        created = os.listdir(cwd)
+
+    total_ms = statistics.median(run["main"] for run in runs) / 1000
+    print(f"Importing main: {total_ms:.1f} ms (median of {args.runs}, budget {args.budget_ms:.0f} ms)")
+    print("=" * 50)
+    slowest = sorted(runs[-1].items(), key=lambda timing: timing[1], reverse=True)[:10]
+    for module, cumulative in slowest:
+        print(f"{cumulative / 1000:8.1f} ms  {module}")
+
+    if created:
+        print(f"\nFAIL: importing created {created}, the database must be opened lazily")
+        sys.exit(1)
+    if total_ms > args.budget_ms:
+        print("\nFAIL: import time over budget")
+        sys.exit(1)
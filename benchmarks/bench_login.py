@@ -0,0 +1,52 @@
+"""
+Login throughput benchmark for each scrypt cost setting.
+
+Measures successful logins per second through Authenticator.find_account,
+on one thread and on the shared hashing threads. Run with:
+python benchmarks/bench_login.py [--logins N] [--costs 12 14 16]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from classes.auth import Authenticator
+from database.databaseService import DatabaseService
+from enums.accountPermission import AccountPermission
+
+
+def logins_per_second(auth: Authenticator, logins: int, parallel: bool) -> float:
+    """Log the benchmark account in `logins` times and return the rate."""
+    start = time.perf_counter()
+    if parallel:
+        futures = [auth.submit_find_account("bench", "password") for _ in range(logins)]
+        assert all(future.result() for future in futures)
+    else:
+        for _ in range(logins):
+            assert auth.find_account("bench", "password")
+    return logins / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--costs", type=int, nargs="+", default=[10, 12, 14, 15, 16], help="log2 of scrypt n")
+    args = parser.parse_args()
+
+    threads = os.cpu_count() or 1
+    print(f"Logins per second, {args.logins} logins per setting, {threads} hashing threads")
+    print("=" * 50)
+    print(f"{'scrypt n':>10} {'1 thread':>12} {'pool':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        db_service = DatabaseService(os.path.join(directory, "bench.db"))
+        for cost in args.costs:
+            auth = Authenticator(db_service, n=2 ** cost)
+            db_service.accounts.delete_account(getattr(db_service.accounts.get_account("bench"), "id", 0))
+            auth.create_account("bench", "password", AccountPermission.READ)
+            serial = logins_per_second(auth, args.logins, parallel=False)
+            parallel = logins_per_second(auth, args.logins, parallel=True)
+            print(f"{'2^' + str(cost):>10} {serial:12.1f} {parallel:12.1f}")
+        db_service.disconnect()
@@ -0,0 +1,68 @@
+"""
+Microbenchmark for Item record construction and memory use.
+
+Compares the slotted Item built through the row factory with the previous
+dict-backed layout. Run with: python benchmarks/bench_records.py [--rows N]
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from classes.item import Item
+from database.itemOperations import ItemOperations
+
+
+class DictItem:
+    """Dict-backed item with the same fields, as Item was before __slots__."""
+    def __init__(self, id: int, name: str, category: int, quantity: int, defective_quantity: int = 0):
+        if quantity < 0 or defective_quantity < 0:
+            raise ValueError("Quantity and defective quantity must be non-negative")
+        self.id = id
+        self.name = name
+        self.category = category
+        self.quantity = quantity
+        self.defective_quantity = defective_quantity
+        self.db = None
+
+
+def measure(label: str, build, rows: list[tuple]) -> None:
+    """Build one object per row and report time and memory held per object."""
+    # Time without tracing, which would slow allocation down
+    gc.collect()
+    start = time.perf_counter()
+    objects = [build(row) for row in rows]
+    elapsed = time.perf_counter() - start
+    del objects
+
+    gc.collect()
+    tracemalloc.start()
+    objects = [build(row) for row in rows]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # The list of references is the same for every variant, leave it out
+    per_object = (current - sys.getsizeof(objects)) / len(objects)
+    print(f"{label:<28} {elapsed:8.3f} s  {elapsed / len(rows) * 1e9:8.1f} ns/obj  {per_object:8.1f} B/obj")
+    del objects
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    # Share the strings between variants so only the record overhead is measured
+    names = [f"Item {i}" for i in range(args.rows)]
+    rows = [(i, names[i], 1, i % 100, i % 7) for i in range(args.rows)]
+
+    print(f"Building {args.rows:,} records")
+    print("=" * 70)
+    measure("dict-backed Item(...)", lambda row: DictItem(*row), rows)
+    measure("slotted Item(...)", lambda row: Item(*row), rows)
+    # The factory the item queries use, with no service to bind the items to
+    row_factory = ItemOperations(None)._item_row_factory
+    measure("slotted row factory", lambda row: row_factory(None, row), rows)
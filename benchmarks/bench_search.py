@@ -0,0 +1,62 @@
+"""
+Item search latency benchmark.
+
+Fills a fresh database with generated part names, then times
+ItemOperations.search with the FTS5 index and with the LIKE prefix
+fallback used when SQLite lacks FTS5. Run with:
+python benchmarks/bench_search.py [--items N] [--repeat N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database.databaseService import DatabaseService
+
+SIZES = ["M3", "M4", "M5", "M6", "M8", "M10", "M12", "M16"]
+KINDS = ["Hex Bolt", "Socket Screw", "Nut", "Washer", "Threaded Rod", "Wing Nut", "Rivet", "Anchor"]
+MATERIALS = ["Steel", "Stainless", "Brass", "Nylon", "Zinc Plated"]
+QUERIES = ["m8 hex bolt", "m8", "stainless wing", "rivet 12345", "no such part"]
+
+
+def generated_items(count: int):
+    """Yield `count` distinct (name, category, quantity) rows."""
+    for n in range(count):
+        name = f"{SIZES[n % len(SIZES)]} {KINDS[n // 8 % len(KINDS)]} {MATERIALS[n // 64 % len(MATERIALS)]} {n}"
+        yield (name, 1 + n % 2, n % 100)
+
+
+def latency_ms(db_service: DatabaseService, query: str, repeat: int) -> float:
+    """Median milliseconds of a 20 result search."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        db_service.items.search(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_service = DatabaseService(os.path.join(directory, "bench.db"))
+        start = time.perf_counter()
+        db_service.items.add_items(generated_items(args.items), chunk_size=5000)
+        print(f"Loaded {args.items} items in {time.perf_counter() - start:.1f}s")
+        print("=" * 50)
+        print(f"{'query':<20} {'fts5 ms':>10} {'like ms':>10}")
+        for query in QUERIES:
+            db_service.items.full_text_search = True
+            fts = latency_ms(db_service, query, args.repeat)
+            db_service.items.full_text_search = False
+            like = latency_ms(db_service, query, args.repeat)
+            print(f"{query:<20} {fts:10.2f} {like:10.2f}")
+        db_service.disconnect()
@@ -0,0 +1,164 @@
+"""
+Scaling benchmark suite for ItemOperations, Item and Authenticator.
+
+For each inventory size a fresh database is filled with synthetic items in
+a separate process, then add_item, get_item, get_all_items, update_item, the
+Item stock methods and find_account are timed. Reports ops/sec, p50/p99
+latency and the process's peak RSS, writes the results to JSON and flags
+regressions against a stored baseline. Run with:
+python benchmarks/bench_suite.py [--sizes 1000 100000 1000000] [--ops N]
+    [--output results.json] [--baseline benchmarks/baseline.json] [--write-baseline]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from classes.auth import Authenticator
+from classes.rateLimiter import RateLimiter
+from database.databaseService import DatabaseService
+from enums.accountPermission import AccountPermission
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def summarise(latencies: list[float]) -> dict[str, float]:
+    """Ops/sec and p50/p99 latency in ms of a list of per-call seconds."""
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "count": len(latencies),
+        "ops_per_sec": round(len(latencies) / sum(latencies), 1),
+        "p50_ms": round(percentiles[49] * 1000, 4),
+        "p99_ms": round(percentiles[98] * 1000, 4),
+    }
+
+
+def timed(calls) -> dict[str, float]:
+    """Run each zero-argument callable and summarise their latencies."""
+    latencies = []
+    for call in calls:
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+    return summarise(latencies)
+
+
+def run_size(size: int, ops: int, logins: int, seed: int) -> dict:
+    """Benchmark one inventory size, in its own process so peak RSS is per size."""
+    rng = random.Random(seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        db_service = DatabaseService(os.path.join(directory, "bench.db"))
+        items = db_service.items
+        items.add_items(((f"Part {n}", 1 + n % 2, n % 100, n % 7) for n in range(size)), chunk_size=5000)
+        ids = [rng.randint(1, size) for _ in range(ops)]
+
+        results["add_item"] = timed(lambda n=n: items.add_item(f"New part {n}", 1, 10) for n in range(ops))
+        results["get_item"] = timed(lambda item_id=item_id: items.get_item(item_id) for item_id in ids)
+        # Reads the whole table each time, so a handful of runs is enough
+        results["get_all_items"] = timed(items.get_all_items for _ in range(max(3, min(ops, 1_000_000 // size))))
+        results["update_item"] = timed(
+            lambda item_id=item_id: items.update_item(item_id, f"Part {item_id - 1}", 2, 50, 1) for item_id in ids
+        )
+
+        # Each item gains stock first, so the following methods always succeed
+        records = [items.get_item(item_id) for item_id in ids]
+        results["increase_quantity"] = timed(lambda item=item: item.increase_quantity(2) for item in records)
+        results["decrease_quantity"] = timed(lambda item=item: item.decrease_quantity(1) for item in records)
+        results["mark_defective"] = timed(lambda item=item: item.mark_defective(1) for item in records)
+        results["repair_defective"] = timed(lambda item=item: item.repair_defective(1) for item in records)
+
+        auth = Authenticator(db_service)
+        auth.username_limiter = RateLimiter(capacity=logins, refill_rate=logins)
+        auth.create_account("bench", "password", AccountPermission.READ)
+        results["find_account"] = timed(lambda: auth.find_account("bench", "password") for _ in range(logins))
+        db_service.disconnect()
+
+    # ru_maxrss is in KiB on Linux
+    results["peak_rss_mib"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return results
+
+
+def regressions(results: dict, baseline: dict, tolerance: float, p99_tolerance: float) -> list[str]:
+    """Describe every operation that is slower than the baseline by more than the tolerances.
+
+    Tail latencies of sub-millisecond calls are noisy, so p99 has its own, looser tolerance.
+    """
+    found = []
+    for size, operations in results["sizes"].items():
+        previous_rss = baseline.get("sizes", {}).get(size, {}).get("peak_rss_mib")
+        if previous_rss and operations["peak_rss_mib"] > previous_rss * (1 + tolerance):
+            found.append(f"{size} items: peak RSS {operations['peak_rss_mib']} MiB, baseline {previous_rss}")
+        for name, current in operations.items():
+            previous = baseline.get("sizes", {}).get(size, {}).get(name)
+            if not isinstance(current, dict) or not previous:
+                continue
+            if current["ops_per_sec"] < previous["ops_per_sec"] * (1 - tolerance):
+                found.append(f"{size} items {name}: {current['ops_per_sec']} ops/sec, baseline {previous['ops_per_sec']}")
+            if current["p99_ms"] > previous["p99_ms"] * (1 + p99_tolerance):
+                found.append(f"{size} items {name}: p99 {current['p99_ms']} ms, baseline {previous['p99_ms']}")
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--ops", type=int, default=2000, help="calls per operation")
+    parser.add_argument("--logins", type=int, default=20, help="find_account calls, each costs a scrypt hash")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE, help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before flagging, 0.25 = 25%%")
+    parser.add_argument("--p99-tolerance", type=float, default=1.0, help="allowed p99 increase, 1.0 = twice as slow")
+    parser.add_argument("--write-baseline", action="store_true", help="store these results as the new baseline")
+    args = parser.parse_args()
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "ops": args.ops,
+        "sizes": {},
+    }
+    # A fresh process per size, started clean rather than forked with the previous size's memory
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn"), max_tasks_per_child=1) as executor:
+        for size in args.sizes:
+            results["sizes"][str(size)] = executor.submit(run_size, size, args.ops, args.logins, args.seed).result()
+            operations = results["sizes"][str(size)]
+            print(f"{size:,} items, peak RSS {operations['peak_rss_mib']} MiB")
+            print("=" * 50)
+            print(f"{'operation':<20} {'ops/sec':>10} {'p50 ms':>10} {'p99 ms':>10}")
+            for name, stats in operations.items():
+                if isinstance(stats, dict):
+                    print(f"{name:<20} {stats['ops_per_sec']:10.1f} {stats['p50_ms']:10.3f} {stats['p99_ms']:10.3f}")
+            print()
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.write_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Stored baseline in {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            found = regressions(results, json.load(file), args.tolerance, args.p99_tolerance)
+        if found:
+            print(f"Regressions against {args.baseline}:")
+            for regression in found:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
@@ -0,0 +1,64 @@
+"""
+Write-behind benchmark for Item stock changes.
+
+Runs the same random increase/decrease calls on a fresh database with each
+change committed on its own, then with write-behind batching. Reports stock
+changes/sec, commits/sec and commits per 1000 changes for each. Run with:
+python benchmarks/bench_write_behind.py [--items N] [--changes N] [--synchronous NORMAL|FULL]
+    [--max-pending N] [--max-unflushed-ms MS]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database.databaseService import DatabaseService
+
+
+def run(path: str, args: argparse.Namespace, write_behind: bool) -> tuple[float, int]:
+    """Apply the changes and return the seconds taken, including the final flush, and the commits made."""
+    db_service = DatabaseService(
+        path,
+        synchronous=args.synchronous,
+        write_behind=write_behind,
+        write_behind_max_pending=args.max_pending,
+        max_unflushed_ms=args.max_unflushed_ms,
+    )
+    db_service.items.add_items(((f"Part {n}", 1, 1000) for n in range(args.items)), chunk_size=5000)
+    items = [db_service.items.get_item(item_id) for item_id in range(1, args.items + 1)]
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    for _ in range(args.changes):
+        item = rng.choice(items)
+        if rng.random() < 0.5:
+            item.increase_quantity(1)
+        else:
+            item.decrease_quantity(1)
+    db_service.flush()
+    seconds = time.perf_counter() - start
+    commits = db_service.write_behind.flushes if write_behind else args.changes
+    db_service.disconnect()
+    return seconds, commits
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--changes", type=int, default=20000)
+    parser.add_argument("--synchronous", default="NORMAL", help="SQLite synchronous setting, FULL syncs every commit")
+    parser.add_argument("--max-pending", type=int, default=1000)
+    parser.add_argument("--max-unflushed-ms", type=float, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.changes} stock changes over {args.items} items, synchronous = {args.synchronous}")
+    print("=" * 50)
+    print(f"{'mode':<14} {'changes/s':>10} {'commits/s':>10} {'commits/1k':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, write_behind in (("commit each", False), ("write-behind", True)):
+            seconds, commits = run(os.path.join(directory, f"{name}.db"), args, write_behind)
+            print(f"{name:<14} {args.changes / seconds:10.0f} {commits / seconds:10.1f} {commits * 1000 / args.changes:10.1f}")
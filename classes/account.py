@@ -3,11 +3,28 @@ from enums.accountPermission import AccountPermission
 
 class Account:
     """Account class represents a user account."""
-    def __init__(self, id: int, username: str, password_hash: str, permission: int):
+    __slots__ = ("id", "username", "password_hash", "permission", "kdf", "salt", "kdf_params", "version")
+
+    def __init__(self, id: int, username: str, password_hash: str, permission: int,
+                 kdf: str = "sha256", salt: str | None = None, kdf_params: str | None = None, version: int = 0):
         self.id = id
         self.username = username
         self.password_hash = password_hash
         self.permission = permission
+        # How password_hash was derived, see Authenticator
+        self.kdf = kdf
+        self.salt = salt
+        self.kdf_params = kdf_params
+        # Number of updates of the row when it was read, see AccountOperations.update_password_hash
+        self.version = version
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "Account":
+        """Build an account from an (id, username, password_hash, permission, kdf, salt, kdf_params[, version]) row"""
+        account = cls.__new__(cls)
+        account.id, account.username, account.password_hash, account.permission, account.kdf, account.salt, account.kdf_params = row[:7]
+        account.version = row[7] if len(row) > 7 else 0
+        return account
         
     def __repr__(self) -> str:
         return f"Account(id={self.id}, username='{self.username}', permission={self.permission})"
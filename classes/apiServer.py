@@ -0,0 +1,229 @@
+import hashlib
+import json
+import logging
+import re
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from classes.auth import Authenticator, LoginRateLimitedError
+from classes.item import Item
+from classes.sessionStore import SessionStore
+from database.databaseService import get_db
+from database.storageBackend import StorageService
+from enums.accountPermission import AccountPermission
+
+logger = logging.getLogger(__name__)
+
+WRITE = (AccountPermission.ADMIN, AccountPermission.WRITE)
+
+
+class ApiError(Exception):
+    """Raised by a route to answer with an HTTP error and a JSON message."""
+    def __init__(self, status: HTTPStatus, message: str, headers: dict[str, str] | None = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class ApiServer(ThreadingHTTPServer):
+    """HTTP/JSON API over the inventory, one thread per client connection.
+
+    Clients log in with POST /login and send the returned token as an
+    `Authorization: Bearer` header. Routes:
+
+    GET  /items?after_id=0&limit=100  page of items by ID, with next_after_id
+    GET  /items/<id>                  one item
+    GET  /search?q=...&limit=20       items matching a name search
+    GET  /summary                     quantities per category
+    POST /items/<id>/stock            {"quantity_delta": n, "defective_delta": n}, WRITE or ADMIN only
+    POST /login                       {"username": ..., "password": ...}
+    POST /logout
+
+    Connections are kept alive between requests. Item responses carry an
+    ETag built from the item IDs and versions, so a client repeating a
+    request with If-None-Match gets 304 Not Modified when nothing changed.
+    Each request borrows a connection from the service's pool for each
+    operation, so more clients can stay connected than the pool holds.
+    """
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], db: StorageService | None = None, sessions: SessionStore | None = None):
+        super().__init__(address, ApiRequestHandler)
+        self.db: StorageService = db if db is not None else get_db()
+        self.auth: Authenticator = Authenticator(self.db)
+        self.sessions: SessionStore = sessions if sessions is not None else SessionStore()
+
+
+def etag(items: list[Item]) -> str:
+    """Entity tag of a list of items, which changes with any item's version."""
+    digest = hashlib.blake2b(digest_size=12)
+    for item in items:
+        digest.update(b"%d:%d," % (item.id, item.version))
+    return f'"{digest.hexdigest()}"'
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """Handles the requests of one client connection, see ApiServer."""
+    server: ApiServer
+    # HTTP/1.1 keeps connections open, every response sets Content-Length
+    protocol_version = "HTTP/1.1"
+    # Idle keep-alive connections are closed after this many seconds
+    timeout = 30
+    # Buffer each response and send it in one go once handled, without waiting on Nagle's algorithm
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    # (method, path pattern, handler name, needs a session)
+    routes = [
+        ("GET", re.compile(r"/items"), "list_items", True),
+        ("GET", re.compile(r"/items/(\d+)"), "get_item", True),
+        ("GET", re.compile(r"/search"), "search", True),
+        ("GET", re.compile(r"/summary"), "summary", True),
+        ("POST", re.compile(r"/items/(\d+)/stock"), "adjust_stock", True),
+        ("POST", re.compile(r"/login"), "login", False),
+        ("POST", re.compile(r"/logout"), "logout", True),
+    ]
+
+    def do_GET(self) -> None:
+        self.dispatch("GET")
+
+    def do_POST(self) -> None:
+        self.dispatch("POST")
+
+    def log_message(self, format: str, *args) -> None:
+        # Through logging rather than straight to stderr, so busy servers can turn it off
+        logger.info("%s %s", self.address_string(), format % args)
+
+    def dispatch(self, method: str) -> None:
+        """Route a request and send its JSON response or error."""
+        url = urlsplit(self.path)
+        self.query = parse_qs(url.query)
+        try:
+            # Always read the whole body, so a refused request leaves the connection usable
+            self.body = self.rfile.read(self.content_length())
+            for route_method, pattern, name, needs_session in self.routes:
+                match = pattern.fullmatch(url.path)
+                if match and route_method == method:
+                    self.account = self.authenticate() if needs_session else None
+                    status, body, headers = getattr(self, name)(*match.groups())
+                    break
+            else:
+                raise ApiError(HTTPStatus.NOT_FOUND, "No such route")
+        except ApiError as error:
+            status, body, headers = error.status, {"error": str(error)}, error.headers
+        except Exception:
+            logger.exception("Request %s %s failed", method, self.path)
+            status, body, headers = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal error"}, {}
+        self.respond(status, body, headers)
+
+    def content_length(self) -> int:
+        """Parse the Content-Length header, closing the connection if the body cannot be found."""
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # The rest of the stream cannot be split into requests any more
+            self.close_connection = True
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Content-Length must be a non-negative integer")
+        return length
+
+    def respond(self, status: HTTPStatus, body, headers: dict[str, str]) -> None:
+        """Send a response, with a JSON body unless there is none."""
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self) -> dict:
+        """Parse the request's JSON object body."""
+        try:
+            body = json.loads(self.body or b"{}")
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Body must be JSON")
+        if not isinstance(body, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+        return body
+
+    def parameter(self, name: str, default: int) -> int:
+        """Read a non-negative integer query parameter."""
+        value = self.query.get(name, [str(default)])[0]
+        if not value.isdigit():
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} must be a non-negative integer")
+        return int(value)
+
+    def token(self) -> str | None:
+        """The bearer token sent with the request."""
+        scheme, _, token = self.headers.get("Authorization", "").partition(" ")
+        return token.strip() if scheme.lower() == "bearer" else None
+
+    def authenticate(self):
+        """Return the account of the request's session, or answer 401."""
+        token = self.token()
+        account = self.server.sessions.get(token) if token else None
+        if account is None:
+            raise ApiError(HTTPStatus.UNAUTHORIZED, "Log in first", {"WWW-Authenticate": "Bearer"})
+        return account
+
+    def conditional(self, items: list[Item], body) -> tuple:
+        """Answer 304 if the client already has this version of the items."""
+        tag = etag(items)
+        if tag in (value.strip() for value in self.headers.get("If-None-Match", "").split(",")):
+            return HTTPStatus.NOT_MODIFIED, None, {"ETag": tag}
+        return HTTPStatus.OK, body, {"ETag": tag}
+
+    # Routes, each returns (status, JSON body or None, headers)
+
+    def list_items(self) -> tuple:
+        limit = min(self.parameter("limit", 100), 1000)
+        items = self.server.db.items.page(self.parameter("after_id", 0), limit)
+        next_after_id = items[-1].id if len(items) == limit else None
+        return self.conditional(items, {"items": [item.as_dict() for item in items], "next_after_id": next_after_id})
+
+    def get_item(self, item_id: str) -> tuple:
+        item = self.server.db.items.get_item(int(item_id))
+        if item is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, "No such item")
+        return self.conditional([item], item.as_dict())
+
+    def search(self) -> tuple:
+        items = self.server.db.items.search(self.query.get("q", [""])[0], min(self.parameter("limit", 20), 100))
+        return HTTPStatus.OK, {"items": [item.as_dict() for item in items]}, {}
+
+    def summary(self) -> tuple:
+        totals = self.server.db.items.summary()
+        return HTTPStatus.OK, {str(category): list(values) for category, values in totals.items()}, {}
+
+    def adjust_stock(self, item_id: str) -> tuple:
+        if self.account.permission not in WRITE:
+            raise ApiError(HTTPStatus.FORBIDDEN, "Account may not change stock")
+        body = self.read_json()
+        quantity_delta, defective_delta = body.get("quantity_delta", 0), body.get("defective_delta", 0)
+        if not all(isinstance(delta, int) and not isinstance(delta, bool) for delta in (quantity_delta, defective_delta)):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Deltas must be integers")
+        with self.server.db.acting_as(self.account.id):
+            result = self.server.db.items.adjust_stock(int(item_id), quantity_delta, defective_delta)
+        if result is None:
+            raise ApiError(HTTPStatus.CONFLICT, "Item does not exist or does not hold enough stock")
+        return HTTPStatus.OK, {"quantity": result[0], "defective_quantity": result[1]}, {}
+
+    def login(self) -> tuple:
+        body = self.read_json()
+        if not isinstance(body.get("username"), str) or not isinstance(body.get("password"), str):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "username and password are required")
+        try:
+            account = self.server.auth.find_account(body["username"], body["password"], self.client_address[0])
+        except LoginRateLimitedError as error:
+            raise ApiError(HTTPStatus.TOO_MANY_REQUESTS, str(error), {"Retry-After": str(int(error.retry_after) + 1)})
+        if account is None:
+            raise ApiError(HTTPStatus.UNAUTHORIZED, "Invalid credentials")
+        token = self.server.sessions.create(account)
+        return HTTPStatus.OK, {"token": token, "expires_in": self.server.sessions.ttl, "permission": account.permission}, {}
+
+    def logout(self) -> tuple:
+        self.server.sessions.end(self.token())
+        return HTTPStatus.NO_CONTENT, None, {}
@@ -1,17 +1,162 @@
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from classes.account import Account
+from classes.rateLimiter import RateLimiter
+from database.versionConflictError import VersionConflictError
+
+
+class LoginRateLimitedError(Exception):
+    """Raised when a login is refused because of too many attempts."""
+    def __init__(self, retry_after: float):
+        super().__init__(f"Too many login attempts, try again in {retry_after:.0f} seconds")
+        self.retry_after = retry_after
 
 
 class Authenticator:
-    """Authenticator class handles user authentication."""
-    def __init__(self):
-        pass
+    """Authenticator class handles user authentication.
+
+    Passwords are hashed with salted scrypt. The cost parameters are stored
+    with each account, so they can be raised later without invalidating
+    existing hashes. Accounts still holding an unsalted SHA-256 hash are
+    rehashed the next time they log in.
+
+    Logins are rate limited per username and per source before any hashing
+    or database work. An account is locked out for `lockout_seconds` after
+    `lockout_threshold` wrong passwords in a row, which is persisted so it
+    holds across terminals and restarts.
+    """
+    # scrypt releases the GIL, so threads are enough to use every core
+    _hashing_pool: ThreadPoolExecutor | None = None
+
+    def __init__(self, db=None, n: int = 2 ** 14, r: int = 8, p: int = 1,
+                 lockout_threshold: int = 5, lockout_seconds: float = 300.0):
+        self._db = db
+        self.n = n
+        self.r = r
+        self.p = p
+        self.lockout_threshold = lockout_threshold
+        self.lockout_seconds = lockout_seconds
+        # 5 attempts per username then one every 10 seconds, 20 per source then one a second
+        self.username_limiter = RateLimiter(capacity=5, refill_rate=0.1)
+        self.source_limiter = RateLimiter(capacity=20, refill_rate=1.0)
+        self.failed_logins = 0
+        self.lockouts = 0
+        self.refused_locked = 0
+
+    @property
+    def db(self):
+        """Database service to use, the shared one unless one was injected."""
+        from database.databaseService import get_db
+        return self._db if self._db is not None else get_db()
+
+    @classmethod
+    def hashing_pool(cls) -> ThreadPoolExecutor:
+        """Shared threads that password hashing can be offloaded to."""
+        if cls._hashing_pool is None:
+            cls._hashing_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="password-hash")
+        return cls._hashing_pool
     
     def hash_password(self, password: str) -> str:
-        """Hashes a password using SHA-256."""
-        import hashlib
+        """Hashes a password using SHA-256, as accounts created before scrypt were."""
         return hashlib.sha256(password.encode()).hexdigest()
+
+    def kdf_params(self) -> str:
+        """Encode this authenticator's scrypt cost parameters for storage."""
+        return f"n={self.n},r={self.r},p={self.p}"
+
+    @staticmethod
+    def derive(password: str, salt: str, kdf_params: str) -> str:
+        """Derive a password hash with scrypt using the stored salt and cost parameters."""
+        params = dict((key, int(value)) for key, value in (param.split("=") for param in kdf_params.split(",")))
+        n, r, p = params["n"], params["r"], params["p"]
+        return hashlib.scrypt(
+            password.encode(), salt=bytes.fromhex(salt), n=n, r=r, p=p,
+            maxmem=256 * r * n + 1024 * 1024,
+        ).hex()
+
+    def new_hash(self, password: str) -> tuple[str, str, str]:
+        """Hash a password with a fresh salt, returning (password_hash, salt, kdf_params)."""
+        salt = secrets.token_hex(16)
+        kdf_params = self.kdf_params()
+        return self.derive(password, salt, kdf_params), salt, kdf_params
+
+    def verify(self, account: Account, password: str) -> bool:
+        """Check a password against an account's stored hash in constant time."""
+        if account.kdf == "sha256":
+            candidate = self.hash_password(password)
+        elif account.kdf == "scrypt":
+            candidate = self.derive(password, account.salt, account.kdf_params)
+        else:
+            return False
+        return hmac.compare_digest(candidate.encode(), account.password_hash.encode())
+
+    def create_account(self, username: str, password: str, permission: int) -> Account | None:
+        """Creates an account with a salted scrypt password hash."""
+        password_hash, salt, kdf_params = self.new_hash(password)
+        return self.db.accounts.create_account(username, password_hash, permission, "scrypt", salt, kdf_params)
     
-    def find_account(self, username: str, password: str) -> Account | None:
-        """Finds an account by username and password."""
-        from database.databaseService import db
-        return db.accounts.get_account_by_username(username, self.hash_password(password))
\ No newline at end of file
+    def find_account(self, username: str, password: str, source: str | None = None) -> Account | None:
+        """Finds an account by username and password.
+
+        Raises LoginRateLimitedError if the username or source has made too
+        many attempts, or the account is locked out for this source. Failed
+        logins are counted per source, so one client cannot lock the account
+        out for everyone else.
+        """
+        # The source goes first, so a throttled client cannot spend another user's username tokens
+        if source is not None and not self.source_limiter.allow(source):
+            raise LoginRateLimitedError(self.source_limiter.retry_after(source))
+        if not self.username_limiter.allow(username):
+            raise LoginRateLimitedError(self.username_limiter.retry_after(username))
+
+        account = self.db.accounts.get_account(username)
+        if account is None:
+            # Spend the same time as a real check so unknown usernames can't be told apart
+            self.new_hash(password)
+            self.failed_logins += 1
+            return
+        now = time.time()
+        # Callers naming no source share one lockout
+        lockout_source = source or ""
+        failures = self.db.accounts.get_login_failures(account.id, lockout_source)
+        if failures and failures[1] and failures[1] > now:
+            self.refused_locked += 1
+            raise LoginRateLimitedError(failures[1] - now)
+        if not self.verify(account, password):
+            self.failed_logins += 1
+            if self.db.accounts.record_login_failure(account.id, lockout_source, self.lockout_threshold, self.lockout_seconds, now):
+                self.lockouts += 1
+            return
+        if failures:
+            self.db.accounts.clear_login_failures(account.id, lockout_source)
+        if account.kdf != "scrypt" or account.kdf_params != self.kdf_params():
+            # Upgrade legacy or outdated hashes now that we know the password
+            password_hash, salt, kdf_params = self.new_hash(password)
+            try:
+                self.db.accounts.update_password_hash(account.id, password_hash, "scrypt", salt, kdf_params, account.version)
+            except VersionConflictError:
+                # The password was changed meanwhile, keep the new one and upgrade on a later login
+                return account
+            account.password_hash, account.kdf, account.salt, account.kdf_params = password_hash, "scrypt", salt, kdf_params
+            account.version += 1
+        return account
+
+    def counters(self) -> dict[str, int]:
+        """Return login counters, including both rate limiters'."""
+        counters = {
+            "failed_logins": self.failed_logins,
+            "lockouts": self.lockouts,
+            "refused_locked": self.refused_locked,
+        }
+        for name, limiter in (("username", self.username_limiter), ("source", self.source_limiter)):
+            for key, value in limiter.stats().items():
+                counters[f"{name}_{key}"] = value
+        return counters
+
+    def submit_find_account(self, username: str, password: str, source: str | None = None) -> Future:
+        """Run find_account on the hashing threads, returning a Future of the account."""
+        return self.hashing_pool().submit(self.find_account, username, password, source)
@@ -0,0 +1,264 @@
+import json
+import random
+import sqlite3
+import sys
+import time
+from typing import IO, Iterable, Iterator
+from classes.account import Account
+from classes.auth import Authenticator, LoginRateLimitedError
+from classes.item import Item
+from database.databaseService import get_db
+from database.storageBackend import StorageService
+from database.retry import is_locked_error
+from database.versionConflictError import VersionConflictError
+from enums.accountPermission import AccountPermission
+from enums.category import Category
+
+# Permission levels allowed to run each command, matching the menu screens
+READ = (AccountPermission.ADMIN, AccountPermission.WRITE, AccountPermission.READ)
+WRITE = (AccountPermission.ADMIN, AccountPermission.WRITE)
+ADMIN = (AccountPermission.ADMIN,)
+
+
+class BatchRunner:
+    """Runs item and account commands without the menu, for scripts and scanners.
+
+    Commands are JSON objects, one per line, such as
+    {"op": "increase", "id": 3, "amount": 5}. Each one gets a JSON result
+    line {"line": n, "ok": true, "result": ...} or {"line": n, "ok": false,
+    "error": "..."}. A command that fails changes nothing, each one runs
+    in its own nested transaction.
+
+    Commands run as a logged in account with the same permissions as the
+    menu, and are committed in transactions of `group_size` commands. The
+    results of a group are written once it is committed. A group that finds
+    the database locked is run again, and if it still fails the whole group
+    is rolled back and reported as failed.
+    """
+    def __init__(self, account: Account, db: StorageService | None = None, group_size: int = 500):
+        if group_size < 1:
+            raise ValueError("Group size must be at least 1")
+        self.db: StorageService = db if db is not None else get_db()
+        self.auth: Authenticator = Authenticator(self.db)
+        self.account: Account | None = account
+        # Set when the account deletes itself, the runner logs out once the group commits
+        self._logging_out = False
+        self.group_size = group_size
+        # Runs of a group while the database is locked by another writer
+        self.retry_attempts = 5
+        self.retry_delay = 0.05
+        self.commands = 0
+        self.failed = 0
+        # op -> (method, permission levels allowed to run it)
+        self.operations = {
+            "get": (self.get, READ),
+            "list": (self.page, READ),
+            "search": (self.search, READ),
+            "summary": (self.summary, READ),
+            "add": (self.add, WRITE),
+            "update": (self.update, WRITE),
+            "delete": (self.delete, WRITE),
+            "increase": (self.increase, WRITE),
+            "decrease": (self.decrease, WRITE),
+            "mark_defective": (self.mark_defective, WRITE),
+            "repair": (self.repair, WRITE),
+            "create_account": (self.create_account, ADMIN),
+            # Only non-admin accounts can delete themselves, as in the menu
+            "delete_account": (self.delete_account, (AccountPermission.WRITE, AccountPermission.READ)),
+        }
+
+    def run(self, lines: Iterable[str], output: IO[str] = sys.stdout) -> int:
+        """Run every command line, writing a result line for each. Returns the number of failed commands."""
+        for group in self._groups(lines):
+            for result in self.run_group(group):
+                output.write(json.dumps(result) + "\n")
+            output.flush()
+        return self.failed
+
+    def _groups(self, lines: Iterable[str]) -> Iterator[list[tuple[int, str]]]:
+        """Split the non-blank lines into numbered groups of at most `group_size`."""
+        group = []
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            group.append((line_number, line))
+            if len(group) >= self.group_size:
+                yield group
+                group = []
+        if group:
+            yield group
+
+    def run_group(self, group: list[tuple[int, str]]) -> list[dict]:
+        """Run numbered command lines in one transaction and return their results."""
+        attempt = 1
+        while True:
+            results = []
+            self._logging_out = False
+            try:
+                with self.db.transaction(), self.db.acting_as(self.account.id if self.account else None):
+                    for line_number, line in group:
+                        results.append({"line": line_number, **self.run_command(line)})
+                if self._logging_out:
+                    self.account = None
+                break
+            except sqlite3.OperationalError as error:
+                if is_locked_error(error) and attempt < self.retry_attempts:
+                    time.sleep(self.retry_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+                    attempt += 1
+                    continue
+                failure = error
+            except Exception as error:
+                failure = error
+            results = [{"line": line_number, "ok": False, "error": f"Rolled back: {failure}"} for line_number, _ in group]
+            break
+        self.commands += len(results)
+        self.failed += sum(not result["ok"] for result in results)
+        return results
+
+    def run_command(self, line: str) -> dict:
+        """Run one command line and return its result, without the line number."""
+        try:
+            command = json.loads(line)
+            if not isinstance(command, dict):
+                raise ValueError("Command must be a JSON object")
+            operation = self.operations.get(command.get("op"))
+            if operation is None:
+                raise ValueError(f"Unknown op {command.get('op')!r}")
+            method, permissions = operation
+            if not self.account or self._logging_out:
+                raise PermissionError("Not logged in")
+            if self.account.permission not in permissions:
+                raise PermissionError(f"Account '{self.account.username}' may not {command['op']}")
+            # Undoes this command's writes alone if it fails
+            with self.db.transaction():
+                return {"ok": True, "result": method(command)}
+        except KeyError as error:
+            return {"ok": False, "error": f"Missing field {error}"}
+        except (ValueError, TypeError, PermissionError, VersionConflictError) as error:
+            return {"ok": False, "error": str(error)}
+        except sqlite3.Error as error:
+            # The whole group is run again while the database is locked
+            if isinstance(error, sqlite3.OperationalError) and is_locked_error(error):
+                raise
+            return {"ok": False, "error": str(error)}
+
+    @staticmethod
+    def _item(item: Item | None) -> dict | None:
+        """JSON form of an item."""
+        return item.as_dict() if item is not None else None
+
+    @staticmethod
+    def _category(value) -> int:
+        """Accept a category number or name."""
+        if isinstance(value, str) and not value.startswith('__') and value in Category.__dict__:
+            return Category.__dict__[value]
+        if isinstance(value, int) and value in (Category.Parts, Category.Consumables):
+            return value
+        raise ValueError(f"Unknown category {value!r}")
+
+    @staticmethod
+    def _count(command: dict, field: str, default: int | None = None) -> int:
+        """Read a non-negative whole number field."""
+        value = command.get(field, default) if default is not None else command[field]
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise ValueError(f"{field} must be a non-negative integer")
+        return value
+
+    def _version(self, command: dict) -> int | None:
+        """Read the optional version field of a compare-and-swap write."""
+        return self._count(command, "version") if command.get("version") is not None else None
+
+    def _adjust(self, command: dict, quantity_sign: int, defective_sign: int, error: str) -> dict:
+        """Apply a stock movement of `amount` and return the item's new quantities."""
+        amount = self._count(command, "amount")
+        result = self.db.items.adjust_stock(self._count(command, "id"), quantity_sign * amount, defective_sign * amount)
+        if result is None:
+            raise ValueError(error)
+        return {"quantity": result[0], "defective_quantity": result[1]}
+
+    # Command handlers, each takes the command object and returns its JSON result
+
+    def get(self, command: dict) -> dict | None:
+        return self._item(self.db.items.get_item(self._count(command, "id")))
+
+    def page(self, command: dict) -> list[dict]:
+        items = self.db.items.page(self._count(command, "after_id", 0), self._count(command, "limit", 100))
+        return [self._item(item) for item in items]
+
+    def search(self, command: dict) -> list[dict]:
+        return [self._item(item) for item in self.db.items.search(command["query"], self._count(command, "limit", 20))]
+
+    def summary(self, command: dict) -> dict[str, list[int]]:
+        return {str(category): list(totals) for category, totals in self.db.items.summary().items()}
+
+    def add(self, command: dict) -> dict | None:
+        # Validated the same way as items created anywhere else
+        item = Item(None, command["name"], self._category(command["category"]),
+                    self._count(command, "quantity", 0), self._count(command, "defective_quantity", 0))
+        self.db.items.add_item(item.name, item.category, item.quantity, item.defective_quantity)
+        return self._item(self.db.items.get_item_by_name(item.name))
+
+    def update(self, command: dict) -> dict:
+        version = self.db.items.update_item(
+            self._count(command, "id"), command["name"], self._category(command["category"]),
+            self._count(command, "quantity"), self._count(command, "defective_quantity"), self._version(command),
+        )
+        if version is None:
+            raise ValueError("Item does not exist")
+        return {"version": version}
+
+    def delete(self, command: dict) -> None:
+        self.db.items.delete_item(self._count(command, "id"), self._version(command))
+
+    def increase(self, command: dict) -> dict:
+        return self._adjust(command, 1, 0, "Item does not exist")
+
+    def decrease(self, command: dict) -> dict:
+        return self._adjust(command, -1, 0, "Cannot decrease quantity below zero")
+
+    def mark_defective(self, command: dict) -> dict:
+        return self._adjust(command, -1, 1, "Cannot mark more items as defective than available quantity")
+
+    def repair(self, command: dict) -> dict:
+        return self._adjust(command, 1, -1, "Cannot repair more defective items than available defective quantity")
+
+    def create_account(self, command: dict) -> dict:
+        permission = command["permission"]
+        # True == 1 would otherwise pass as ADMIN
+        if isinstance(permission, bool) or permission not in READ:
+            raise ValueError("Permission must be 1 for ADMIN, 2 for WRITE or 3 for READ")
+        if self.db.accounts.get_account(command["username"]):
+            raise ValueError(f"Account '{command['username']}' already exists")
+        account = self.auth.create_account(command["username"], command["password"], permission)
+        return {"id": account.id}
+
+    def delete_account(self, command: dict) -> None:
+        self.db.accounts.delete_account(self.account.id)
+        self._logging_out = True
+
+
+def run_batch(path: str, username: str, password: str, group_size: int = 500) -> int:
+    """Log in and run a command file, or standard input for "-", printing results to stdout.
+
+    Returns the process exit code: 0 if every command succeeded, 1 if any
+    failed and 2 if the login failed.
+    """
+    try:
+        account = Authenticator(get_db()).find_account(username, password, "batch")
+    except LoginRateLimitedError as error:
+        print(f"{error}.", file=sys.stderr)
+        return 2
+    if not account:
+        print("Invalid credentials.", file=sys.stderr)
+        return 2
+    runner = BatchRunner(account, group_size=group_size)
+    start = time.perf_counter()
+    if path == "-":
+        failed = runner.run(sys.stdin)
+    else:
+        with open(path, encoding="utf-8") as file:
+            failed = runner.run(file)
+    seconds = time.perf_counter() - start
+    print(f"Ran {runner.commands} commands, {failed} failed, in {seconds:.2f}s "
+          f"({runner.commands / seconds if seconds else 0:.0f} commands/s)", file=sys.stderr)
+    return 1 if failed else 0
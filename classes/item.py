@@ -9,8 +9,9 @@ The quantity of an item must be non-negative.
 
 The item also keeps track of the number of defective items of that type.
 """
-    def __init__(self,id: int, name: str, category: int, quantity: int, defective_quantity: int = 0):
-        from database.databaseService import db
+    __slots__ = ("id", "name", "category", "quantity", "defective_quantity", "db", "version")
+
+    def __init__(self,id: int, name: str, category: int, quantity: int, defective_quantity: int = 0, db=None, version: int = 0):
         if quantity < 0 or defective_quantity < 0:
             raise ValueError("Quantity and defective quantity must be non-negative")
         
@@ -19,45 +20,72 @@ The item also keeps track of the number of defective items of that type.
         self.category = category
         self.quantity = quantity
         self.defective_quantity = defective_quantity
+        # Database service used by the mutation methods, the shared one if None
         self.db = db
+        # Number of updates of the row when it was read, see ItemOperations.update_item
+        self.version = version
+
+    @classmethod
+    def from_row(cls, row: tuple, db=None) -> "Item":
+        """Build an item from an (id, name, category, quantity, defective_quantity[, version]) row without re-validating it"""
+        item = cls.__new__(cls)
+        item.id, item.name, item.category, item.quantity, item.defective_quantity = row[:5]
+        item.version = row[5] if len(row) > 5 else 0
+        item.db = db
+        return item
     
-    def _update_db(self) -> None:
-        """Update the item in the database"""
-        self.db.items.update_item(
-            self.id,
-            self.name,
-            self.category,
-            self.quantity,
-            self.defective_quantity
-        )
+    def as_dict(self) -> dict:
+        """Return the item's fields, e.g. for JSON"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "category": self.category,
+            "quantity": self.quantity,
+            "defective_quantity": self.defective_quantity,
+            "version": self.version,
+        }
+
+    @staticmethod
+    def _check_amount(amount: int) -> None:
+        """Reject negative amounts, which would invert the meaning of an operation"""
+        if amount < 0:
+            raise ValueError("Amount must be non-negative")
+
+    def _adjust_stock(self, quantity_delta: int, defective_delta: int, error: str) -> None:
+        """Apply the deltas in the database and refresh the item from the returned values"""
+        from database.databaseService import get_db
+        db = self.db if self.db is not None else get_db()
+        if db.write_behind is not None:
+            # Queued for a later commit, so checked against this item's own quantities
+            quantity, defective_quantity = self.quantity + quantity_delta, self.defective_quantity + defective_delta
+            if quantity < 0 or defective_quantity < 0:
+                raise ValueError(error)
+            db.write_behind.adjust(self.id, quantity_delta, defective_delta)
+            self.quantity, self.defective_quantity = quantity, defective_quantity
+            return
+        result = db.items.adjust_stock(self.id, quantity_delta, defective_delta)
+        if result is None:
+            raise ValueError(error)
+        self.quantity, self.defective_quantity = result
+        # Stays behind the row's version if someone else changed it since it was read
+        self.version += 1
 
     def increase_quantity(self, amount: int) -> None:
         """Increase the quantity of the item by the specified amount"""
-        self.quantity += amount
-        self._update_db()
+        self._check_amount(amount)
+        self._adjust_stock(amount, 0, "Item no longer exists")
 
     def decrease_quantity(self, amount: int) -> None:
         """Decrease the quantity of the item by the specified amount"""
-        if amount <= self.quantity:
-            self.quantity -= amount
-            self._update_db()
-        else:
-            raise ValueError("Cannot decrease quantity below zero")
+        self._check_amount(amount)
+        self._adjust_stock(-amount, 0, "Cannot decrease quantity below zero")
         
     def mark_defective(self, amount: int) -> None:
         """Mark a certain amount of items as defective"""
-        if amount <= self.quantity:
-            self.quantity -= amount
-            self.defective_quantity += amount
-            self._update_db()
-        else:
-            raise ValueError("Cannot mark more items as defective than available quantity")
+        self._check_amount(amount)
+        self._adjust_stock(-amount, amount, "Cannot mark more items as defective than available quantity")
     
     def repair_defective(self, amount: int) -> None:
         """Repair a certain amount of defective items"""
-        if amount <= self.defective_quantity:
-            self.defective_quantity -= amount
-            self.quantity += amount
-            self._update_db()
-        else:
-            raise ValueError("Cannot repair more defective items than available defective quantity")
+        self._check_amount(amount)
+        self._adjust_stock(amount, -amount, "Cannot repair more defective items than available defective quantity")
@@ -1,19 +1,43 @@
+import contextlib
+import io
+import math
+import os
+import shutil
+import sys
 from classes.account import Account
-from classes.auth import Authenticator
+from classes.auth import Authenticator, LoginRateLimitedError
 from enums.accountPermission import AccountPermission
 from enums.page import Page
 from classes.item import Item
 from enums.category import Category
-from database.databaseService import db
+from database.databaseService import get_db
+from database.storageBackend import StorageService
+from database.itemOperations import DuplicateItemError
+from database.versionConflictError import VersionConflictError
+
+def terminal_source() -> str:
+    """Name the terminal logins come from, so lockouts caused elsewhere, such as over the API, don't apply to it."""
+    try:
+        return f"terminal:{os.ttyname(sys.stdin.fileno())}"
+    except (OSError, ValueError):
+        return "terminal"
+
 
 class Menu:
     """Menu class handles the display and navigation of the menu system."""
-    def __init__(self):
+    def __init__(self, db: StorageService | None = None):
+        self.db: StorageService = db if db is not None else get_db()
         self.account: Account | None = None
         self.current_page: Page = Page.LOGIN
-        self.auth: Authenticator = Authenticator()
-        self.all_items: list[Item] = []
+        self.auth: Authenticator = Authenticator(self.db)
+        self.item_ids: list[int] = []
         self.selected_item: Item | None = None
+        # Position in the item list of the inventory screens, see print_items
+        self.page_number: int = 0
+        self.page_after_id: int = 0
+        self.page_size: int = 1
+        self.page_count: int = 1
+        self.first_item_number: int = 0
         
     def run(self) -> None:
         """Runs the menu system"""
@@ -22,6 +46,24 @@ class Menu:
     
     def display(self) -> None:
         """Displays the menu"""
+        # Build the whole frame first and write it at once, so slow terminals redraw in one go
+        frame = io.StringIO()
+        with contextlib.redirect_stdout(frame):
+            self.render()
+        sys.stdout.write(frame.getvalue())
+        sys.stdout.flush()
+         
+        # Get users option choice   
+        choice = input("\nEnter your choice: ")
+        if choice.isdigit():
+            # Stock movements made on this page are recorded against the logged in account
+            with self.db.acting_as(self.account.id if self.account else None):
+                self.navigate(int(choice))
+        else:
+            input("Invalid input. Please enter a number.")
+
+    def render(self) -> None:
+        """Prints the current page"""
         print("\033[2J\033[1;1H") # clear console
         
         # Update current page
@@ -46,6 +88,7 @@ class Menu:
         # Print inventory menu
         elif self.account and self.current_page == Page.INVENTORY:
             print("Inventory Page\n")
+            self.print_summary()
             print("1. View Inventory")
             if self.account.permission in [AccountPermission.ADMIN, AccountPermission.WRITE]:
                  print("2. Edit Inventory")
@@ -69,15 +112,22 @@ class Menu:
         # Print view inventory menu
         elif self.account and self.current_page == Page.VIEW_INVENTORY:
             print("View Inventory Page\n")
-            print("1. Back to Inventory Menu\n")
-            self.print_items(2)
+            print("1. Back to Inventory Menu")
+            print("2. Next Page")
+            print("3. Previous Page")
+            print("4. Go to Page\n")
+            self.print_items(5)
             
         # Print edit inventory menu
         elif self.account and self.current_page == Page.EDIT_INVENTORY:
             print("Edit Inventory Page\n")
             print("1. Back to Inventory Menu")
             print("2. Create Item")
-            self.print_items(3)
+            print("3. Next Page")
+            print("4. Previous Page")
+            print("5. Go to Page")
+            print("6. Search Items\n")
+            self.print_items(7)
             
         # Print create item menu
         elif self.account and self.current_page == Page.CREATE_ITEM:
@@ -100,13 +150,6 @@ class Menu:
             print("Invalid state detected.")
             self.current_page = Page.LOGIN
             self.account = None
-         
-        # Get users option choice   
-        choice = input("\nEnter your choice: ")
-        if choice.isdigit():
-            self.navigate(int(choice))
-        else:
-            input("Invalid input. Please enter a number.")
             
     def navigate(self, choice: int) -> None:
         # Login Page
@@ -155,7 +198,11 @@ class Menu:
                 # Get username and password
                 username = input("\nUsername: ")
                 password = input("Password: ")
-                account = self.auth.find_account(username, password)
+                try:
+                    account = self.auth.find_account(username, password, terminal_source())
+                except LoginRateLimitedError as error:
+                    input(f"{error}.")
+                    return
                 
                 # Check if account exists
                 if account:
@@ -193,10 +240,12 @@ class Menu:
         # View Inventory
         if choice == 1:
             self.current_page = Page.VIEW_INVENTORY
+            self.show_page(0)
         
         # Edit Inventory
         elif choice == 2 and self.account.permission in [AccountPermission.ADMIN, AccountPermission.WRITE]:
             self.current_page = Page.EDIT_INVENTORY
+            self.show_page(0)
             
         # Back to main menu
         elif choice == 3:
@@ -206,6 +255,12 @@ class Menu:
         # View Inventory
         if choice == 1:
             self.current_page = Page.INVENTORY
+        elif choice == 2:
+            self.next_page()
+        elif choice == 3:
+            self.previous_page()
+        elif choice == 4:
+            self.go_to_page()
         else:
             input("Invalid choice. Please try again.")
     
@@ -218,9 +273,24 @@ class Menu:
         elif choice == 2:
             self.current_page = Page.CREATE_ITEM
             
-        # Edit existing item
-        elif choice > 2 and choice - 3 < len(self.all_items):
-            self.selected_item = self.all_items[choice - 3]
+        # Change page
+        elif choice == 3:
+            self.next_page()
+        elif choice == 4:
+            self.previous_page()
+        elif choice == 5:
+            self.go_to_page()
+            
+        # Find an item by name
+        elif choice == 6:
+            self.search_items()
+            
+        # Edit existing item shown on this page
+        elif 0 <= choice - self.first_item_number < len(self.item_ids):
+            self.selected_item = self.db.items.get_item(self.item_ids[choice - self.first_item_number])
+            if not self.selected_item:
+                input("Item no longer exists.")
+                return
             self.current_page = Page.EDIT_ITEM
         else:
             input("Invalid choice. Please try again.")
@@ -229,13 +299,11 @@ class Menu:
     def create_item(self, choice: int) -> None:
         # Create new item
         if choice == 1:
-            self.fetch_items(False)
             # Get item name, check if it already exists
             name = input("Enter item name: ")
-            for i in range(len(self.all_items)):
-                if self.all_items[i].name.lower() == name.lower():
-                    input("Item with this name already exists.")
-                    return
+            if self.db.items.get_item_by_name(name):
+                input("Item with this name already exists.")
+                return
                 
             # Get categories and display options
             categories = [name for name in dir(Category) if not name.startswith('__') and name in Category.__dict__]
@@ -250,7 +318,12 @@ class Menu:
                 quantity = input("Enter quantity: ")
                 # If all is good, create item
                 if quantity.isdigit() and int(quantity) >= 0:
-                    db.items.add_item(name, getattr(Category, category), int(quantity))
+                    try:
+                        self.db.items.add_item(name, getattr(Category, category), int(quantity))
+                    except DuplicateItemError:
+                        # Another terminal created it in the meantime
+                        input("Item with this name already exists.")
+                        return
                     input("\nItem created successfully.")
                     self.current_page = Page.EDIT_INVENTORY
                 else:
@@ -276,10 +349,7 @@ class Menu:
         if choice == 1:
             increase = input("Enter quantity to increase: ")
             if increase.isdigit() and int(increase) >= 0:
-                self.selected_item.increase_quantity(int(increase))
-                input("\nQuantity increased successfully.")
-                self.current_page = Page.EDIT_INVENTORY
-                self.selected_item = None
+                self.change_stock(self.selected_item.increase_quantity, int(increase), "Quantity increased successfully.")
             else:
                 input("\nInvalid quantity.")
                 
@@ -287,32 +357,23 @@ class Menu:
         elif choice == 2:
             decrease = input("Enter quantity to decrease: ")
             if decrease.isdigit() and int(decrease) >= 0:
-                self.selected_item.decrease_quantity(int(decrease))
-                input("\nQuantity decreased successfully.")
-                self.current_page = Page.EDIT_INVENTORY
-                self.selected_item = None
+                self.change_stock(self.selected_item.decrease_quantity, int(decrease), "Quantity decreased successfully.")
             else:
                 input("\nInvalid quantity.")
                 
         # Mark as defective
         elif choice == 3:
             defective = input("Enter defective quantity to mark: ")
-            if defective.isdigit() and int(defective) >= 0 and int(defective) <= self.selected_item.quantity:
-                self.selected_item.mark_defective(int(defective))
-                input("\nItems marked as defective successfully.")
-                self.current_page = Page.EDIT_INVENTORY
-                self.selected_item = None
+            if defective.isdigit() and int(defective) >= 0:
+                self.change_stock(self.selected_item.mark_defective, int(defective), "Items marked as defective successfully.")
             else:
                 input("\nInvalid quantity.")
                 
         # Repair defective
         elif choice == 4:
             repair = input("Enter defective quantity to repair: ")
-            if repair.isdigit() and int(repair) >= 0 and int(repair) <= self.selected_item.defective_quantity:
-                self.selected_item.repair_defective(int(repair))
-                input("\nDefective items repaired successfully.")
-                self.current_page = Page.EDIT_INVENTORY
-                self.selected_item = None
+            if repair.isdigit() and int(repair) >= 0:
+                self.change_stock(self.selected_item.repair_defective, int(repair), "Defective items repaired successfully.")
             else:
                 input("\nInvalid quantity.")
                 
@@ -320,7 +381,12 @@ class Menu:
         elif choice == 5:
             confirmation = input("Are you sure you want to delete this item? (y/n): ").lower()
             if confirmation == 'y':
-                db.items.delete_item(self.selected_item.id)
+                try:
+                    # Only delete the item as it was shown, not changes made from another terminal since
+                    self.db.items.delete_item(self.selected_item.id, self.selected_item.version)
+                except VersionConflictError:
+                    self.reload_selected_item()
+                    return
                 input("\nItem deleted successfully.")
                 self.current_page = Page.EDIT_INVENTORY
                 self.selected_item = None
@@ -330,6 +396,28 @@ class Menu:
             self.current_page = Page.EDIT_INVENTORY
             self.selected_item = None
             
+    def reload_selected_item(self) -> None:
+        # Another terminal changed or deleted the selected item, fetch just that row again
+        item = self.db.items.get_item(self.selected_item.id)
+        if not item:
+            input("\nItem was deleted by another user.")
+            self.current_page = Page.EDIT_INVENTORY
+            self.selected_item = None
+            return
+        self.selected_item = item
+        input(f"\nItem was changed by another user and has been reloaded "
+              f"(quantity {item.quantity}, defective {item.defective_quantity}). Please try again.")
+
+    def change_stock(self, action, amount: int, message: str) -> None:
+        # Apply the stock movement, the database rejects it if there is not enough stock
+        try:
+            action(amount)
+            input(f"\n{message}")
+        except ValueError as error:
+            input(f"\n{error}.")
+        self.current_page = Page.EDIT_INVENTORY
+        self.selected_item = None
+            
     def manage_account_page(self, choice: int) -> None:
         # If no account, return
         if not self.account:
@@ -347,7 +435,7 @@ class Menu:
         # Else, display account deletion
         else:
             if choice == 1:
-                db.accounts.delete_account(self.account.id)
+                self.db.accounts.delete_account(self.account.id)
                 self.account = None
                 self.current_page = Page.LOGIN
             elif choice == 2:
@@ -362,7 +450,7 @@ class Menu:
             if perm_input.isdigit() and int(perm_input) in [1, 2, 3]:
                 # Create account
                 permission = AccountPermission(int(perm_input))
-                db.accounts.create_account(username, self.auth.hash_password(password), permission)
+                self.auth.create_account(username, password, permission)
                 input("\nAccount created successfully.")
                 self.current_page = Page.ACCOUNT_MANAGEMENT
             else:
@@ -373,22 +461,89 @@ class Menu:
         else:
             input("\nInvalid choice. Please try again.")
         
-    def print_items(self, offset: int) -> None:
-        # Fetch items   
-        self.fetch_items()
+    def print_summary(self) -> None:
         categories = [name for name in dir(Category) if not name.startswith('__') and name in Category.__dict__]
         categories.reverse()
-        # Print items
-        for i in range(len(self.all_items)):
-            item = self.all_items[i]
-            print(f"{i + offset}. {item.name}\n      Category: {categories[item.category-1]}\n      Total: {item.quantity + item.defective_quantity}\n      Working Quantity: {item.quantity}\n      Defective Quantity: {item.defective_quantity}\n")
-    
-    def fetch_items(self, log: bool = True) -> None:
-        # Fetch items
-        items = db.items.get_all_items()
+        # Totals come from the summary table, so this does not read every item
+        totals = self.db.items.summary()
+        for category, (working, defective, total) in totals.items():
+            print(f"{categories[category-1]}: {total} total, {working} working, {defective} defective")
+        if totals:
+            print()
+
+    def items_per_page(self) -> int:
+        # One line per item, leaving room for the title, options and prompt
+        return max(1, shutil.get_terminal_size().lines - 17)
+
+    def show_page(self, page_number: int) -> None:
+        # Find where the page starts without reading the items before it
+        self.page_size = self.items_per_page()
+        after_id = self.db.items.nth_id(page_number * self.page_size - 1) if page_number > 0 else 0
+        if after_id is None:
+            page_number, after_id = 0, 0
+        self.page_number = page_number
+        self.page_after_id = after_id
+
+    def next_page(self) -> None:
+        if self.page_number + 1 >= self.page_count or not self.item_ids:
+            input("Already on the last page.")
+            return
+        self.page_number += 1
+        self.page_after_id = self.item_ids[-1]
+
+    def previous_page(self) -> None:
+        if self.page_number == 0:
+            input("Already on the first page.")
+            return
+        self.show_page(self.page_number - 1)
+
+    def go_to_page(self) -> None:
+        page = input(f"Enter page number (1-{self.page_count}): ")
+        if page.isdigit() and 1 <= int(page) <= self.page_count:
+            self.show_page(int(page) - 1)
+        else:
+            input("Invalid page number.")
+
+    def search_items(self) -> None:
+        categories = [name for name in dir(Category) if not name.startswith('__') and name in Category.__dict__]
+        categories.reverse()
+        items = self.db.items.search(input("Search for: "), self.items_per_page())
         if not items:
-            if log:
-                print("No items found in inventory.\n")
+            input("No matching items found.")
             return
-        # Store items
-        self.all_items = items
\ No newline at end of file
+        print()
+        for number, item in enumerate(items, 1):
+            print(self.item_line(number, item, categories))
+        selection = input("\nSelect an item to edit, or press enter to go back: ")
+        if selection.isdigit() and 1 <= int(selection) <= len(items):
+            self.selected_item = self.db.items.get_item(items[int(selection) - 1].id)
+            if not self.selected_item:
+                input("Item no longer exists.")
+                return
+            self.current_page = Page.EDIT_ITEM
+
+    @staticmethod
+    def item_line(number: int, item: Item, categories: list[str]) -> str:
+        return f"{number:>4}. {item.name:<30} {categories[item.category-1]:<12} Total: {item.quantity + item.defective_quantity:<6} Working: {item.quantity:<6} Defective: {item.defective_quantity}"
+
+    def print_items(self, offset: int) -> None:
+        categories = [name for name in dir(Category) if not name.startswith('__') and name in Category.__dict__]
+        categories.reverse()
+        # The terminal may have been resized since the page was chosen
+        if self.items_per_page() != self.page_size:
+            self.show_page(self.page_number * self.page_size // self.items_per_page())
+        # Only fetch the visible page, keeping its ids for selection
+        items = self.db.items.page(self.page_after_id, self.page_size)
+        if not items and self.page_number > 0:
+            # Items were deleted since, start over
+            self.show_page(0)
+            items = self.db.items.page(self.page_after_id, self.page_size)
+        self.page_count = max(1, math.ceil(self.db.items.count() / self.page_size))
+        self.item_ids = [item.id for item in items]
+        # Items keep their number across pages
+        self.first_item_number = offset + self.page_number * self.page_size
+        for number, item in enumerate(items, self.first_item_number):
+            print(self.item_line(number, item, categories))
+        if not items:
+            print("No items found in inventory.")
+        print(f"\nPage {self.page_number + 1} of {self.page_count}")
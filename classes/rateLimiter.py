@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class RateLimiter:
+    """Token bucket rate limiter keyed by e.g. username or source address.
+
+    Each key may spend `capacity` attempts at once, refilled at
+    `refill_rate` attempts per second. Buckets live in an LRU map bounded by
+    `max_keys`, and a bucket idle for `ttl` seconds is dropped, since by then
+    it has refilled and is no different from a new one. Checking a known key
+    is O(1) and updates its bucket in place. Safe to share between threads.
+    """
+    def __init__(self, capacity: float, refill_rate: float, max_keys: int = 10000, ttl: float | None = None):
+        if capacity < 1 or refill_rate <= 0 or max_keys < 1:
+            raise ValueError("Capacity, refill rate and key limit must be positive")
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.max_keys = max_keys
+        self.ttl = ttl if ttl is not None else capacity / refill_rate
+        # key -> [tokens, last update], mutated in place
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+        self.allowed = 0
+        self.limited = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def allow(self, key: str, now: float | None = None) -> bool:
+        """Spend one attempt for `key`, returning False if its bucket is empty."""
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self._evict(now)
+                bucket = self._buckets[key] = [self.capacity, now]
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_rate)
+                bucket[1] = now
+            if bucket[0] < 1:
+                self.limited += 1
+                return False
+            bucket[0] -= 1
+            self.allowed += 1
+            return True
+
+    def retry_after(self, key: str, now: float | None = None) -> float:
+        """Seconds until `key` can make another attempt."""
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                return 0.0
+            tokens = bucket[0] + (now - bucket[1]) * self.refill_rate
+        return max(0.0, (1 - tokens) / self.refill_rate)
+
+    def _evict(self, now: float) -> None:
+        """Drop expired buckets, then the least recently used ones beyond the key limit."""
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if now - bucket[1] < self.ttl and len(self._buckets) < self.max_keys:
+                return
+            del self._buckets[key]
+            self.evictions += 1
+
+    def stats(self) -> dict[str, int]:
+        """Return the limiter counters."""
+        return {
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "evictions": self.evictions,
+            "keys": len(self._buckets),
+        }
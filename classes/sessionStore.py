@@ -0,0 +1,60 @@
+import secrets
+import threading
+import time
+from classes.account import Account
+
+
+class SessionStore:
+    """Bearer tokens issued on login, each valid for `ttl` seconds after its last use.
+
+    Sessions are kept in memory, so they end when the process stops. At most
+    `max_sessions` are kept, dropping expired ones first and then the least
+    recently used. Safe to share between threads.
+    """
+    def __init__(self, ttl: float = 8 * 3600, max_sessions: int = 10000):
+        if ttl <= 0 or max_sessions < 1:
+            raise ValueError("Session lifetime and limit must be positive")
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        # token -> [account, expiry], in least recently used order
+        self._sessions: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def create(self, account: Account, now: float | None = None) -> str:
+        """Start a session for an account and return its token."""
+        if now is None:
+            now = time.monotonic()
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            if len(self._sessions) >= self.max_sessions:
+                self._evict(now)
+            self._sessions[token] = [account, now + self.ttl]
+        return token
+
+    def get(self, token: str, now: float | None = None) -> Account | None:
+        """Return the account of a live session and extend it, or None."""
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            session = self._sessions.pop(token, None)
+            if session is None or session[1] <= now:
+                return
+            session[1] = now + self.ttl
+            # Re-inserted, so the dictionary stays in least recently used order
+            self._sessions[token] = session
+            return session[0]
+
+    def end(self, token: str) -> bool:
+        """End a session, returning whether it existed."""
+        with self._lock:
+            return self._sessions.pop(token, None) is not None
+
+    def _evict(self, now: float) -> None:
+        """Drop expired sessions, then the least recently used ones, until there is room. Called with the lock held."""
+        for token in [token for token, (_, expiry) in self._sessions.items() if expiry <= now]:
+            del self._sessions[token]
+        while len(self._sessions) >= self.max_sessions:
+            del self._sessions[next(iter(self._sessions))]
+
+    def __len__(self) -> int:
+        return len(self._sessions)
@@ -1,38 +1,150 @@
+import hmac
 import sqlite3
 from classes.account import Account
+from database.retry import retry_on_locked
+from database.versionConflictError import VersionConflictError
+
+
+def account_row_factory(cursor: sqlite3.Cursor, row: tuple) -> Account:
+    """sqlite3 row factory building Account records directly from Accounts rows."""
+    return Account.from_row(row)
 
 
 class AccountOperations:
-    """Class to handle account operations in the database."""
-    def __init__(self, cursor: sqlite3.Cursor, connection: sqlite3.Connection):
-        self.cursor = cursor
-        self.connection = connection
+    """Class to handle account operations in the database.
+
+    Every call borrows a connection from the service's pool and uses its own cursor.
+    """
+    def __init__(self, db):
+        # Service lending connections
+        self.db = db
+        # Write retries once the busy timeout has run out, see retry_on_locked
+        self.retry_attempts = 5
+        self.retry_delay = 0.05
+
+    @property
+    def autocommit(self) -> bool:
+        """Whether each operation commits on its own."""
+        return self.db.autocommit
+
+    def _records(self, connection: sqlite3.Connection) -> sqlite3.Cursor:
+        """New cursor whose rows come back as Account records."""
+        cursor = connection.cursor()
+        cursor.row_factory = account_row_factory
+        return cursor
+
+    def _commit(self, connection: sqlite3.Connection) -> None:
+        """Commit the current transaction unless a caller is grouping operations."""
+        if self.autocommit:
+            connection.commit()
         
-    def create_account(self, username: str, password_hash: str, permission: int) -> Account | None:
+    @retry_on_locked
+    def create_account(self, username: str, password_hash: str, permission: int,
+                       kdf: str = "sha256", salt: str | None = None, kdf_params: str | None = None) -> Account | None:
         """Create a new account in the Accounts table."""
-        self.cursor.execute("""
-        INSERT INTO Accounts (username, password_hash, permission)
-        VALUES (?, ?, ?);
-        """, (username, password_hash, permission))
-        self.connection.commit()
-        return self.get_account_by_username(username, password_hash)
+        with self.db.borrow() as connection:
+            self.db.execute(connection, """
+            INSERT INTO Accounts (username, password_hash, permission, kdf, salt, kdf_params)
+            VALUES (?, ?, ?, ?, ?, ?);
+            """, (username, password_hash, permission, kdf, salt, kdf_params))
+            self._commit(connection)
+        return self.get_account(username)
+
+    def get_account(self, username: str) -> Account | None:
+        """Retrieve an account from the Accounts table by username, using its unique index."""
+        with self.db.borrow() as connection:
+            return self.db.fetchone(self._records(connection), """
+            SELECT id, username, password_hash, permission, kdf, salt, kdf_params, version
+            FROM Accounts
+            WHERE username = ?;
+            """, (username,))
         
     def get_account_by_username(self, username: str, password_hash: str) -> Account | None:
-        """Retrieve an account from the Accounts table by username and password hash."""
-        self.cursor.execute("""
-        SELECT id, username, password_hash, permission
-        FROM Accounts
-        WHERE username = ? AND password_hash = ?;
-        """, (username, password_hash))
-        row = self.cursor.fetchone()
-        if row:
-            return Account(id=row[0], username=row[1], password_hash=row[2], permission=row[3])
-        return 
+        """Retrieve an account from the Accounts table by username and password hash.
+
+        The hash is compared in constant time after looking the username up.
+        """
+        account = self.get_account(username)
+        if account and hmac.compare_digest(account.password_hash.encode(), password_hash.encode()):
+            return account
+        return
+
+    @retry_on_locked
+    def update_password_hash(self, account_id: int, password_hash: str, kdf: str, salt: str | None, kdf_params: str | None,
+                             version: int | None = None) -> None:
+        """Replace an account's password hash and the parameters it was derived with.
+
+        With a `version`, raises VersionConflictError unless the account is still at that version.
+        """
+        with self.db.borrow() as connection:
+            if version is None:
+                self.db.execute(connection, """
+                UPDATE Accounts
+                SET password_hash = ?, kdf = ?, salt = ?, kdf_params = ?, version = version + 1
+                WHERE id = ?;
+                """, (password_hash, kdf, salt, kdf_params, account_id))
+            elif not self.db.execute(connection, """
+                UPDATE Accounts
+                SET password_hash = ?, kdf = ?, salt = ?, kdf_params = ?, version = version + 1
+                WHERE id = ? AND version = ?;
+                """, (password_hash, kdf, salt, kdf_params, account_id, version)).rowcount:
+                raise VersionConflictError(f"Account {account_id} was changed or deleted since version {version}")
+            self._commit(connection)
     
+    @retry_on_locked
     def delete_account(self, account_id: int) -> None:
         """Delete an account from the Accounts table by ID."""
-        self.cursor.execute("""
-        DELETE FROM Accounts
-        WHERE id = ?;
-        """, (account_id,))
-        self.connection.commit()
+        with self.db.borrow() as connection:
+            self.db.execute(connection, """
+            DELETE FROM Accounts
+            WHERE id = ?;
+            """, (account_id,))
+            self.db.execute(connection, """
+            DELETE FROM LoginFailures
+            WHERE account_id = ?;
+            """, (account_id,))
+            self._commit(connection)
+
+    def get_login_failures(self, account_id: int, source: str = "") -> tuple[int, float | None] | None:
+        """Return an account's (consecutive failures, locked until) from a source, or None if it has none."""
+        with self.db.borrow() as connection:
+            return self.db.fetchone(connection, """
+            SELECT failures, locked_until FROM LoginFailures
+            WHERE account_id = ? AND source = ?;
+            """, (account_id, source))
+
+    @retry_on_locked
+    def record_login_failure(self, account_id: int, source: str, threshold: int, lockout_seconds: float,
+                             now: float) -> float | None:
+        """Count a failed login from a source, locking the account for that source once `threshold` failures happen in a row.
+
+        Returns the time the account is locked until, or None if it is not locked.
+        """
+        with self.db.borrow() as connection:
+            row = self.db.fetchone(connection, """
+            INSERT INTO LoginFailures (account_id, source, failures, locked_until)
+            VALUES (?, ?, 1, NULL)
+            ON CONFLICT (account_id, source) DO UPDATE SET failures = failures + 1
+            RETURNING failures;
+            """, (account_id, source))
+            locked_until = None
+            if row[0] >= threshold:
+                # Start counting again once the lockout is over
+                locked_until = now + lockout_seconds
+                self.db.execute(connection, """
+                UPDATE LoginFailures
+                SET failures = 0, locked_until = ?
+                WHERE account_id = ? AND source = ?;
+                """, (locked_until, account_id, source))
+            self._commit(connection)
+        return locked_until
+
+    @retry_on_locked
+    def clear_login_failures(self, account_id: int, source: str = "") -> None:
+        """Forget an account's failed logins from a source after it logs in successfully from there."""
+        with self.db.borrow() as connection:
+            self.db.execute(connection, """
+            DELETE FROM LoginFailures
+            WHERE account_id = ? AND source = ?;
+            """, (account_id, source))
+            self._commit(connection)
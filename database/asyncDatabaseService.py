@@ -0,0 +1,157 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import AsyncIterator, Callable, Iterable, TypeVar
+from classes.account import Account
+from classes.item import Item
+from database.databaseService import DatabaseService
+
+T = TypeVar("T")
+
+
+class AsyncDatabaseService:
+    """asyncio facade over DatabaseService.
+
+    Reads run on a pool of `max_readers` threads. Writes are queued on a single
+    writer thread, so they never compete with each other for the database lock.
+    The blocking sqlite3 calls therefore never run on the event loop.
+
+    Items returned here are bound to the underlying synchronous service, so
+    call their mutation methods through `run_write` rather than directly.
+    """
+    def __init__(self, database_file: str, max_readers: int = 4, **settings):
+        if max_readers < 1:
+            raise ValueError("At least one reader is required")
+        # One connection per reader, plus the writer's
+        self.service = DatabaseService(database_file, pool_size=max_readers + 1, **settings)
+        self._readers = ThreadPoolExecutor(max_workers=max_readers, thread_name_prefix="db-reader")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self.items = AsyncItemOperations(self)
+        self.accounts = AsyncAccountOperations(self)
+
+    async def __aenter__(self) -> "AsyncDatabaseService":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def run_read(self, function: Callable[..., T], *args) -> T:
+        """Run a blocking read on the reader threads."""
+        return await asyncio.get_running_loop().run_in_executor(self._readers, partial(function, *args))
+
+    async def run_write(self, function: Callable[..., T], *args) -> T:
+        """Queue a blocking write on the single writer thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._writer, partial(function, *args))
+
+    async def transaction(self, function: Callable[[DatabaseService], T]) -> T:
+        """Run `function(service)` on the writer thread inside a single transaction."""
+        def run() -> T:
+            with self.service.transaction():
+                return function(self.service)
+        return await self.run_write(run)
+
+    async def close(self) -> None:
+        """Finish queued work, then stop the threads and close the database."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._writer.shutdown)
+        await loop.run_in_executor(None, self._readers.shutdown)
+        self.service.disconnect()
+
+
+class AsyncItemOperations:
+    """Awaitable versions of the ItemOperations methods."""
+    def __init__(self, db: AsyncDatabaseService):
+        self.db = db
+
+    @property
+    def operations(self):
+        return self.db.service.items
+
+    async def get_item(self, item_id: int) -> Item | None:
+        """Retrieve an item by ID."""
+        return await self.db.run_read(self.operations.get_item, item_id)
+
+    async def get_item_by_name(self, name: str) -> Item | None:
+        """Retrieve an item by name, ignoring case."""
+        return await self.db.run_read(self.operations.get_item_by_name, name)
+
+    async def get_all_items(self) -> list[Item] | None:
+        """Retrieve all items."""
+        return await self.db.run_read(self.operations.get_all_items)
+
+    async def page(self, after_id: int = 0, limit: int = 100) -> list[Item]:
+        """Retrieve up to `limit` items with an ID greater than `after_id`, ordered by ID."""
+        return await self.db.run_read(self.operations.page, after_id, limit)
+
+    async def iter_items(self, batch_size: int = 500, after_id: int = 0) -> AsyncIterator[Item]:
+        """Iterate over all items ordered by ID, fetching `batch_size` at a time."""
+        while True:
+            items = await self.page(after_id, batch_size)
+            for item in items:
+                yield item
+            if len(items) < batch_size:
+                return
+            after_id = items[-1].id
+
+    async def search(self, query: str, limit: int = 20) -> list[Item]:
+        """Find items by the words of their name, see ItemOperations.search."""
+        return await self.db.run_read(self.operations.search, query, limit)
+
+    async def summary(self) -> dict[int, tuple[int, int, int]]:
+        """Return (working, defective, total) quantities per category."""
+        return await self.db.run_read(self.operations.summary)
+
+    async def add_item(self, name: str, category: int, quantity: int = 0, defective_quantity: int = 0) -> None:
+        """Add a new item."""
+        await self.db.run_write(self.operations.add_item, name, category, quantity, defective_quantity)
+
+    async def update_item(self, item_id: int, name: str, category: int, quantity: int, defective_quantity: int,
+                          version: int | None = None) -> int | None:
+        """Update an existing item, see ItemOperations.update_item."""
+        return await self.db.run_write(self.operations.update_item, item_id, name, category, quantity, defective_quantity, version)
+
+    async def delete_item(self, item_id: int, version: int | None = None) -> None:
+        """Delete an item by ID, see ItemOperations.delete_item."""
+        await self.db.run_write(self.operations.delete_item, item_id, version)
+
+    async def adjust_stock(self, item_id: int, quantity_delta: int, defective_delta: int = 0) -> tuple[int, int] | None:
+        """Atomically apply quantity deltas to an item, see ItemOperations.adjust_stock."""
+        return await self.db.run_write(self.operations.adjust_stock, item_id, quantity_delta, defective_delta)
+
+    async def add_items(self, rows: Iterable[tuple], chunk_size: int = 500) -> list[int]:
+        """Add many items in a single transaction."""
+        return await self.db.run_write(self.operations.add_items, rows, chunk_size)
+
+    async def upsert_items(self, rows: Iterable[tuple], chunk_size: int = 500) -> list[int]:
+        """Add or overwrite many items by name in a single transaction."""
+        return await self.db.run_write(self.operations.upsert_items, rows, chunk_size)
+
+    async def update_items(self, rows: Iterable[tuple], chunk_size: int = 500) -> list[int]:
+        """Update many items in a single transaction."""
+        return await self.db.run_write(self.operations.update_items, rows, chunk_size)
+
+    async def delete_items(self, item_ids: Iterable[int], chunk_size: int = 500) -> list[int]:
+        """Delete many items by ID in a single transaction."""
+        return await self.db.run_write(self.operations.delete_items, item_ids, chunk_size)
+
+
+class AsyncAccountOperations:
+    """Awaitable versions of the AccountOperations methods."""
+    def __init__(self, db: AsyncDatabaseService):
+        self.db = db
+
+    @property
+    def operations(self):
+        return self.db.service.accounts
+
+    async def get_account_by_username(self, username: str, password_hash: str) -> Account | None:
+        """Retrieve an account by username and password hash."""
+        return await self.db.run_read(self.operations.get_account_by_username, username, password_hash)
+
+    async def create_account(self, username: str, password_hash: str, permission: int) -> Account | None:
+        """Create a new account."""
+        return await self.db.run_write(self.operations.create_account, username, password_hash, permission)
+
+    async def delete_account(self, account_id: int) -> None:
+        """Delete an account by ID."""
+        await self.db.run_write(self.operations.delete_account, account_id)
@@ -0,0 +1,203 @@
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Iterable, Iterator
+from classes.item import Item
+from database.itemOperations import ItemOperations, nocase
+
+
+class CachedItemOperations:
+    """Read-through LRU cache in front of ItemOperations.
+
+    Items are cached by ID (with a by-name index) as plain rows, so every
+    lookup hands out a fresh Item. Writes made through this class update or
+    invalidate the affected entries. Writes made by other connections are not
+    seen, so only use it when this process is the only writer. It is not
+    thread-safe.
+    """
+    def __init__(self, operations: ItemOperations, max_size: int = 10000):
+        if max_size < 1:
+            raise ValueError("Cache size must be at least 1")
+        self.operations = operations
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._rows: OrderedDict[int, tuple] = OrderedDict()
+        self._ids_by_name: dict[str, int] = {}
+        # Sorted IDs of every item, kept while the whole table fits in the cache
+        self._all_ids: list[int] | None = None
+        # Set once the table is known to be larger than the cache, until items are deleted
+        self._too_large = False
+
+    def __getattr__(self, name: str):
+        # Anything not cached goes straight to the wrapped operations
+        return getattr(self.operations, name)
+
+    def stats(self) -> dict[str, int]:
+        """Return the cache counters."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._rows),
+            "max_size": self.max_size,
+        }
+
+    def clear(self) -> None:
+        """Drop every cached entry, keeping the counters."""
+        self._rows.clear()
+        self._ids_by_name.clear()
+        self._all_ids = None
+        self._too_large = False
+
+    def _store(self, item: Item) -> None:
+        """Cache an item's row, evicting the least recently used entries beyond the size bound."""
+        self._forget(item.id)
+        self._rows[item.id] = (item.id, item.name, item.category, item.quantity, item.defective_quantity, item.version)
+        self._ids_by_name[nocase(item.name)] = item.id
+        while len(self._rows) > self.max_size:
+            evicted_id, evicted = self._rows.popitem(last=False)
+            self._ids_by_name.pop(nocase(evicted[1]), None)
+            self.evictions += 1
+            # The listing can no longer be served from the cache
+            self._all_ids = None
+
+    def _forget(self, item_id: int) -> None:
+        """Remove an item from the cache if present."""
+        row = self._rows.pop(item_id, None)
+        if row and self._ids_by_name.get(nocase(row[1])) == item_id:
+            del self._ids_by_name[nocase(row[1])]
+
+    def _cached(self, item_id: int) -> Item | None:
+        """Return a fresh Item for a cached row, marking it as recently used."""
+        row = self._rows.get(item_id)
+        if row is None:
+            return
+        self._rows.move_to_end(item_id)
+        return Item.from_row(row, self.operations.db)
+
+    def _listed(self, item_id: int) -> bool:
+        """Check whether an item is part of the cached listing."""
+        if self._all_ids is None:
+            return False
+        index = bisect_right(self._all_ids, item_id)
+        return index > 0 and self._all_ids[index - 1] == item_id
+
+    def _listing(self) -> list[int] | None:
+        """Return the sorted IDs of all items, loading the table if it fits in the cache."""
+        if self._all_ids is not None:
+            self.hits += 1
+            return self._all_ids
+        self.misses += 1
+        if self._too_large:
+            return
+        items = self.operations.get_all_items() or []
+        if len(items) > self.max_size:
+            self._too_large = True
+            return
+        for item in items:
+            self._store(item)
+        self._all_ids = sorted(item.id for item in items)
+        return self._all_ids
+
+    def get_item(self, item_id: int) -> Item | None:
+        """Retrieve an item by ID, from the cache when possible."""
+        item = self._cached(item_id)
+        if item:
+            self.hits += 1
+            return item
+        self.misses += 1
+        item = self.operations.get_item(item_id)
+        if item:
+            self._store(item)
+        return item
+
+    def get_item_by_name(self, name: str) -> Item | None:
+        """Retrieve an item by case-insensitive name, from the cache when possible."""
+        item_id = self._ids_by_name.get(nocase(name))
+        if item_id is not None:
+            self.hits += 1
+            return self._cached(item_id)
+        # A complete listing means the name is known not to exist
+        if self._all_ids is not None:
+            self.hits += 1
+            return
+        self.misses += 1
+        item = self.operations.get_item_by_name(name)
+        if item:
+            self._store(item)
+        return item
+
+    def get_all_items(self) -> list[Item] | None:
+        """Retrieve all items, from the cache when the whole table fits in it."""
+        ids = self._listing()
+        if ids is None:
+            return self.operations.get_all_items()
+        return [self._cached(item_id) for item_id in ids] or None
+
+    def page(self, after_id: int = 0, limit: int = 100) -> list[Item]:
+        """Retrieve up to `limit` items with an ID greater than `after_id`, ordered by ID."""
+        ids = self._listing()
+        if ids is None:
+            return self.operations.page(after_id, limit)
+        start = bisect_right(ids, after_id)
+        return [self._cached(item_id) for item_id in ids[start:start + limit]]
+
+    def iter_items(self, batch_size: int = 500, after_id: int = 0) -> Iterator[Item]:
+        """Iterate over all items ordered by ID, holding at most `batch_size` in memory."""
+        while True:
+            items = self.page(after_id, batch_size)
+            yield from items
+            if len(items) < batch_size:
+                return
+            after_id = items[-1].id
+
+    def add_item(self, name: str, category: int, quantity: int = 0, defective_quantity: int = 0) -> None:
+        """Add a new item, invalidating the cached listing."""
+        self._all_ids = None
+        self.operations.add_item(name, category, quantity, defective_quantity)
+
+    def update_item(self, item_id: int, name: str, category: int, quantity: int, defective_quantity: int,
+                    version: int | None = None) -> int | None:
+        """Update an item and write the new values through to the cache."""
+        self._forget(item_id)
+        new_version = self.operations.update_item(item_id, name, category, quantity, defective_quantity, version)
+        if new_version is not None and self._listed(item_id):
+            self._store(Item.from_row((item_id, name, category, quantity, defective_quantity, new_version)))
+        return new_version
+
+    def delete_item(self, item_id: int, version: int | None = None) -> None:
+        """Delete an item and drop it from the cache."""
+        self._forget(item_id)
+        self._too_large = False
+        self.operations.delete_item(item_id, version)
+        if self._listed(item_id):
+            del self._all_ids[bisect_right(self._all_ids, item_id) - 1]
+
+    def adjust_stock(self, item_id: int, quantity_delta: int, defective_delta: int = 0) -> tuple[int, int] | None:
+        """Atomically apply quantity deltas and write the new values through to the cache."""
+        result = self.operations.adjust_stock(item_id, quantity_delta, defective_delta)
+        row = self._rows.get(item_id)
+        if result and row:
+            self._rows[item_id] = (*row[:3], *result, row[5] + 1)
+        return result
+
+    def add_items(self, rows: Iterable[tuple], chunk_size: int = 500) -> list[int]:
+        """Add many items, invalidating the whole cache."""
+        self.clear()
+        return self.operations.add_items(rows, chunk_size)
+
+    def upsert_items(self, rows: Iterable[tuple], chunk_size: int = 500) -> list[int]:
+        """Add or overwrite many items by name, invalidating the whole cache."""
+        self.clear()
+        return self.operations.upsert_items(rows, chunk_size)
+
+    def update_items(self, rows: Iterable[tuple], chunk_size: int = 500) -> list[int]:
+        """Update many items, invalidating the whole cache."""
+        self.clear()
+        return self.operations.update_items(rows, chunk_size)
+
+    def delete_items(self, item_ids: Iterable[int], chunk_size: int = 500) -> list[int]:
+        """Delete many items, invalidating the whole cache."""
+        self.clear()
+        return self.operations.delete_items(item_ids, chunk_size)
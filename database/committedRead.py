@@ -0,0 +1,12 @@
+from functools import wraps
+
+
+def committed_read(method):
+    """Run a read method of the in-memory backend through its service's read(), see MemoryDatabaseService.read().
+
+    The decorated method's object needs a `db` attribute holding the service.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return self.db.read(method, self, *args, **kwargs)
+    return wrapper
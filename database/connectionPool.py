@@ -0,0 +1,114 @@
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+
+class ThreadConnection:
+    """A pooled connection checked out by one thread, with that thread's transaction state."""
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+        self.cursor = connection.cursor()
+        # Depth of DatabaseService.transaction() blocks open on this thread
+        self.transaction_depth = 0
+
+
+class ConnectionPool:
+    """Pool of at most `size` SQLite connections shared between threads.
+
+    Single operations borrow() a connection and give it back straight away.
+    A thread that needs the same connection across several statements, e.g.
+    for a transaction, pins one with local() and keeps it until it exits, when
+    the connection is rolled back and returned. Threads wait up to `timeout`
+    seconds for a connection when all of them are in use.
+    """
+    def __init__(self, database_file: str, size: int = 8, timeout: float = 30.0,
+                 configure: Callable[[sqlite3.Connection], None] | None = None,
+                 prepare: Callable[[sqlite3.Connection], None] | None = None):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.database_file = database_file
+        self.size = size
+        self.timeout = timeout
+        self.configure = configure
+        # Called with a connection each time it is lent out
+        self.prepare = prepare
+        self._local = threading.local()
+        self._condition = threading.Condition()
+        self._idle: list[sqlite3.Connection] = []
+        self._all: list[sqlite3.Connection] = []
+        self._closed = False
+
+    def local(self) -> ThreadConnection:
+        """Return the calling thread's connection, checking one out on first use."""
+        state = getattr(self._local, "state", None)
+        if state is None:
+            state = ThreadConnection(self._acquire())
+            # Give the connection back once the thread, and with it its state, is gone
+            weakref.finalize(state, self._release, state.connection)
+            self._local.state = state
+        return state
+
+    def connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection."""
+        return self.local().connection
+
+    def pinned(self) -> ThreadConnection | None:
+        """Return the calling thread's connection state if it has pinned one."""
+        return getattr(self._local, "state", None)
+
+    @contextmanager
+    def borrow(self) -> Iterator[sqlite3.Connection]:
+        """Lend a connection for one operation, the thread's own one if it has pinned one."""
+        state = self.pinned()
+        if state is not None:
+            if self.prepare:
+                self.prepare(state.connection)
+            yield state.connection
+            return
+        connection = self._acquire()
+        try:
+            if self.prepare:
+                self.prepare(connection)
+            yield connection
+        finally:
+            self._release(connection)
+
+    def _acquire(self) -> sqlite3.Connection:
+        """Take an idle connection, open a new one, or wait for one to be released."""
+        with self._condition:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Cannot operate on a closed connection pool")
+            if not self._idle and len(self._all) >= self.size:
+                if not self._condition.wait_for(lambda: self._idle or self._closed, self.timeout):
+                    raise TimeoutError(f"No database connection free after {self.timeout} seconds")
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Cannot operate on a closed connection pool")
+            if self._idle:
+                return self._idle.pop()
+            connection = sqlite3.connect(self.database_file, check_same_thread=False)
+            self._all.append(connection)
+        if self.configure:
+            self.configure(connection)
+        return connection
+
+    def _release(self, connection: sqlite3.Connection) -> None:
+        """Return a connection to the pool, discarding any uncommitted work."""
+        with self._condition:
+            if self._closed:
+                return
+            connection.rollback()
+            self._idle.append(connection)
+            self._condition.notify()
+
+    def close(self) -> None:
+        """Close every connection in the pool."""
+        with self._condition:
+            self._closed = True
+            for connection in self._all:
+                connection.close()
+            self._all.clear()
+            self._idle.clear()
+            self._condition.notify_all()
+        self._local = threading.local()
@@ -1,58 +1,401 @@
+import logging
+import os
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator
 from database.itemOperations import ItemOperations
+from database.cachedItemOperations import CachedItemOperations
+from database.migrations import migrate
+from database.connectionPool import ConnectionPool
 from database.accountOperations import AccountOperations
+from database.movementOperations import MovementOperations
+from database.queryStats import QueryStats, statement_key
+from database.storageBackend import StorageService
+from database.writeBehind import WriteBehindQueue
+
+logger = logging.getLogger(__name__)
+
+# on_query_start(sql, parameters) and on_query_end(sql, parameters, seconds, rows) hooks
+QueryStartHook = Callable[[str, object], None]
+QueryEndHook = Callable[[str, object, float, int], None]
 
 
 class DatabaseService:
-    """Service to manage database connections and operations."""
-    connection: sqlite3.Connection
-    cursor: sqlite3.Cursor
-    items: ItemOperations
+    """Service to manage database connections and operations.
+
+    Operations borrow a connection from a pool of `pool_size` for each call,
+    so they can be used from several threads at once.
+
+    Operations run their statements through execute(), executemany(),
+    fetchone() and fetchall(). With `query_stats` these count, time and log
+    every statement, see query_stats(). Statements slower than
+    `slow_query_ms` are logged as warnings, and hooks registered with
+    on_query_start() and on_query_end() are called around each statement.
+    Without any of these the statements run directly.
+
+    With `write_behind`, Item stock changes are queued and committed in
+    batches instead of one commit each, see WriteBehindQueue. A crash loses
+    at most `max_unflushed_ms` of queued changes, and other readers only see
+    the changes once they are flushed.
+    """
+    pool: ConnectionPool
+    items: ItemOperations | CachedItemOperations
     accounts: AccountOperations
+    movements: MovementOperations
+    write_behind: WriteBehindQueue | None
     database_file: str
 
-    def __init__(self, database_file: str):
+    def __init__(
+        self,
+        database_file: str,
+        item_cache_size: int = 0,
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        busy_timeout: int = 5000,
+        cache_size: int = -16000,
+        mmap_size: int = 64 * 1024 * 1024,
+        pool_size: int = 8,
+        query_stats: bool = False,
+        slow_query_ms: float | None = None,
+        write_behind: bool = False,
+        write_behind_max_pending: int = 1000,
+        max_unflushed_ms: float = 200,
+    ):
         self.database_file = database_file
+        # Connection settings, see _configure_connection()
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.pool_size = pool_size
+        # Statement instrumentation, see execute()
+        self._query_stats: dict[str, QueryStats] | None = {} if query_stats else None
+        self._query_stats_lock = threading.Lock()
+        self._query_start_hooks: list[QueryStartHook] = []
+        self._query_end_hooks: list[QueryEndHook] = []
+        self._slow_query_ms = slow_query_ms
+        self._update_instrumented()
+        # Account each thread is acting as, recorded in the stock ledger
+        self._acting = threading.local()
+        # (account, whether stored inside a transaction) last stored in each connection's
+        # temp.InventoryAccount, see _use_acting_account()
+        self._connection_accounts: dict[sqlite3.Connection, tuple[int | None, bool]] = {}
         self.connect()
-        self.items = ItemOperations(self.cursor, self.connection)
-        self.accounts = AccountOperations(self.cursor, self.connection)
-        self._create_collections_if_not_exist()
+        self.items = ItemOperations(self)
+        # Only cache items when asked to, other connections' writes are not seen by the cache
+        if item_cache_size:
+            self.items = CachedItemOperations(self.items, item_cache_size)
+        self.accounts = AccountOperations(self)
+        self.movements = MovementOperations(self)
+        # The first connection migrates the database, see _configure_connection()
+        with self.borrow():
+            pass
+        self.write_behind = WriteBehindQueue(self, write_behind_max_pending, max_unflushed_ms) if write_behind else None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """The calling thread's own connection, which it keeps until it exits."""
+        connection = self.pool.local().connection
+        self._use_acting_account(connection)
+        return connection
+
+    @property
+    def cursor(self) -> sqlite3.Cursor:
+        """A cursor on the calling thread's own connection, for ad hoc statements."""
+        state = self.pool.local()
+        self._use_acting_account(state.connection)
+        return state.cursor
+
+    @property
+    def autocommit(self) -> bool:
+        """Whether operations commit on their own, i.e. no transaction() is open on this thread."""
+        state = self.pool.pinned()
+        return state is None or state.transaction_depth == 0
+
+    @property
+    def slow_query_ms(self) -> float | None:
+        """Statements taking longer than this many milliseconds are logged, None to log none."""
+        return self._slow_query_ms
+
+    @slow_query_ms.setter
+    def slow_query_ms(self, value: float | None) -> None:
+        self._slow_query_ms = value
+        self._update_instrumented()
+
+    def _update_instrumented(self) -> None:
+        """Decide once, rather than per statement, whether statements need timing."""
+        self._instrumented = bool(
+            self._query_stats is not None or self._slow_query_ms is not None
+            or self._query_start_hooks or self._query_end_hooks
+        )
+
+    def on_query_start(self, hook: QueryStartHook) -> QueryStartHook:
+        """Call `hook(sql, parameters)` before every statement. Returns the hook, so it can decorate."""
+        self._query_start_hooks.append(hook)
+        self._update_instrumented()
+        return hook
+
+    def on_query_end(self, hook: QueryEndHook) -> QueryEndHook:
+        """Call `hook(sql, parameters, seconds, rows)` after every statement. Returns the hook, so it can decorate.
+
+        Also called when the statement fails, with zero rows.
+        """
+        self._query_end_hooks.append(hook)
+        self._update_instrumented()
+        return hook
+
+    def remove_query_hook(self, hook) -> None:
+        """Stop calling a hook registered with on_query_start() or on_query_end()."""
+        for hooks in (self._query_start_hooks, self._query_end_hooks):
+            if hook in hooks:
+                hooks.remove(hook)
+        self._update_instrumented()
+
+    def query_stats(self) -> dict[str, dict[str, float]]:
+        """Return count, total and max time (ms) and rows per statement, slowest in total first.
+
+        Empty unless the service was created with `query_stats`.
+        """
+        with self._query_stats_lock:
+            stats = {sql: entry.as_dict() for sql, entry in (self._query_stats or {}).items()}
+        return dict(sorted(stats.items(), key=lambda entry: entry[1]["total_ms"], reverse=True))
+
+    def reset_query_stats(self) -> None:
+        """Forget the statement totals collected so far."""
+        with self._query_stats_lock:
+            if self._query_stats is not None:
+                self._query_stats.clear()
+
+    def execute(self, target: sqlite3.Connection | sqlite3.Cursor, sql: str, parameters=()) -> sqlite3.Cursor:
+        """Run a statement on a connection or cursor, counting the rows it changes."""
+        if not self._instrumented:
+            return target.execute(sql, parameters)
+        return self._timed(sql, parameters, lambda: target.execute(sql, parameters), lambda cursor: max(cursor.rowcount, 0))
+
+    def executemany(self, target: sqlite3.Connection | sqlite3.Cursor, sql: str, rows: Iterable) -> sqlite3.Cursor:
+        """Run a statement for each parameter row. Hooks get None as parameters, as the rows may be a generator."""
+        if not self._instrumented:
+            return target.executemany(sql, rows)
+        return self._timed(sql, None, lambda: target.executemany(sql, rows), lambda cursor: max(cursor.rowcount, 0))
+
+    def fetchone(self, target: sqlite3.Connection | sqlite3.Cursor, sql: str, parameters=()):
+        """Run a query and return its first row, or None."""
+        if not self._instrumented:
+            return target.execute(sql, parameters).fetchone()
+        return self._timed(sql, parameters, lambda: target.execute(sql, parameters).fetchone(), lambda row: row is not None)
+
+    def fetchall(self, target: sqlite3.Connection | sqlite3.Cursor, sql: str, parameters=()) -> list:
+        """Run a query and return all its rows."""
+        if not self._instrumented:
+            return target.execute(sql, parameters).fetchall()
+        return self._timed(sql, parameters, lambda: target.execute(sql, parameters).fetchall(), len)
+
+    def _timed(self, sql: str, parameters, run: Callable, count_rows: Callable) -> object:
+        """Run a statement with the hooks, statistics and slow query log."""
+        for hook in self._query_start_hooks:
+            hook(sql, parameters)
+        rows = 0
+        start = time.perf_counter()
+        try:
+            result = run()
+            rows = int(count_rows(result))
+        finally:
+            seconds = time.perf_counter() - start
+            if self._query_stats is not None:
+                key = statement_key(sql)
+                with self._query_stats_lock:
+                    entry = self._query_stats.get(key)
+                    if entry is None:
+                        entry = self._query_stats[key] = QueryStats()
+                    entry.add(seconds, rows)
+            if self._slow_query_ms is not None and seconds * 1000 >= self._slow_query_ms:
+                logger.warning("Slow query (%.1f ms, %d rows): %s", seconds * 1000, rows, statement_key(sql))
+            for hook in self._query_end_hooks:
+                hook(sql, parameters, seconds, rows)
+        return result
+
+    def borrow(self):
+        """Lend a connection for one operation, see ConnectionPool.borrow()."""
+        return self.pool.borrow()
+
+    def rollback(self) -> None:
+        """Roll back the calling thread's own connection, if it has one.
+
+        Borrowed connections are rolled back when they are returned to the pool.
+        """
+        state = self.pool.pinned()
+        if state is not None:
+            state.connection.rollback()
 
     def connect(self) -> None:
-        """Connect to the database"""
-        self.connection = sqlite3.connect(self.database_file)
-        self.cursor = self.connection.cursor()
+        """Create the connection pool"""
+        self._connection_accounts.clear()
+        self.pool = ConnectionPool(self.database_file, self.pool_size, self.busy_timeout / 1000,
+                                   self._configure_connection, self._use_acting_account)
 
-    def disconnect(self) -> None:
-        """Disconnect from the database"""
-        self.connection.close()
-
-    def _create_collections_if_not_exist(self) -> None:
-        """Create the Items and Accounts tables if they don't exist."""
-        self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = self.cursor.fetchall()
-        tables = [table[0] for table in tables]
-        if "Items" not in tables:
-            self.cursor.execute("""
-            CREATE TABLE Items(
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                category INTEGER NOT NULL,
-                quantity INTEGER NOT NULL,
-                defective_quantity INTEGER NOT NULL
-            );
-            """)
-            self.connection.commit()
-        if "Accounts" not in tables:
-            self.cursor.execute("""
-            CREATE TABLE Accounts(
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT NOT NULL UNIQUE,
-                password_hash TEXT NOT NULL,
-                permission INTEGER NOT NULL
+    def _configure_connection(self, connection: sqlite3.Connection) -> None:
+        """Apply the connection settings to a new connection.
+
+        WAL journaling lets readers and a writer work at the same time, and
+        the busy timeout (ms) makes a blocked writer wait instead of failing
+        straight away. cache_size follows SQLite: negative values are KiB.
+        The database is migrated first, as the connection's stock ledger
+        trigger needs the StockMovements table.
+        """
+        connection.execute(f"PRAGMA journal_mode = {self.journal_mode};")
+        connection.execute(f"PRAGMA synchronous = {self.synchronous};")
+        connection.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)};")
+        connection.execute(f"PRAGMA cache_size = {int(self.cache_size)};")
+        connection.execute(f"PRAGMA mmap_size = {int(self.mmap_size)};")
+        migrate(connection)
+        # The ledger triggers record no account. This connection's own trigger writes the movement
+        # with the account it acts for instead, and drops the one without (RAISE(IGNORE) skips only
+        # that insert). Temp objects are private to the connection, other clients never see them.
+        connection.execute("CREATE TEMP TABLE InventoryAccount(account_id INTEGER);")
+        connection.execute("INSERT INTO temp.InventoryAccount (account_id) VALUES (NULL);")
+        connection.execute("""
+        CREATE TEMP TRIGGER trg_movement_account BEFORE INSERT ON main.StockMovements
+        WHEN NEW.account_id IS NULL AND (SELECT account_id FROM temp.InventoryAccount) IS NOT NULL
+        BEGIN
+            INSERT INTO StockMovements (item_id, kind, quantity_delta, defective_delta, account_id, created_at)
+            VALUES (
+                NEW.item_id, NEW.kind, NEW.quantity_delta, NEW.defective_delta,
+                (SELECT account_id FROM temp.InventoryAccount), NEW.created_at
             );
-            """)
-            self.connection.commit()
+            SELECT RAISE(IGNORE);
+        END;
+        """)
+        connection.commit()
+        self._connection_accounts[connection] = (None, False)
+
+    def _use_acting_account(self, connection: sqlite3.Connection) -> None:
+        """Store the calling thread's acting account in the connection it is about to use, if it changed.
+
+        Outside a transaction the account is committed straight away. Inside
+        one it is only trusted until the transaction ends, as a rollback
+        would undo it.
+        """
+        account_id = self.acting_account_id()
+        stored = self._connection_accounts.get(connection)
+        if stored is not None and stored[0] == account_id and (not stored[1] or connection.in_transaction):
+            return
+        in_transaction = connection.in_transaction
+        connection.execute("UPDATE temp.InventoryAccount SET account_id = ?;", (account_id,))
+        if not in_transaction:
+            connection.commit()
+        self._connection_accounts[connection] = (account_id, in_transaction)
+
+    def acting_account_id(self) -> int | None:
+        """The account the calling thread is acting as, see acting_as()."""
+        return getattr(self._acting, "account_id", None)
+
+    @contextmanager
+    def acting_as(self, account_id: int | None) -> Iterator["DatabaseService"]:
+        """Attribute the stock movements made by this thread inside the block to an account.
+
+        The account is stored in each connection the thread borrows, for its stock ledger trigger to read.
+        """
+        previous = self.acting_account_id()
+        self._acting.account_id = account_id
+        try:
+            yield self
+        finally:
+            self._acting.account_id = previous
+
+    def flush(self) -> int:
+        """Commit the queued Item stock changes now, returning how many item changes were written."""
+        if self.write_behind is None:
+            return 0
+        return self.write_behind.flush()
+
+    def disconnect(self) -> None:
+        """Disconnect from the database, committing any queued stock changes first"""
+        if self.write_behind is not None:
+            self.write_behind.close()
+        self.pool.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator["DatabaseService"]:
+        """Group several item and account operations on this thread into a single commit.
+
+        Commits when the outermost block exits and rolls back if it raises.
+        Nested blocks are savepoints: one that raises undoes only its own
+        writes, and the enclosing transaction carries on if the error is caught.
+        """
+        state = self.pool.local()
+        depth = state.transaction_depth
+        connection = state.connection
+        if depth:
+            # Before BEGIN, so an account stored in a transaction since rolled back is not trusted
+            self._use_acting_account(connection)
+            # A savepoint outside BEGIN would start a transaction that its release commits
+            if not connection.in_transaction:
+                connection.execute("BEGIN;")
+            connection.execute(f"SAVEPOINT nested_{depth};")
+        state.transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            if depth and connection.in_transaction:
+                connection.execute(f"ROLLBACK TO nested_{depth};")
+                connection.execute(f"RELEASE nested_{depth};")
+                # The acting account may have been stored inside the savepoint
+                self._connection_accounts.pop(connection, None)
+            elif not depth:
+                connection.rollback()
+            if isinstance(self.items, CachedItemOperations):
+                self.items.clear()
+            raise
+        else:
+            if depth:
+                connection.execute(f"RELEASE nested_{depth};")
+            else:
+                connection.commit()
+        finally:
+            state.transaction_depth -= 1
+
+
+# Shared service, created on first use by get_db()
+db: StorageService | None = None
+_database_file: str | None = None
+_backend: str = "sqlite"
+_settings: dict = {}
+
+# Storage backends get_db() can create, see StorageService
+BACKENDS = ("sqlite", "memory")
+
+
+def configure(database_file: str | None = None, backend: str = "sqlite", **settings) -> None:
+    """Set the database file, storage backend and its settings used by get_db().
+
+    The "sqlite" backend is a DatabaseService on the file. The "memory"
+    backend is a MemoryDatabaseService snapshotting to the file. Without a
+    database file the INVENTORY_DB environment variable is used, falling
+    back to inventory.db, or inventory.json in memory. Closes the shared
+    service if it is open.
+    """
+    global db, _database_file, _backend, _settings
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend {backend!r}")
+    if db is not None:
+        db.disconnect()
+        db = None
+    _database_file = database_file
+    _backend = backend
+    _settings = settings
 
 
-db = DatabaseService("inventory.db")
\ No newline at end of file
+def get_db() -> StorageService:
+    """Return the shared service of the configured backend, connecting on the first call."""
+    global db
+    if db is None:
+        if _backend == "memory":
+            # Imported here, as it builds on this module
+            from database.memoryDatabaseService import MemoryDatabaseService
+            db = MemoryDatabaseService(_database_file or os.environ.get("INVENTORY_DB", "inventory.json"), **_settings)
+        else:
+            db = DatabaseService(_database_file or os.environ.get("INVENTORY_DB", "inventory.db"), **_settings)
+    return db
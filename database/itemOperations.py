@@ -1,54 +1,397 @@
+import re
 import sqlite3
+import string
+from itertools import islice
+from typing import Iterable, Iterator
 from classes.item import Item
+from database.retry import retry_on_locked
+from database.versionConflictError import VersionConflictError
+
+# Folds ASCII letters only, like SQLite's NOCASE collation and LIKE
+_NOCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def nocase(text: str) -> str:
+    """Key of a name under SQLite's NOCASE collation."""
+    return text.translate(_NOCASE)
+
+
+def _chunks(rows: Iterable, size: int) -> Iterator[list]:
+    """Split an iterable into lists of at most `size` elements."""
+    if size < 1:
+        raise ValueError("Chunk size must be at least 1")
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class DuplicateItemError(ValueError):
+    """Raised when an item name is already taken, ignoring case."""
+
+
+def _is_duplicate_name(error: sqlite3.IntegrityError) -> bool:
+    """Check whether an IntegrityError comes from the unique item name index."""
+    return "UNIQUE constraint failed: Items.name" in str(error)
+
 
 class ItemOperations:
-    """Class to handle item operations in the database."""
-    def __init__(self, cursor: sqlite3.Cursor, connection: sqlite3.Connection):
-        self.cursor = cursor
-        self.connection = connection
+    """Class to handle item operations in the database.
+
+    Every call borrows a connection from the service's pool and uses its own cursor.
+    """
+    def __init__(self, db):
+        # Service lending connections, also handed to the items we load
+        self.db = db
+        # Write retries once the busy timeout has run out, see retry_on_locked
+        self.retry_attempts = 5
+        self.retry_delay = 0.05
+        # Whether search() uses the ItemsSearch full-text index, detected on first use if None
+        self.full_text_search: bool | None = None
+
+    @property
+    def autocommit(self) -> bool:
+        """Whether each operation commits on its own."""
+        return self.db.autocommit
+
+    def _records(self, connection: sqlite3.Connection) -> sqlite3.Cursor:
+        """New cursor whose rows come back as Item records bound to this operations' service."""
+        cursor = connection.cursor()
+        cursor.row_factory = self._item_row_factory
+        return cursor
+
+    def _item_row_factory(self, cursor: sqlite3.Cursor, row: tuple) -> Item:
+        """sqlite3 row factory building Item records bound to this operations' service."""
+        return Item.from_row(row, self.db)
+
+    def _commit(self, connection: sqlite3.Connection) -> None:
+        """Commit the current transaction unless a caller is grouping operations."""
+        if self.autocommit:
+            connection.commit()
+
+    def _rollback(self, connection: sqlite3.Connection) -> None:
+        """Roll back the current transaction unless a caller is grouping operations."""
+        if self.autocommit:
+            connection.rollback()
     
+    @retry_on_locked
     def add_item(self, name: str, category: int, quantity: int = 0, defective_quantity: int = 0) -> None:
-        """Add a new item to the Items table."""
-        self.cursor.execute("""
+        """Add a new item to the Items table.
+
+        Raises DuplicateItemError if an item with the same name exists, ignoring case.
+        """
+        with self.db.borrow() as connection:
+            try:
+                self.db.execute(connection, """
+                INSERT INTO Items (name, category, quantity, defective_quantity)
+                VALUES (?, ?, ?, ?);
+                """, (name, category, quantity, defective_quantity))
+            except sqlite3.IntegrityError as error:
+                if _is_duplicate_name(error):
+                    raise DuplicateItemError(f"Item with the name '{name}' already exists") from error
+                raise
+            self._commit(connection)
+
+    @retry_on_locked
+    def delete_item(self, item_id: int, version: int | None = None) -> None:
+        """Delete an item from the Items table by ID.
+
+        With a `version`, raises VersionConflictError unless the item is still at that version.
+        """
+        with self.db.borrow() as connection:
+            if version is None:
+                self.db.execute(connection, """
+                DELETE FROM Items
+                WHERE id = ?;
+                """, (item_id,))
+            elif not self.db.execute(connection, """
+                DELETE FROM Items
+                WHERE id = ? AND version = ?;
+                """, (item_id, version)).rowcount:
+                raise VersionConflictError(f"Item {item_id} was changed or deleted since version {version}")
+            self._commit(connection)
+
+    @retry_on_locked
+    def update_item(self, item_id: int, name: str, category: int, quantity: int, defective_quantity: int,
+                    version: int | None = None) -> int | None:
+        """Update an existing item in the Items table and return its new version, or None if it does not exist.
+
+        With a `version`, the update only happens if nobody changed the item
+        since that version was read, and VersionConflictError is raised otherwise.
+        Raises DuplicateItemError if another item has the new name, ignoring case.
+        """
+        with self.db.borrow() as connection:
+            try:
+                if version is None:
+                    row = self.db.fetchone(connection, """
+                    UPDATE Items
+                    SET name = ?, category = ?, quantity = ?, defective_quantity = ?, version = version + 1
+                    WHERE id = ?
+                    RETURNING version;
+                    """, (name, category, quantity, defective_quantity, item_id))
+                else:
+                    row = self.db.fetchone(connection, """
+                    UPDATE Items
+                    SET name = ?, category = ?, quantity = ?, defective_quantity = ?, version = version + 1
+                    WHERE id = ? AND version = ?
+                    RETURNING version;
+                    """, (name, category, quantity, defective_quantity, item_id, version))
+            except sqlite3.IntegrityError as error:
+                if _is_duplicate_name(error):
+                    raise DuplicateItemError(f"Item with the name '{name}' already exists") from error
+                raise
+            if version is not None and row is None:
+                raise VersionConflictError(f"Item {item_id} was changed or deleted since version {version}")
+            self._commit(connection)
+        return row[0] if row else None
+
+    @retry_on_locked
+    def adjust_stock(self, item_id: int, quantity_delta: int, defective_delta: int = 0) -> tuple[int, int] | None:
+        """Atomically apply quantity deltas to an item in a single statement.
+
+        The update only happens if neither quantity would drop below zero, so
+        concurrent callers cannot lose each other's changes. Returns the new
+        (quantity, defective_quantity), or None if the item does not exist or
+        does not hold enough stock.
+        """
+        with self.db.borrow() as connection:
+            row = self.db.fetchone(connection, """
+            UPDATE Items
+            SET quantity = quantity + ?, defective_quantity = defective_quantity + ?, version = version + 1
+            WHERE id = ? AND quantity >= ? AND defective_quantity >= ?
+            RETURNING quantity, defective_quantity;
+            """, (quantity_delta, defective_delta, item_id, max(-quantity_delta, 0), max(-defective_delta, 0)))
+            self._commit(connection)
+        if row:
+            return row[0], row[1]
+        return
+
+    def _execute_chunked(self, sql: str, rows: Iterable[tuple], chunk_size: int) -> list[int]:
+        """Run `sql` with executemany over `rows` in chunks, committing once at the end.
+
+        Returns the number of affected rows for each chunk.
+        """
+        results = []
+        with self.db.borrow() as connection:
+            cursor = connection.cursor()
+            try:
+                for chunk in _chunks(rows, chunk_size):
+                    self.db.executemany(cursor, sql, chunk)
+                    results.append(cursor.rowcount)
+            except sqlite3.IntegrityError as error:
+                self._rollback(connection)
+                if _is_duplicate_name(error):
+                    raise DuplicateItemError("Batch contains an item name that already exists") from error
+                raise
+            except Exception:
+                self._rollback(connection)
+                raise
+            self._commit(connection)
+        return results
+
+    def add_items(self, rows: Iterable[tuple], chunk_size: int = 500) -> list[int]:
+        """Add many items to the Items table in a single transaction.
+
+        Each row is (name, category, quantity, defective_quantity); the last two may be omitted.
+        Returns the number of inserted rows for each chunk.
+        """
+        def normalise(row: tuple) -> tuple:
+            name, category, *rest = row
+            quantity = rest[0] if len(rest) > 0 else 0
+            defective_quantity = rest[1] if len(rest) > 1 else 0
+            return (name, category, quantity, defective_quantity)
+
+        return self._execute_chunked("""
         INSERT INTO Items (name, category, quantity, defective_quantity)
         VALUES (?, ?, ?, ?);
-        """, (name, category, quantity, defective_quantity))
-        self.connection.commit()
+        """, (normalise(row) for row in rows), chunk_size)
 
-    def delete_item(self, item_id: int) -> None:
-        """Delete an item from the Items table by ID."""
-        self.cursor.execute("""
-        DELETE FROM Items
-        WHERE id = ?;
-        """, (item_id,))
-        self.connection.commit()
+    def upsert_items(self, rows: Iterable[tuple], chunk_size: int = 500) -> list[int]:
+        """Add many items in a single transaction, overwriting items with the same name, ignoring case.
+
+        Each row is (name, category, quantity, defective_quantity). An existing
+        item keeps its ID and name. Returns the number of written rows for each chunk.
+        """
+        return self._execute_chunked("""
+        INSERT INTO Items (name, category, quantity, defective_quantity)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (name COLLATE NOCASE) DO UPDATE
+        SET category = excluded.category, quantity = excluded.quantity, defective_quantity = excluded.defective_quantity,
+            version = version + 1;
+        """, rows, chunk_size)
 
-    def update_item(self, item_id: int, name: str, category: int, quantity: int, defective_quantity: int) -> None:
-        """Update an existing item in the Items table."""
-        self.cursor.execute("""
+    def update_items(self, rows: Iterable[tuple], chunk_size: int = 500) -> list[int]:
+        """Update many items in the Items table in a single transaction.
+
+        Each row is (item_id, name, category, quantity, defective_quantity), matching `update_item`.
+        Returns the number of updated rows for each chunk.
+        """
+        return self._execute_chunked("""
         UPDATE Items
-        SET name = ?, category = ?, quantity = ?, defective_quantity = ?
+        SET name = ?, category = ?, quantity = ?, defective_quantity = ?, version = version + 1
+        WHERE id = ?;
+        """, ((*row[1:], row[0]) for row in rows), chunk_size)
+
+    def delete_items(self, item_ids: Iterable[int], chunk_size: int = 500) -> list[int]:
+        """Delete many items from the Items table by ID in a single transaction.
+
+        Returns the number of deleted rows for each chunk.
+        """
+        return self._execute_chunked("""
+        DELETE FROM Items
         WHERE id = ?;
-        """, (name, category, quantity, defective_quantity, item_id))
-        self.connection.commit()
+        """, ((item_id,) for item_id in item_ids), chunk_size)
 
     def get_item(self, item_id: int) -> Item | None:
         """Retrieve an item from the Items table by ID."""
-        self.cursor.execute("""
-        SELECT * FROM Items
-        WHERE id = ?;
-        """, (item_id,))
-        row = self.cursor.fetchone()
-        if row:
-            return Item(id=row[0], name=row[1], category=row[2], quantity=row[3], defective_quantity=row[4])
-        return 
+        with self.db.borrow() as connection:
+            return self.db.fetchone(self._records(connection), """
+            SELECT id, name, category, quantity, defective_quantity, version FROM Items
+            WHERE id = ?;
+            """, (item_id,))
     
+    def get_item_by_name(self, name: str) -> Item | None:
+        """Retrieve an item from the Items table by name, ignoring case."""
+        with self.db.borrow() as connection:
+            return self.db.fetchone(self._records(connection), """
+            SELECT id, name, category, quantity, defective_quantity, version FROM Items
+            WHERE name = ? COLLATE NOCASE;
+            """, (name,))
+
+    def page(self, after_id: int = 0, limit: int = 100) -> list[Item]:
+        """Retrieve up to `limit` items with an ID greater than `after_id`, ordered by ID.
+
+        Pass the ID of the last item of a page as `after_id` to get the next one.
+        """
+        with self.db.borrow() as connection:
+            return self.db.fetchall(self._records(connection), """
+            SELECT id, name, category, quantity, defective_quantity, version FROM Items
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?;
+            """, (after_id, limit))
+
+    def search(self, query: str, limit: int = 20) -> list[Item]:
+        """Find up to `limit` items whose name contains words starting with each word of `query`.
+
+        Results are ranked by relevance using the ItemsSearch full-text index.
+        Without FTS5, only names starting with `query` are found, in name order,
+        using the name index.
+        """
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+        if self.full_text_search is None:
+            with self.db.borrow() as connection:
+                self.full_text_search = self.db.fetchone(
+                    connection, "SELECT 1 FROM sqlite_master WHERE name = 'ItemsSearch';"
+                ) is not None
+
+        with self.db.borrow() as connection:
+            if self.full_text_search:
+                # Every word as a quoted prefix, so user input cannot form FTS5 syntax
+                match = " ".join(f'"{word}"*' for word in words)
+                return self.db.fetchall(self._records(connection), """
+                SELECT Items.id, Items.name, Items.category, Items.quantity, Items.defective_quantity, Items.version
+                FROM ItemsSearch JOIN Items ON Items.id = ItemsSearch.rowid
+                WHERE ItemsSearch MATCH ?
+                ORDER BY rank
+                LIMIT ?;
+                """, (match, limit))
+            prefix = re.sub(r"([\\%_])", r"\\\1", query.strip())
+            return self.db.fetchall(self._records(connection), """
+            SELECT id, name, category, quantity, defective_quantity, version FROM Items
+            WHERE name LIKE ? ESCAPE '\\'
+            ORDER BY name COLLATE NOCASE
+            LIMIT ?;
+            """, (prefix + "%", limit))
+
+    def nth_id(self, position: int) -> int | None:
+        """Return the ID of the item at zero-based `position` in ID order, or None past the end.
+
+        Used to find the `after_id` of a page without reading the items before it.
+        """
+        with self.db.borrow() as connection:
+            row = self.db.fetchone(connection, """
+            SELECT id FROM Items
+            ORDER BY id
+            LIMIT 1 OFFSET ?;
+            """, (position,))
+        return row[0] if row else None
+
+    def count(self) -> int:
+        """Return the number of items, from the trigger-maintained CategoryTotals table."""
+        with self.db.borrow() as connection:
+            return self.db.fetchone(connection, "SELECT COALESCE(SUM(items), 0) FROM CategoryTotals;")[0]
+
+    def iter_items(self, batch_size: int = 500, after_id: int = 0) -> Iterator[Item]:
+        """Iterate over all items ordered by ID, holding at most `batch_size` in memory.
+
+        Each batch is a separate keyset query that is fully read before any item
+        is yielded, so other operations may run while the iteration is paused.
+        """
+        while True:
+            items = self.page(after_id, batch_size)
+            yield from items
+            if len(items) < batch_size:
+                return
+            after_id = items[-1].id
+
     def get_all_items(self) -> list[Item] | None:
         """Retrieve all items from the Items table."""
-        self.cursor.execute("""
-        SELECT * FROM Items;
-        """)
-        rows = self.cursor.fetchall()
-        if rows:
-            return [Item(id=row[0], name=row[1], category=row[2], quantity=row[3], defective_quantity=row[4]) for row in rows]
+        with self.db.borrow() as connection:
+            items = self.db.fetchall(self._records(connection), """
+            SELECT id, name, category, quantity, defective_quantity, version FROM Items;
+            """)
+        if items:
+            return items
         return 
+
+    def summary(self) -> dict[int, tuple[int, int, int]]:
+        """Return (working, defective, total) quantities per category that has items.
+
+        Reads the trigger-maintained CategoryTotals table, so the cost depends
+        on the number of categories rather than items.
+        """
+        with self.db.borrow() as connection:
+            rows = self.db.fetchall(connection, """
+            SELECT category, quantity, defective_quantity FROM CategoryTotals
+            WHERE items > 0
+            ORDER BY category;
+            """)
+        return {category: (quantity, defective, quantity + defective) for category, quantity, defective in rows}
+
+    def check_summary(self) -> list[tuple[int, tuple, tuple]]:
+        """Recompute the category totals from Items and compare them with CategoryTotals.
+
+        Returns (category, stored, actual) for each category whose
+        (items, quantity, defective_quantity) differ, an empty list if they all match.
+        """
+        with self.db.borrow() as connection:
+            stored = {row[0]: row[1:] for row in self.db.fetchall(connection, """
+            SELECT category, items, quantity, defective_quantity FROM CategoryTotals
+            WHERE items != 0 OR quantity != 0 OR defective_quantity != 0;
+            """)}
+            actual = {row[0]: row[1:] for row in self.db.fetchall(connection, """
+            SELECT category, COUNT(*), SUM(quantity), SUM(defective_quantity) FROM Items
+            GROUP BY category;
+            """)}
+        return [
+            (category, stored.get(category, (0, 0, 0)), actual.get(category, (0, 0, 0)))
+            for category in sorted(stored.keys() | actual.keys())
+            if stored.get(category) != actual.get(category)
+        ]
+
+    @retry_on_locked
+    def rebuild_summary(self) -> None:
+        """Recompute CategoryTotals from Items, repairing any drift found by `check_summary`."""
+        with self.db.borrow() as connection:
+            self.db.execute(connection, "DELETE FROM CategoryTotals;")
+            self.db.execute(connection, """
+            INSERT INTO CategoryTotals (category, items, quantity, defective_quantity)
+            SELECT category, COUNT(*), SUM(quantity), SUM(defective_quantity) FROM Items
+            GROUP BY category;
+            """)
+            self._commit(connection)
@@ -0,0 +1,190 @@
+import csv
+import json
+import time
+from itertools import islice
+from typing import Callable, Iterable, Iterator, TextIO
+from classes.item import Item
+from database.itemOperations import _chunks
+from enums.category import Category
+
+# Columns of an import or export file, in order
+FIELDS = ("name", "category", "quantity", "defective_quantity")
+
+# Category names and their values, e.g. "Parts" -> 1
+CATEGORIES = {name: value for name, value in vars(Category).items() if not name.startswith("__")}
+
+
+def read_csv(file: TextIO) -> Iterator[tuple[int, dict]]:
+    """Yield (line number, record) for each row of a CSV file with a header row."""
+    reader = csv.DictReader(file)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def read_jsonl(file: TextIO) -> Iterator[tuple[int, str]]:
+    """Yield (line number, text) for each non-blank line of a JSON-lines file.
+
+    Lines are decoded by `parse_record`, so a malformed line is rejected like any other invalid record.
+    """
+    for line_number, line in enumerate(file, 1):
+        if line.strip():
+            yield line_number, line
+
+
+def _parse_int(value, field: str) -> int:
+    """Convert a CSV or JSON value to an int."""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"{field} must be an integer")
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{field} must be an integer") from None
+
+
+def parse_record(record: dict | str) -> tuple[str, int, int, int]:
+    """Validate a record, returning a (name, category, quantity, defective_quantity) row.
+
+    The category may be given by value or by name. Quantities follow the same
+    rules as Item. Raises ValueError describing the first problem found.
+    """
+    if isinstance(record, str):
+        try:
+            record = json.loads(record)
+        except json.JSONDecodeError as error:
+            raise ValueError(f"Invalid JSON: {error.msg}") from None
+    if not isinstance(record, dict):
+        raise ValueError("Record must be an object")
+
+    name = record.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("name is required")
+    category = record.get("category")
+    if isinstance(category, str) and category in CATEGORIES:
+        category = CATEGORIES[category]
+    else:
+        category = _parse_int(category, "category")
+        if category not in CATEGORIES.values():
+            raise ValueError(f"Unknown category {category}")
+    # Missing or empty quantities default to zero, as in ItemOperations.add_item
+    quantity = _parse_int(record.get("quantity") or 0, "quantity")
+    defective_quantity = _parse_int(record.get("defective_quantity") or 0, "defective_quantity")
+
+    item = Item(None, name.strip(), category, quantity, defective_quantity)
+    return item.name, item.category, item.quantity, item.defective_quantity
+
+
+class ImportReport:
+    """Counts and timing of an import."""
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        # Records committed by an earlier, interrupted run of the same source
+        self.skipped = 0
+        self.chunks = 0
+        self.seconds = 0.0
+
+    @property
+    def records_per_second(self) -> float:
+        """Records read per second, rejected ones included."""
+        if not self.seconds:
+            return 0.0
+        return (self.imported + self.rejected) / self.seconds
+
+
+def get_progress(db, source: str) -> int:
+    """Return the number of records of `source` committed by earlier imports."""
+    with db.borrow() as connection:
+        row = db.fetchone(connection, "SELECT records FROM ImportProgress WHERE source = ?;", (source,))
+    return row[0] if row else 0
+
+
+def _save_progress(db, source: str, records: int) -> None:
+    """Record that the first `records` records of `source` are committed, within the caller's transaction."""
+    with db.borrow() as connection:
+        db.execute(connection, """
+        INSERT INTO ImportProgress (source, records) VALUES (?, ?)
+        ON CONFLICT (source) DO UPDATE SET records = excluded.records;
+        """, (source, records))
+
+
+def clear_progress(db, source: str) -> None:
+    """Forget the progress of `source`, so the next import starts from the first record."""
+    with db.transaction(), db.borrow() as connection:
+        db.execute(connection, "DELETE FROM ImportProgress WHERE source = ?;", (source,))
+
+
+def import_items(
+    db,
+    records: Iterable[tuple[int, dict | str]],
+    source: str | None = None,
+    chunk_size: int = 500,
+    on_reject: Callable[[int, str], None] | None = None,
+) -> ImportReport:
+    """Upsert items by name from (line number, record) pairs, such as `read_csv` yields.
+
+    Records are validated with `parse_record` and written one chunk per
+    transaction, so at most `chunk_size` records are held in memory. Invalid
+    records are passed to `on_reject` with the reason and skipped. When a
+    `source` is given, the number of committed records is saved with each
+    chunk, and a later import of the same source continues after them. The
+    progress is dropped once the source has been fully imported.
+    """
+    report = ImportReport()
+    start = time.perf_counter()
+    done = 0
+    if source is not None:
+        done = report.skipped = get_progress(db, source)
+        records = islice(records, done, None)
+
+    for chunk in _chunks(records, chunk_size):
+        rows = []
+        for line_number, record in chunk:
+            try:
+                rows.append(parse_record(record))
+            except ValueError as error:
+                report.rejected += 1
+                if on_reject:
+                    on_reject(line_number, str(error))
+        done += len(chunk)
+        with db.transaction():
+            if rows:
+                db.items.upsert_items(rows, chunk_size)
+            if source is not None:
+                _save_progress(db, source, done)
+        report.imported += len(rows)
+        report.chunks += 1
+
+    if source is not None:
+        clear_progress(db, source)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def write_csv(items: Iterable[Item], file: TextIO) -> int:
+    """Write items to a CSV file with a header row, returning the number written."""
+    writer = csv.writer(file)
+    writer.writerow(FIELDS)
+    count = 0
+    for item in items:
+        writer.writerow((item.name, item.category, item.quantity, item.defective_quantity))
+        count += 1
+    return count
+
+
+def write_jsonl(items: Iterable[Item], file: TextIO) -> int:
+    """Write items as one JSON object per line, returning the number written."""
+    count = 0
+    for item in items:
+        file.write(json.dumps(dict(zip(FIELDS, (item.name, item.category, item.quantity, item.defective_quantity)))))
+        file.write("\n")
+        count += 1
+    return count
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl}
+
+
+def export_items(db, file: TextIO, file_format: str = "csv", batch_size: int = 500) -> int:
+    """Stream every item, ordered by ID, to `file` in `file_format`, returning the number written."""
+    return WRITERS[file_format](db.items.iter_items(batch_size), file)
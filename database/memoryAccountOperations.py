@@ -0,0 +1,127 @@
+import hmac
+import sqlite3
+from classes.account import Account
+from database.committedRead import committed_read
+from database.versionConflictError import VersionConflictError
+
+
+class MemoryAccountOperations:
+    """Account and login failure storage in dictionaries, with the same behaviour as AccountOperations.
+
+    Accounts are (id, username, password_hash, permission, kdf, salt,
+    kdf_params, version) tuples keyed by ID, with an index by username.
+    Login failures are (failures, locked_until) tuples keyed by (account ID, source).
+    """
+    def __init__(self, db):
+        # Service holding the write lock
+        self.db = db
+        self._rows: dict[int, tuple] = {}
+        self._ids_by_username: dict[str, int] = {}
+        self._failures: dict[tuple[int, str], tuple] = {}
+        # IDs are never reused, like AUTOINCREMENT
+        self.next_id = 1
+
+    @property
+    def autocommit(self) -> bool:
+        """Whether each operation commits on its own."""
+        return self.db.autocommit
+
+    def _apply(self, account_id: int, row: tuple | None) -> tuple | None:
+        """Store or, for None, remove an account row and update the index. Returns the previous row."""
+        old = self._rows.pop(account_id, None)
+        if old is not None:
+            del self._ids_by_username[old[1]]
+        if row is not None:
+            self._rows[account_id] = row
+            self._ids_by_username[row[1]] = account_id
+            self.next_id = max(self.next_id, account_id + 1)
+        return old
+
+    def _apply_failures(self, key: tuple[int, str], row: tuple | None) -> tuple | None:
+        """Store or, for None, remove an account's login failures from a source. Returns the previous ones."""
+        old = self._failures.pop(key, None)
+        if row is not None:
+            self._failures[key] = row
+        return old
+
+    def _write(self, account_id: int, row: tuple | None) -> None:
+        self.db.record_change("accounts", account_id, self._apply(account_id, row))
+
+    def _write_failures(self, key: tuple[int, str], row: tuple | None) -> None:
+        self.db.record_change("failures", key, self._apply_failures(key, row))
+
+    def create_account(self, username: str, password_hash: str, permission: int,
+                       kdf: str = "sha256", salt: str | None = None, kdf_params: str | None = None) -> Account | None:
+        """Create a new account."""
+        with self.db.transaction():
+            for column, value in (("username", username), ("password_hash", password_hash), ("permission", permission)):
+                if value is None:
+                    raise sqlite3.IntegrityError(f"NOT NULL constraint failed: Accounts.{column}")
+            if username in self._ids_by_username:
+                raise sqlite3.IntegrityError("UNIQUE constraint failed: Accounts.username")
+            self._write(self.next_id, (self.next_id, username, password_hash, permission, kdf, salt, kdf_params, 0))
+        return self.get_account(username)
+
+    @committed_read
+    def get_account(self, username: str) -> Account | None:
+        """Retrieve an account by username."""
+        account_id = self._ids_by_username.get(username)
+        row = self._rows.get(account_id) if account_id is not None else None
+        return Account.from_row(row) if row is not None else None
+
+    def get_account_by_username(self, username: str, password_hash: str) -> Account | None:
+        """Retrieve an account by username and password hash.
+
+        The hash is compared in constant time after looking the username up.
+        """
+        account = self.get_account(username)
+        if account and hmac.compare_digest(account.password_hash.encode(), password_hash.encode()):
+            return account
+        return
+
+    def update_password_hash(self, account_id: int, password_hash: str, kdf: str, salt: str | None, kdf_params: str | None,
+                             version: int | None = None) -> None:
+        """Replace an account's password hash and the parameters it was derived with.
+
+        With a `version`, raises VersionConflictError unless the account is still at that version.
+        """
+        with self.db.transaction():
+            row = self._rows.get(account_id)
+            if version is not None and (row is None or row[7] != version):
+                raise VersionConflictError(f"Account {account_id} was changed or deleted since version {version}")
+            if row is not None:
+                self._write(account_id, (*row[:2], password_hash, row[3], kdf, salt, kdf_params, row[7] + 1))
+
+    def delete_account(self, account_id: int) -> None:
+        """Delete an account and its login failures by ID."""
+        with self.db.transaction():
+            if account_id in self._rows:
+                self._write(account_id, None)
+            for key in [key for key in self._failures if key[0] == account_id]:
+                self._write_failures(key, None)
+
+    @committed_read
+    def get_login_failures(self, account_id: int, source: str = "") -> tuple[int, float | None] | None:
+        """Return an account's (consecutive failures, locked until) from a source, or None if it has none."""
+        return self._failures.get((account_id, source))
+
+    def record_login_failure(self, account_id: int, source: str, threshold: int, lockout_seconds: float,
+                             now: float) -> float | None:
+        """Count a failed login from a source, locking the account for that source once `threshold` failures happen in a row.
+
+        Returns the time the account is locked until, or None if it is not locked.
+        """
+        with self.db.transaction():
+            failures, locked_until = self._failures.get((account_id, source), (0, None))
+            if failures + 1 >= threshold:
+                # Start counting again once the lockout is over
+                self._write_failures((account_id, source), (0, now + lockout_seconds))
+                return now + lockout_seconds
+            self._write_failures((account_id, source), (failures + 1, locked_until))
+        return
+
+    def clear_login_failures(self, account_id: int, source: str = "") -> None:
+        """Forget an account's failed logins from a source after it logs in successfully from there."""
+        with self.db.transaction():
+            if (account_id, source) in self._failures:
+                self._write_failures((account_id, source), None)
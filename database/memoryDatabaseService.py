@@ -0,0 +1,316 @@
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, TypeVar
+from database.databaseService import DatabaseService
+from database.memoryAccountOperations import MemoryAccountOperations
+from database.memoryItemOperations import MemoryItemOperations
+
+try:
+    import fcntl
+except ImportError:
+    # Windows locks files with msvcrt instead
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class MemoryDatabaseService:
+    """In-memory storage backend, a drop-in for DatabaseService where reads must not touch disk.
+
+    Items and accounts live in dictionaries with secondary indexes, see
+    MemoryItemOperations and MemoryAccountOperations, so a lookup is a few
+    dictionary reads and takes no lock while no transaction is open. Writes
+    are serialised by one lock; a transaction() holds it until the
+    outermost block exits, and undoes its writes if the block raises.
+    Readers on other threads never see a transaction's writes before it
+    commits: a read overlapping another thread's transaction waits for it,
+    see read().
+
+    With a `snapshot_file`, every committed transaction is appended as one
+    line to `snapshot_file + ".journal"`, and every `snapshot_seconds` all
+    rows are written to the snapshot file atomically and the journal is
+    emptied. On startup the snapshot is loaded and the journal replayed, so
+    a crash loses no committed write, or with `fsync` off, only what the
+    operating system had not written out. Without a file nothing is kept.
+    Only one service may use a snapshot file at a time: it holds an
+    exclusive lock on `snapshot_file + ".lock"` until disconnected, and
+    another one is refused with RuntimeError.
+
+    There is no stock ledger or full-text index; search() matches word
+    prefixes with its own ranking.
+    """
+    items: MemoryItemOperations
+    accounts: MemoryAccountOperations
+    write_behind: None
+
+    def __init__(self, snapshot_file: str | None = None, snapshot_seconds: float = 60, fsync: bool = False):
+        self.snapshot_file = snapshot_file
+        self.journal_file = snapshot_file + ".journal" if snapshot_file else None
+        self.snapshot_seconds = snapshot_seconds
+        self.fsync = fsync
+        # Writes are committed straight away, there is nothing to batch
+        self.write_behind = None
+        self.snapshots = 0
+        self._lock = threading.RLock()
+        # Transaction depth and acting account of each thread
+        self._local = threading.local()
+        self._acting = threading.local()
+        # (table, key, previous row) of every write in the open transaction, in order
+        self._changes: list[tuple] = []
+        # Odd while a transaction is open, bumped when one starts and when it ends, see read()
+        self._sequence = 0
+        # Whether anything was journaled since the last snapshot
+        self._dirty = False
+        self.items = MemoryItemOperations(self)
+        self.accounts = MemoryAccountOperations(self)
+        # table -> (rows by key, function storing a row and returning the previous one)
+        self._tables = {
+            "items": (self.items._rows, self.items._apply),
+            "accounts": (self.accounts._rows, self.accounts._apply),
+            "failures": (self.accounts._failures, self.accounts._apply_failures),
+        }
+        # Derived state that is undone on rollback but rebuilt from the rows on load, so never journaled
+        self._derived = {"totals": self.items._apply_totals}
+        self._journal = None
+        self._lock_file = None
+        self._stop = threading.Event()
+        if snapshot_file:
+            if os.path.exists(snapshot_file):
+                with open(snapshot_file, "rb") as file:
+                    if file.read(16).startswith(b"SQLite format 3"):
+                        raise ValueError(f"{snapshot_file} is a SQLite database, import it with load_sqlite()")
+            self._lock_snapshot_file()
+            try:
+                self._load()
+                self._journal = open(self.journal_file, "a", encoding="utf-8")
+                if self._dirty:
+                    self.snapshot()
+            except BaseException:
+                self._unlock_snapshot_file()
+                raise
+            threading.Thread(target=self._snapshot_periodically, name="inventory-snapshot", daemon=True).start()
+
+    def _lock_snapshot_file(self) -> None:
+        """Take the exclusive lock on the snapshot file's lock file, raising RuntimeError if another service holds it."""
+        self._lock_file = open(self.snapshot_file + ".lock", "a+b")
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self._lock_file.seek(0)
+                msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError as error:
+            self._lock_file.close()
+            self._lock_file = None
+            raise RuntimeError(f"{self.snapshot_file} is already in use by another inventory service") from error
+
+    def _unlock_snapshot_file(self) -> None:
+        """Release the snapshot file's lock, closing the lock file releases it."""
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    @property
+    def autocommit(self) -> bool:
+        """Whether operations commit on their own, i.e. no transaction() is open on this thread."""
+        return not getattr(self._local, "depth", 0)
+
+    def acting_account_id(self) -> int | None:
+        """The account the calling thread is acting as, see acting_as()."""
+        return getattr(self._acting, "account_id", None)
+
+    @contextmanager
+    def acting_as(self, account_id: int | None) -> Iterator["MemoryDatabaseService"]:
+        """Attribute the changes made by this thread inside the block to an account.
+
+        Kept for compatibility with DatabaseService, there is no ledger to record it in.
+        """
+        previous = self.acting_account_id()
+        self._acting.account_id = account_id
+        try:
+            yield self
+        finally:
+            self._acting.account_id = previous
+
+    def read(self, function: Callable[..., T], *args, **kwargs) -> T:
+        """Call a read so that it never sees another thread's uncommitted writes.
+
+        While no transaction is open the read takes no lock, and runs again
+        under the lock if one started meanwhile. A read overlapping another
+        thread's transaction waits for it to end. The thread holding the
+        transaction reads its own writes.
+        """
+        sequence = self._sequence
+        if not sequence % 2:
+            try:
+                result = function(*args, **kwargs)
+            except Exception:
+                # Possibly indexes changing under the read, which the locked run below won't see
+                if sequence == self._sequence:
+                    raise
+            else:
+                if sequence == self._sequence:
+                    return result
+        elif getattr(self._local, "depth", 0):
+            return function(*args, **kwargs)
+        with self._lock:
+            return function(*args, **kwargs)
+
+    def record_change(self, table: str, key, previous: tuple | None) -> None:
+        """Note a write of the open transaction, so it can be journaled or undone. Called with the lock held."""
+        self._changes.append((table, key, previous))
+
+    @contextmanager
+    def transaction(self) -> Iterator["MemoryDatabaseService"]:
+        """Group several item and account operations on this thread into a single commit.
+
+        Commits when the outermost block exits and undoes every write if it
+        raises. A nested block that raises undoes only its own writes, and
+        the enclosing transaction carries on if the error is caught.
+        """
+        with self._lock:
+            depth = getattr(self._local, "depth", 0)
+            if not depth:
+                self._changes = []
+                self._sequence += 1
+            start = len(self._changes)
+            next_ids = (self.items.next_id, self.accounts.next_id)
+            self._local.depth = depth + 1
+            try:
+                yield self
+                if not depth:
+                    self._write_journal()
+            except BaseException:
+                for table, key, previous in reversed(self._changes[start:]):
+                    apply = self._derived[table] if table in self._derived else self._tables[table][1]
+                    apply(key, previous)
+                del self._changes[start:]
+                self.items.next_id, self.accounts.next_id = next_ids
+                raise
+            finally:
+                self._local.depth = depth
+                if not depth:
+                    self._changes = []
+                    self._sequence += 1
+
+    def _entry(self, keys) -> str:
+        """JSON line holding the current rows of (table, key) pairs, None for removed ones."""
+        return json.dumps({
+            "next": [self.items.next_id, self.accounts.next_id],
+            "rows": [[table, key, self._tables[table][0].get(key)] for table, key in keys],
+        }, separators=(",", ":")) + "\n"
+
+    def _write_journal(self) -> None:
+        """Append the open transaction's writes to the journal, as the rows they left behind."""
+        keys = dict.fromkeys((table, key) for table, key, _ in self._changes if table not in self._derived)
+        if self._journal is None or not keys:
+            return
+        self._journal.write(self._entry(keys))
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        self._dirty = True
+
+    def _restore(self, entry: dict) -> None:
+        """Store the rows of a snapshot or journal entry."""
+        for table, key, row in entry["rows"]:
+            # JSON turns tuple keys, such as login failures' (account ID, source), into lists
+            key = tuple(key) if isinstance(key, list) else key
+            self._tables[table][1](key, tuple(row) if row is not None else None)
+        self.items.next_id = max(self.items.next_id, entry["next"][0])
+        self.accounts.next_id = max(self.accounts.next_id, entry["next"][1])
+
+    def _load(self) -> None:
+        """Load the snapshot file and replay the journal written after it."""
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, encoding="utf-8") as file:
+                self._restore(json.load(file))
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, encoding="utf-8") as file:
+                for line_number, line in enumerate(file, 1):
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Only a write cut short by a crash, which was never committed
+                        logger.warning("Skipping unreadable line %d of %s", line_number, self.journal_file)
+                        continue
+                    self._restore(entry)
+                    self._dirty = True
+
+    def snapshot(self) -> None:
+        """Write every row to the snapshot file atomically and empty the journal.
+
+        Writes wait while the snapshot is written, reads do not.
+        """
+        if not self.snapshot_file:
+            return
+        with self._lock:
+            if not self.autocommit:
+                raise RuntimeError("Cannot snapshot inside a transaction")
+            keys = [(table, key) for table, (rows, _) in self._tables.items() for key in rows]
+            temporary = self.snapshot_file + ".tmp"
+            with open(temporary, "w", encoding="utf-8") as file:
+                file.write(self._entry(keys))
+                file.flush()
+                os.fsync(file.fileno())
+            # Readers of the snapshot file see the old or the new one, never a partial one
+            os.replace(temporary, self.snapshot_file)
+            self._journal.seek(0)
+            self._journal.truncate()
+            self._dirty = False
+            self.snapshots += 1
+
+    def _snapshot_periodically(self) -> None:
+        """Take a snapshot every `snapshot_seconds` if anything changed, until disconnected."""
+        while not self._stop.wait(self.snapshot_seconds):
+            if self._dirty:
+                try:
+                    self.snapshot()
+                except Exception:
+                    logger.exception("Snapshot of %s failed", self.snapshot_file)
+
+    def load_sqlite(self, database_file: str) -> None:
+        """Replace all items, accounts and login failures with those of a SQLite database, migrating it first."""
+        source = DatabaseService(database_file)
+        try:
+            with source.borrow() as connection:
+                rows = {
+                    "items": [(row[0], row) for row in connection.execute(
+                        "SELECT id, name, category, quantity, defective_quantity, version FROM Items;")],
+                    "accounts": [(row[0], row) for row in connection.execute(
+                        "SELECT id, username, password_hash, permission, kdf, salt, kdf_params, version FROM Accounts;")],
+                    "failures": [(row[:2], row[2:]) for row in connection.execute(
+                        "SELECT account_id, source, failures, locked_until FROM LoginFailures;")],
+                }
+                sequences = dict(connection.execute("SELECT name, seq FROM sqlite_sequence;").fetchall())
+        finally:
+            source.disconnect()
+        with self.transaction():
+            for table, (stored, apply) in self._tables.items():
+                for key in list(stored):
+                    self.record_change(table, key, apply(key, None))
+                for key, row in rows[table]:
+                    self.record_change(table, key, apply(key, row))
+            # Deleted IDs stay unused, as they would in SQLite
+            self.items.next_id = max(self.items.next_id, sequences.get("Items", 0) + 1)
+            self.accounts.next_id = max(self.accounts.next_id, sequences.get("Accounts", 0) + 1)
+        self.snapshot()
+
+    def flush(self) -> int:
+        """Nothing is queued, writes are committed as they happen. Returns 0."""
+        return 0
+
+    def disconnect(self) -> None:
+        """Stop the periodic snapshots and take a last one, so the next start has no journal to replay"""
+        self._stop.set()
+        if self._journal is not None and not self._journal.closed:
+            if self._dirty:
+                self.snapshot()
+            self._journal.close()
+        self._unlock_snapshot_file()
@@ -0,0 +1,359 @@
+import heapq
+import re
+import sqlite3
+from bisect import bisect_left, bisect_right, insort
+from typing import Iterable, Iterator
+from classes.item import Item
+from database.committedRead import committed_read
+from database.itemOperations import DuplicateItemError, _chunks, nocase
+from database.versionConflictError import VersionConflictError
+
+
+def words(text: str) -> list[str]:
+    """Lower case words of a name or query, split like the ItemsSearch tokenizer."""
+    return re.findall(r"[^\W_]+", text.lower())
+
+
+class MemoryItemOperations:
+    """Item storage in dictionaries, with the same behaviour as ItemOperations.
+
+    Rows are (id, name, category, quantity, defective_quantity, version)
+    tuples keyed by ID, with indexes by name ignoring case, by ID order,
+    by category totals and by name word for search. Reads go through the
+    service's read(), so they never see another thread's uncommitted
+    writes. Writes go through the service's transaction(), which serialises
+    them and journals or undoes them, see MemoryDatabaseService.
+    """
+    def __init__(self, db):
+        # Service holding the write lock, also handed to the items we load
+        self.db = db
+        # Whether search() matches words anywhere in the name, or only the start of the name
+        self.full_text_search: bool | None = True
+        self._rows: dict[int, tuple] = {}
+        self._ids_by_name: dict[str, int] = {}
+        self._sorted_ids: list[int] = []
+        # category -> [items, quantity, defective_quantity], like CategoryTotals
+        self._totals: dict[int, list[int]] = {}
+        # word -> IDs of the items whose name contains it, and the words in order for prefix lookups
+        self._ids_by_word: dict[str, set[int]] = {}
+        self._sorted_words: list[str] = []
+        # IDs are never reused, like AUTOINCREMENT
+        self.next_id = 1
+
+    @property
+    def autocommit(self) -> bool:
+        """Whether each operation commits on its own."""
+        return self.db.autocommit
+
+    def _item(self, row: tuple | None) -> Item | None:
+        return Item.from_row(row, self.db) if row is not None else None
+
+    def _apply(self, item_id: int, row: tuple | None) -> tuple | None:
+        """Store or, for None, remove a row and update the indexes. Returns the previous row."""
+        old = self._rows.get(item_id)
+        if row is not None:
+            self._rows[item_id] = row
+            self.next_id = max(self.next_id, item_id + 1)
+            if old is None:
+                insort(self._sorted_ids, item_id)
+        elif old is not None:
+            del self._rows[item_id]
+            del self._sorted_ids[bisect_left(self._sorted_ids, item_id)]
+        # Stock changes leave the name alone, so only the totals need updating
+        if old is not None and (row is None or row[1] != old[1]):
+            del self._ids_by_name[nocase(old[1])]
+            for word in set(words(old[1])):
+                ids = self._ids_by_word[word]
+                ids.discard(item_id)
+                if not ids:
+                    del self._ids_by_word[word]
+                    del self._sorted_words[bisect_left(self._sorted_words, word)]
+        if row is not None and (old is None or row[1] != old[1]):
+            self._ids_by_name[nocase(row[1])] = item_id
+            for word in set(words(row[1])):
+                if word not in self._ids_by_word:
+                    self._ids_by_word[word] = set()
+                    insort(self._sorted_words, word)
+                self._ids_by_word[word].add(item_id)
+        for sign, changed in ((-1, old), (1, row)):
+            if changed is None:
+                continue
+            totals = self._totals.setdefault(changed[2], [0, 0, 0])
+            totals[0] += sign
+            totals[1] += sign * changed[3]
+            totals[2] += sign * changed[4]
+            if not totals[0]:
+                del self._totals[changed[2]]
+        return old
+
+    def _write(self, item_id: int, row: tuple | None) -> None:
+        """Store or remove a row inside the service's transaction, so it is journaled or undone with it."""
+        self.db.record_change("items", item_id, self._apply(item_id, row))
+
+    def _check(self, name, category, quantity, defective_quantity, item_id: int | None = None) -> None:
+        """Refuse a row the Items table would refuse, the same way."""
+        for column, value in zip(("name", "category", "quantity", "defective_quantity"),
+                                 (name, category, quantity, defective_quantity)):
+            if value is None:
+                raise sqlite3.IntegrityError(f"NOT NULL constraint failed: Items.{column}")
+        if self._ids_by_name.get(nocase(name), item_id) != item_id:
+            raise sqlite3.IntegrityError("UNIQUE constraint failed: Items.name")
+
+    def _insert(self, name: str, category: int, quantity: int, defective_quantity: int) -> None:
+        self._check(name, category, quantity, defective_quantity)
+        self._write(self.next_id, (self.next_id, name, category, quantity, defective_quantity, 0))
+
+    def _update(self, item_id: int, name: str, category: int, quantity: int, defective_quantity: int,
+                version: int | None = None) -> int | None:
+        row = self._rows.get(item_id)
+        if row is None or (version is not None and row[5] != version):
+            return
+        self._check(name, category, quantity, defective_quantity, item_id)
+        self._write(item_id, (item_id, name, category, quantity, defective_quantity, row[5] + 1))
+        return row[5] + 1
+
+    def add_item(self, name: str, category: int, quantity: int = 0, defective_quantity: int = 0) -> None:
+        """Add a new item.
+
+        Raises DuplicateItemError if an item with the same name exists, ignoring case.
+        """
+        with self.db.transaction():
+            try:
+                self._insert(name, category, quantity, defective_quantity)
+            except sqlite3.IntegrityError as error:
+                if "UNIQUE" in str(error):
+                    raise DuplicateItemError(f"Item with the name '{name}' already exists") from error
+                raise
+
+    def delete_item(self, item_id: int, version: int | None = None) -> None:
+        """Delete an item by ID.
+
+        With a `version`, raises VersionConflictError unless the item is still at that version.
+        """
+        with self.db.transaction():
+            row = self._rows.get(item_id)
+            if version is not None and (row is None or row[5] != version):
+                raise VersionConflictError(f"Item {item_id} was changed or deleted since version {version}")
+            if row is not None:
+                self._write(item_id, None)
+
+    def update_item(self, item_id: int, name: str, category: int, quantity: int, defective_quantity: int,
+                    version: int | None = None) -> int | None:
+        """Update an existing item and return its new version, or None if it does not exist.
+
+        With a `version`, the update only happens if nobody changed the item
+        since that version was read, and VersionConflictError is raised otherwise.
+        Raises DuplicateItemError if another item has the new name, ignoring case.
+        """
+        with self.db.transaction():
+            try:
+                new_version = self._update(item_id, name, category, quantity, defective_quantity, version)
+            except sqlite3.IntegrityError as error:
+                if "UNIQUE" in str(error):
+                    raise DuplicateItemError(f"Item with the name '{name}' already exists") from error
+                raise
+        if new_version is None and version is not None:
+            raise VersionConflictError(f"Item {item_id} was changed or deleted since version {version}")
+        return new_version
+
+    def adjust_stock(self, item_id: int, quantity_delta: int, defective_delta: int = 0) -> tuple[int, int] | None:
+        """Atomically apply quantity deltas to an item.
+
+        Returns the new (quantity, defective_quantity), or None if the item
+        does not exist or either quantity would drop below zero.
+        """
+        with self.db.transaction():
+            row = self._rows.get(item_id)
+            if row is None:
+                return
+            quantity, defective_quantity = row[3] + quantity_delta, row[4] + defective_delta
+            if quantity < 0 or defective_quantity < 0:
+                return
+            self._write(item_id, (*row[:3], quantity, defective_quantity, row[5] + 1))
+        return quantity, defective_quantity
+
+    def _chunked(self, write, rows: Iterable[tuple], chunk_size: int) -> list[int]:
+        """Apply `write(row)` to every row in one transaction, returning the rows it counted per chunk."""
+        with self.db.transaction():
+            try:
+                return [sum(bool(write(row)) for row in chunk) for chunk in _chunks(rows, chunk_size)]
+            except sqlite3.IntegrityError as error:
+                if "UNIQUE" in str(error):
+                    raise DuplicateItemError("Batch contains an item name that already exists") from error
+                raise
+
+    def add_items(self, rows: Iterable[tuple], chunk_size: int = 500) -> list[int]:
+        """Add many items in a single transaction.
+
+        Each row is (name, category, quantity, defective_quantity); the last two may be omitted.
+        Returns the number of inserted rows for each chunk.
+        """
+        def add(row: tuple) -> bool:
+            name, category, *rest = row
+            self._insert(name, category, rest[0] if len(rest) > 0 else 0, rest[1] if len(rest) > 1 else 0)
+            return True
+
+        return self._chunked(add, rows, chunk_size)
+
+    def upsert_items(self, rows: Iterable[tuple], chunk_size: int = 500) -> list[int]:
+        """Add many items in a single transaction, overwriting items with the same name, ignoring case.
+
+        Each row is (name, category, quantity, defective_quantity). An existing
+        item keeps its ID and name. Returns the number of written rows for each chunk.
+        """
+        def upsert(row: tuple) -> bool:
+            name, category, quantity, defective_quantity = row
+            item_id = self._ids_by_name.get(nocase(name)) if name is not None else None
+            if item_id is None:
+                self._insert(name, category, quantity, defective_quantity)
+            else:
+                self._update(item_id, self._rows[item_id][1], category, quantity, defective_quantity)
+            return True
+
+        return self._chunked(upsert, rows, chunk_size)
+
+    def update_items(self, rows: Iterable[tuple], chunk_size: int = 500) -> list[int]:
+        """Update many items in a single transaction.
+
+        Each row is (item_id, name, category, quantity, defective_quantity), matching `update_item`.
+        Returns the number of updated rows for each chunk.
+        """
+        return self._chunked(lambda row: self._update(*row) is not None, rows, chunk_size)
+
+    def delete_items(self, item_ids: Iterable[int], chunk_size: int = 500) -> list[int]:
+        """Delete many items by ID in a single transaction.
+
+        Returns the number of deleted rows for each chunk.
+        """
+        def delete(item_id: int) -> bool:
+            if item_id not in self._rows:
+                return False
+            self._write(item_id, None)
+            return True
+
+        return self._chunked(delete, item_ids, chunk_size)
+
+    @committed_read
+    def get_item(self, item_id: int) -> Item | None:
+        """Retrieve an item by ID."""
+        return self._item(self._rows.get(item_id))
+
+    @committed_read
+    def get_item_by_name(self, name: str) -> Item | None:
+        """Retrieve an item by name, ignoring case."""
+        item_id = self._ids_by_name.get(nocase(name))
+        return self._item(self._rows.get(item_id)) if item_id is not None else None
+
+    @committed_read
+    def page(self, after_id: int = 0, limit: int = 100) -> list[Item]:
+        """Retrieve up to `limit` items with an ID greater than `after_id`, ordered by ID."""
+        start = bisect_right(self._sorted_ids, after_id)
+        rows = (self._rows.get(item_id) for item_id in self._sorted_ids[start:start + limit])
+        return [self._item(row) for row in rows if row is not None]
+
+    @committed_read
+    def search(self, query: str, limit: int = 20) -> list[Item]:
+        """Find up to `limit` items whose name contains words starting with each word of `query`.
+
+        Names with fewer words rank first, then by name, approximating the
+        full-text ranking of ItemOperations. With `full_text_search` off, only
+        names starting with `query` are found, in name order.
+        """
+        query_words = words(query)
+        if not query_words:
+            return []
+        if self.full_text_search is False:
+            prefix = nocase(query.strip())
+            rows = [row for row in list(self._rows.values()) if nocase(row[1]).startswith(prefix)]
+            return [self._item(row) for row in heapq.nsmallest(limit, rows, key=lambda row: (nocase(row[1]), row[0]))]
+
+        # Collect the IDs of the query word with the fewest matching items, then check the other words by name
+        rarest, rarest_count = None, None
+        for word in set(query_words):
+            start = bisect_left(self._sorted_words, word)
+            end = bisect_left(self._sorted_words, word + "\U0010ffff", start)
+            matching = self._sorted_words[start:end]
+            count = sum(len(self._ids_by_word.get(candidate, ())) for candidate in matching)
+            if rarest_count is None or count < rarest_count:
+                rarest, rarest_count = matching, count
+        matches = set().union(*(self._ids_by_word.get(candidate, ()) for candidate in rarest))
+        rows = []
+        for row in map(self._rows.get, matches):
+            if row is None:
+                continue
+            name_words = words(row[1])
+            if all(any(name_word.startswith(word) for name_word in name_words) for word in query_words):
+                rows.append(row)
+        ranked = heapq.nsmallest(limit, rows, key=lambda row: (len(words(row[1])), nocase(row[1]), row[0]))
+        return [self._item(row) for row in ranked]
+
+    @committed_read
+    def nth_id(self, position: int) -> int | None:
+        """Return the ID of the item at zero-based `position` in ID order, or None past the end."""
+        ids = self._sorted_ids
+        return ids[position] if 0 <= position < len(ids) else None
+
+    @committed_read
+    def count(self) -> int:
+        """Return the number of items."""
+        return len(self._rows)
+
+    def iter_items(self, batch_size: int = 500, after_id: int = 0) -> Iterator[Item]:
+        """Iterate over all items ordered by ID, a page of `batch_size` at a time, so writes may run in between."""
+        while True:
+            items = self.page(after_id, batch_size)
+            yield from items
+            if len(items) < batch_size:
+                return
+            after_id = items[-1].id
+
+    @committed_read
+    def get_all_items(self) -> list[Item] | None:
+        """Retrieve all items, ordered by ID."""
+        items = self.page(0, len(self._sorted_ids))
+        if items:
+            return items
+        return
+
+    @committed_read
+    def summary(self) -> dict[int, tuple[int, int, int]]:
+        """Return (working, defective, total) quantities per category that has items."""
+        return {
+            category: (quantity, defective, quantity + defective)
+            for category, (_, quantity, defective) in sorted(self._totals.items())
+        }
+
+    def _count_totals(self) -> dict[int, list[int]]:
+        """Category totals counted from the rows."""
+        totals: dict[int, list[int]] = {}
+        for row in list(self._rows.values()):
+            category = totals.setdefault(row[2], [0, 0, 0])
+            category[0] += 1
+            category[1] += row[3]
+            category[2] += row[4]
+        return totals
+
+    @committed_read
+    def check_summary(self) -> list[tuple[int, tuple, tuple]]:
+        """Recompute the category totals from the rows and compare them with the kept totals.
+
+        Returns (category, stored, actual) for each category whose
+        (items, quantity, defective_quantity) differ, an empty list if they all match.
+        """
+        stored = {category: tuple(totals) for category, totals in self._totals.items()}
+        actual = {category: tuple(totals) for category, totals in self._count_totals().items()}
+        return [
+            (category, stored.get(category, (0, 0, 0)), actual.get(category, (0, 0, 0)))
+            for category in sorted(stored.keys() | actual.keys())
+            if stored.get(category) != actual.get(category)
+        ]
+
+    def rebuild_summary(self) -> None:
+        """Recompute the category totals from the rows, repairing any drift found by `check_summary`."""
+        with self.db.transaction():
+            self.db.record_change("totals", None, self._apply_totals(None, self._count_totals()))
+
+    def _apply_totals(self, key: None, totals: dict[int, list[int]]) -> dict[int, list[int]]:
+        """Replace the category totals, returning the previous ones. Used to undo `rebuild_summary`."""
+        previous, self._totals = self._totals, totals
+        return previous
@@ -0,0 +1,338 @@
+import logging
+import sqlite3
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+def create_tables(cursor: sqlite3.Cursor) -> None:
+    """Create the Items and Accounts tables, which may exist in databases from before migrations."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS Items(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        category INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        defective_quantity INTEGER NOT NULL
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS Accounts(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        password_hash TEXT NOT NULL,
+        permission INTEGER NOT NULL
+    );
+    """)
+
+
+def create_item_indexes(cursor: sqlite3.Cursor) -> None:
+    """Index item names case-insensitively and uniquely, and index categories.
+
+    Names that already differ only in case would fail the unique index, so
+    every such item but the oldest gets its ID appended to its name first.
+    """
+    renamed = cursor.execute("""
+    UPDATE Items
+    SET name = name || ' (' || id || ')'
+    WHERE id IN (
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY name COLLATE NOCASE ORDER BY id) AS position FROM Items
+        )
+        WHERE position > 1
+    );
+    """).rowcount
+    if renamed:
+        logger.warning("Renamed %d items whose names differed only in case from an older item's", renamed)
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_items_name ON Items(name COLLATE NOCASE);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_items_category ON Items(category);")
+
+
+def add_account_kdf_columns(cursor: sqlite3.Cursor) -> None:
+    """Store the key derivation function, salt and cost parameters of each password hash.
+
+    Existing rows keep their unsalted SHA-256 hashes and are rehashed on their next login.
+    """
+    cursor.execute("ALTER TABLE Accounts ADD COLUMN kdf TEXT NOT NULL DEFAULT 'sha256';")
+    cursor.execute("ALTER TABLE Accounts ADD COLUMN salt TEXT;")
+    cursor.execute("ALTER TABLE Accounts ADD COLUMN kdf_params TEXT;")
+
+
+def create_login_failures(cursor: sqlite3.Cursor) -> None:
+    """Track consecutive failed logins and lockouts per account."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS LoginFailures(
+        account_id INTEGER PRIMARY KEY,
+        failures INTEGER NOT NULL,
+        locked_until REAL
+    );
+    """)
+
+
+def create_import_progress(cursor: sqlite3.Cursor) -> None:
+    """Track how many records of each import source have been committed, so imports can resume."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ImportProgress(
+        source TEXT PRIMARY KEY,
+        records INTEGER NOT NULL
+    );
+    """)
+
+
+def create_category_totals(cursor: sqlite3.Cursor) -> None:
+    """Keep per-category item counts and quantity totals in CategoryTotals, maintained by triggers on Items."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS CategoryTotals(
+        category INTEGER PRIMARY KEY,
+        items INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        defective_quantity INTEGER NOT NULL
+    );
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_items_insert_totals AFTER INSERT ON Items
+    BEGIN
+        INSERT INTO CategoryTotals (category, items, quantity, defective_quantity)
+        VALUES (NEW.category, 1, NEW.quantity, NEW.defective_quantity)
+        ON CONFLICT (category) DO UPDATE
+        SET items = items + 1, quantity = quantity + NEW.quantity, defective_quantity = defective_quantity + NEW.defective_quantity;
+    END;
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_items_delete_totals AFTER DELETE ON Items
+    BEGIN
+        UPDATE CategoryTotals
+        SET items = items - 1, quantity = quantity - OLD.quantity, defective_quantity = defective_quantity - OLD.defective_quantity
+        WHERE category = OLD.category;
+    END;
+    """)
+    # Renames do not change the totals, so only fire for the counted columns
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_items_update_totals AFTER UPDATE OF category, quantity, defective_quantity ON Items
+    BEGIN
+        UPDATE CategoryTotals
+        SET items = items - 1, quantity = quantity - OLD.quantity, defective_quantity = defective_quantity - OLD.defective_quantity
+        WHERE category = OLD.category;
+        INSERT INTO CategoryTotals (category, items, quantity, defective_quantity)
+        VALUES (NEW.category, 1, NEW.quantity, NEW.defective_quantity)
+        ON CONFLICT (category) DO UPDATE
+        SET items = items + 1, quantity = quantity + NEW.quantity, defective_quantity = defective_quantity + NEW.defective_quantity;
+    END;
+    """)
+    # Count the items stored before the triggers existed
+    cursor.execute("DELETE FROM CategoryTotals;")
+    cursor.execute("""
+    INSERT INTO CategoryTotals (category, items, quantity, defective_quantity)
+    SELECT category, COUNT(*), SUM(quantity), SUM(defective_quantity) FROM Items
+    GROUP BY category;
+    """)
+
+
+def create_item_search(cursor: sqlite3.Cursor) -> None:
+    """Index item names for full-text and prefix search in ItemsSearch, kept in sync by triggers.
+
+    Skipped when SQLite is built without FTS5, searches then fall back to name prefixes.
+    """
+    try:
+        cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS ItemsSearch
+        USING fts5(name, content = 'Items', content_rowid = 'id', prefix = '2 3');
+        """)
+    except sqlite3.OperationalError as error:
+        if "no such module" in str(error):
+            return
+        raise
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_items_insert_search AFTER INSERT ON Items
+    BEGIN
+        INSERT INTO ItemsSearch (rowid, name) VALUES (NEW.id, NEW.name);
+    END;
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_items_delete_search AFTER DELETE ON Items
+    BEGIN
+        INSERT INTO ItemsSearch (ItemsSearch, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+    END;
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_items_update_search AFTER UPDATE OF name ON Items
+    BEGIN
+        INSERT INTO ItemsSearch (ItemsSearch, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+        INSERT INTO ItemsSearch (rowid, name) VALUES (NEW.id, NEW.name);
+    END;
+    """)
+    # Index the items stored before the triggers existed
+    cursor.execute("INSERT INTO ItemsSearch (ItemsSearch) VALUES ('rebuild');")
+
+
+# Unix time in seconds, with fractions, inside SQL
+_NOW = "(julianday('now') - 2440587.5) * 86400.0"
+
+
+def _create_movement_triggers(cursor: sqlite3.Cursor, account: str) -> None:
+    """Create the Items triggers appending to StockMovements, recording the SQL expression `account` as the account."""
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_items_insert_movement AFTER INSERT ON Items
+    BEGIN
+        INSERT INTO StockMovements (item_id, kind, quantity_delta, defective_delta, account_id, created_at)
+        VALUES (NEW.id, 1, NEW.quantity, NEW.defective_quantity, {account}, {_NOW});
+    END;
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_items_delete_movement AFTER DELETE ON Items
+    BEGIN
+        INSERT INTO StockMovements (item_id, kind, quantity_delta, defective_delta, account_id, created_at)
+        VALUES (OLD.id, 2, -OLD.quantity, -OLD.defective_quantity, {account}, {_NOW});
+    END;
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_items_update_movement AFTER UPDATE OF quantity, defective_quantity ON Items
+    WHEN NEW.quantity != OLD.quantity OR NEW.defective_quantity != OLD.defective_quantity
+    BEGIN
+        INSERT INTO StockMovements (item_id, kind, quantity_delta, defective_delta, account_id, created_at)
+        VALUES (
+            NEW.id,
+            CASE
+                WHEN NEW.defective_quantity = OLD.defective_quantity AND NEW.quantity > OLD.quantity THEN 3
+                WHEN NEW.defective_quantity = OLD.defective_quantity THEN 4
+                WHEN NEW.quantity + NEW.defective_quantity = OLD.quantity + OLD.defective_quantity
+                    AND NEW.quantity < OLD.quantity THEN 5
+                WHEN NEW.quantity + NEW.defective_quantity = OLD.quantity + OLD.defective_quantity THEN 6
+                ELSE 7
+            END,
+            NEW.quantity - OLD.quantity,
+            NEW.defective_quantity - OLD.defective_quantity,
+            {account},
+            {_NOW}
+        );
+    END;
+    """)
+
+
+def create_stock_movements(cursor: sqlite3.Cursor) -> None:
+    """Append every change of an item's stock to the StockMovements ledger, with snapshots for replay.
+
+    Triggers on Items write the ledger in the same transaction as the
+    change. The kind is read from the shape of the deltas, see MovementKind,
+    and the account from the inventory_account_id() function that
+    DatabaseService defined on its connections, until
+    record_movements_without_functions(). Existing items are recorded
+    in a first snapshot. The ledger has no index besides its ID, which keeps
+    an append to one more page per write.
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS StockMovements(
+        id INTEGER PRIMARY KEY,
+        item_id INTEGER NOT NULL,
+        kind INTEGER NOT NULL,
+        quantity_delta INTEGER NOT NULL,
+        defective_delta INTEGER NOT NULL,
+        account_id INTEGER,
+        created_at REAL NOT NULL
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS StockSnapshots(
+        id INTEGER PRIMARY KEY,
+        movement_id INTEGER NOT NULL,
+        created_at REAL NOT NULL
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS StockSnapshotItems(
+        snapshot_id INTEGER NOT NULL,
+        item_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        defective_quantity INTEGER NOT NULL,
+        PRIMARY KEY (snapshot_id, item_id)
+    ) WITHOUT ROWID;
+    """)
+    _create_movement_triggers(cursor, "inventory_account_id()")
+    cursor.execute(f"INSERT INTO StockSnapshots (movement_id, created_at) VALUES (0, {_NOW});")
+    cursor.execute("""
+    INSERT INTO StockSnapshotItems (snapshot_id, item_id, quantity, defective_quantity)
+    SELECT last_insert_rowid(), id, quantity, defective_quantity FROM Items;
+    """)
+
+
+def add_row_versions(cursor: sqlite3.Cursor) -> None:
+    """Count the updates of each item and account, so an update can check nothing changed since it was read."""
+    cursor.execute("ALTER TABLE Items ADD COLUMN version INTEGER NOT NULL DEFAULT 0;")
+    cursor.execute("ALTER TABLE Accounts ADD COLUMN version INTEGER NOT NULL DEFAULT 0;")
+
+
+def key_login_failures_by_source(cursor: sqlite3.Cursor) -> None:
+    """Count failed logins and lockouts per account and source, so one client cannot lock an account out for all.
+
+    Existing records are kept under the empty source, used by callers that name none.
+    """
+    cursor.execute("""
+    CREATE TABLE LoginFailuresBySource(
+        account_id INTEGER NOT NULL,
+        source TEXT NOT NULL,
+        failures INTEGER NOT NULL,
+        locked_until REAL,
+        PRIMARY KEY (account_id, source)
+    ) WITHOUT ROWID;
+    """)
+    cursor.execute("""
+    INSERT INTO LoginFailuresBySource (account_id, source, failures, locked_until)
+    SELECT account_id, '', failures, locked_until FROM LoginFailures;
+    """)
+    cursor.execute("DROP TABLE LoginFailures;")
+    cursor.execute("ALTER TABLE LoginFailuresBySource RENAME TO LoginFailures;")
+
+
+def record_movements_without_functions(cursor: sqlite3.Cursor) -> None:
+    """Stop the stock ledger triggers calling inventory_account_id(), which only DatabaseService connections define.
+
+    Other clients, such as the sqlite3 shell, failed on every stock change.
+    The triggers now leave the account empty, and DatabaseService fills it
+    in on its own connections, see DatabaseService.acting_as().
+    """
+    for trigger in ("trg_items_insert_movement", "trg_items_delete_movement", "trg_items_update_movement"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger};")
+    _create_movement_triggers(cursor, "NULL")
+
+
+# Ordered schema changes, the database's PRAGMA user_version is the number applied.
+# Only ever append to this list.
+MIGRATIONS: list[Callable[[sqlite3.Cursor], None]] = [
+    create_tables,
+    create_item_indexes,
+    add_account_kdf_columns,
+    create_login_failures,
+    create_import_progress,
+    create_category_totals,
+    create_item_search,
+    create_stock_movements,
+    add_row_versions,
+    key_login_failures_by_source,
+    record_movements_without_functions,
+]
+
+
+def migrate(connection: sqlite3.Connection, migrations: list[Callable[[sqlite3.Cursor], None]] = MIGRATIONS) -> int:
+    """Apply any pending migrations in a single transaction.
+
+    Costs a single pragma read when the database is up to date.
+    Returns the number of migrations applied.
+    """
+    cursor = connection.cursor()
+    version = cursor.execute("PRAGMA user_version;").fetchone()[0]
+    if version >= len(migrations):
+        return 0
+    if connection.in_transaction:
+        connection.commit()
+    cursor.execute("BEGIN IMMEDIATE;")
+    try:
+        # Another connection may have migrated while we waited for the lock
+        version = cursor.execute("PRAGMA user_version;").fetchone()[0]
+        for migration in migrations[version:]:
+            migration(cursor)
+        cursor.execute(f"PRAGMA user_version = {len(migrations)};")
+    except Exception:
+        connection.rollback()
+        raise
+    connection.commit()
+    return max(len(migrations) - version, 0)
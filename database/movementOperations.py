@@ -0,0 +1,131 @@
+import sqlite3
+from database.migrations import _NOW
+from database.retry import retry_on_locked
+
+
+class MovementOperations:
+    """Class to read the StockMovements ledger and manage its snapshots.
+
+    Movements are appended by triggers on Items, see create_stock_movements.
+    A snapshot stores every item's quantities and the last movement they
+    include, so quantities at a point in time are rebuilt from the latest
+    snapshot before it plus the movements after that snapshot.
+    """
+    def __init__(self, db):
+        # Service lending connections
+        self.db = db
+        # Write retries once the busy timeout has run out, see retry_on_locked
+        self.retry_attempts = 5
+        self.retry_delay = 0.05
+
+    @property
+    def autocommit(self) -> bool:
+        """Whether each operation commits on its own."""
+        return self.db.autocommit
+
+    def _commit(self, connection: sqlite3.Connection) -> None:
+        """Commit the current transaction unless a caller is grouping operations."""
+        if self.autocommit:
+            connection.commit()
+
+    def history(self, item_id: int | None = None, after_id: int = 0, limit: int = 100) -> list[tuple]:
+        """Return up to `limit` movements after movement `after_id`, of one item or all, oldest first.
+
+        Each is (id, item_id, kind, quantity_delta, defective_delta, account_id, created_at).
+        The history of one item is found by scanning the ledger, which compact() keeps short.
+        """
+        with self.db.borrow() as connection:
+            if item_id is None:
+                return self.db.fetchall(connection, """
+                SELECT id, item_id, kind, quantity_delta, defective_delta, account_id, created_at FROM StockMovements
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?;
+                """, (after_id, limit))
+            return self.db.fetchall(connection, """
+            SELECT id, item_id, kind, quantity_delta, defective_delta, account_id, created_at FROM StockMovements
+            WHERE item_id = ? AND id > ?
+            ORDER BY id
+            LIMIT ?;
+            """, (item_id, after_id, limit))
+
+    @retry_on_locked
+    def snapshot(self) -> int:
+        """Store the current quantities of every item and return the snapshot ID."""
+        with self.db.borrow() as connection:
+            # Writing first takes the write lock, so no movement can slip in between the two statements
+            snapshot_id = self.db.execute(connection, f"""
+            INSERT INTO StockSnapshots (movement_id, created_at)
+            SELECT COALESCE(MAX(id), 0), {_NOW} FROM StockMovements;
+            """).lastrowid
+            self.db.execute(connection, """
+            INSERT INTO StockSnapshotItems (snapshot_id, item_id, quantity, defective_quantity)
+            SELECT ?, id, quantity, defective_quantity FROM Items;
+            """, (snapshot_id,))
+            self._commit(connection)
+        return snapshot_id
+
+    def snapshot_if_due(self, every: int = 10000) -> int | None:
+        """Take a snapshot if at least `every` movements happened since the last one, returning its ID."""
+        with self.db.borrow() as connection:
+            since = self.db.fetchone(connection, """
+            SELECT COALESCE((SELECT MAX(id) FROM StockMovements), 0)
+                - COALESCE((SELECT MAX(movement_id) FROM StockSnapshots), 0);
+            """)[0]
+        if since < every:
+            return
+        return self.snapshot()
+
+    def quantities_at(self, timestamp: float) -> dict[int, tuple[int, int]]:
+        """Rebuild every item's (quantity, defective_quantity) as it was at a Unix `timestamp`.
+
+        Starts from the latest snapshot taken at or before the timestamp and
+        applies the movements after it. Raises ValueError if there is no such
+        snapshot, because the ledger started or was compacted later.
+        """
+        with self.db.borrow() as connection:
+            snapshot = self.db.fetchone(connection, """
+            SELECT id, movement_id FROM StockSnapshots
+            WHERE created_at <= ?
+            ORDER BY created_at DESC, id DESC
+            LIMIT 1;
+            """, (timestamp,))
+            if snapshot is None:
+                raise ValueError("No stock history that far back")
+            # Creates and deletes count whether the item exists at the time
+            rows = self.db.fetchall(connection, """
+            SELECT item_id, SUM(quantity), SUM(defective_quantity) FROM (
+                SELECT item_id, quantity, defective_quantity, 1 AS present FROM StockSnapshotItems
+                WHERE snapshot_id = ?
+                UNION ALL
+                SELECT item_id, quantity_delta, defective_delta, CASE kind WHEN 1 THEN 1 WHEN 2 THEN -1 ELSE 0 END
+                FROM StockMovements
+                WHERE id > ? AND created_at <= ?
+            )
+            GROUP BY item_id
+            HAVING SUM(present) > 0
+            ORDER BY item_id;
+            """, (snapshot[0], snapshot[1], timestamp))
+        return {item_id: (quantity, defective_quantity) for item_id, quantity, defective_quantity in rows}
+
+    @retry_on_locked
+    def compact(self, before: float) -> int:
+        """Drop the history older than the latest snapshot taken at or before a Unix time `before`.
+
+        That snapshot is kept, so quantities can still be rebuilt from it
+        onwards. Returns the number of movements removed.
+        """
+        with self.db.borrow() as connection:
+            snapshot = self.db.fetchone(connection, """
+            SELECT id, movement_id FROM StockSnapshots
+            WHERE created_at <= ?
+            ORDER BY created_at DESC, id DESC
+            LIMIT 1;
+            """, (before,))
+            if snapshot is None:
+                return 0
+            removed = self.db.execute(connection, "DELETE FROM StockMovements WHERE id <= ?;", (snapshot[1],)).rowcount
+            self.db.execute(connection, "DELETE FROM StockSnapshotItems WHERE snapshot_id < ?;", (snapshot[0],))
+            self.db.execute(connection, "DELETE FROM StockSnapshots WHERE id < ?;", (snapshot[0],))
+            self._commit(connection)
+        return removed
@@ -0,0 +1,37 @@
+from functools import lru_cache
+
+
+class QueryStats:
+    """Running totals for one SQL statement, see DatabaseService.query_stats()."""
+    __slots__ = ("count", "total_seconds", "max_seconds", "rows")
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        # Rows returned by queries, or changed by other statements
+        self.rows = 0
+
+    def add(self, seconds: float, rows: int) -> None:
+        """Count one run of the statement."""
+        self.count += 1
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+        self.rows += rows
+
+    def as_dict(self) -> dict[str, float]:
+        """Return the totals, with times in milliseconds."""
+        return {
+            "count": self.count,
+            "total_ms": self.total_seconds * 1000,
+            "max_ms": self.max_seconds * 1000,
+            "rows": self.rows,
+        }
+
+
+# Operations reuse the same few statements, so each is only normalised once
+@lru_cache(maxsize=1024)
+def statement_key(sql: str) -> str:
+    """Collapse the whitespace of a statement, so the same SQL is counted together wherever it is written."""
+    return " ".join(sql.split())
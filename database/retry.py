@@ -0,0 +1,34 @@
+import random
+import sqlite3
+import time
+from functools import wraps
+
+
+def is_locked_error(error: sqlite3.OperationalError) -> bool:
+    """Check whether an OperationalError means another connection holds the lock."""
+    message = str(error)
+    return "database is locked" in message or "database is busy" in message
+
+
+def retry_on_locked(method):
+    """Retry a write method with exponential backoff while the database is locked.
+
+    The decorated method's object needs `db`, `autocommit`,
+    `retry_attempts` and `retry_delay` attributes. Inside a caller's
+    transaction the error is raised straight away, because only the caller
+    can restart the whole transaction.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        attempt = 1
+        while True:
+            try:
+                return method(self, *args, **kwargs)
+            except sqlite3.OperationalError as error:
+                if not is_locked_error(error) or not self.autocommit or attempt >= self.retry_attempts:
+                    raise
+                # Release our snapshot so the retry sees the other writer's changes
+                self.db.rollback()
+                time.sleep(self.retry_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+                attempt += 1
+    return wrapper
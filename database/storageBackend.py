@@ -0,0 +1,95 @@
+from contextlib import AbstractContextManager
+from typing import Iterable, Iterator, Protocol
+from classes.account import Account
+from classes.item import Item
+
+
+class ItemBackend(Protocol):
+    """Item storage used by the menu, the batch runner and the API.
+
+    Implemented by ItemOperations on SQLite, CachedItemOperations in front
+    of it, and MemoryItemOperations. Names are unique ignoring ASCII case,
+    IDs are never reused, and every write bumps the written row's version.
+    """
+    def add_item(self, name: str, category: int, quantity: int = 0, defective_quantity: int = 0) -> None: ...
+
+    def delete_item(self, item_id: int, version: int | None = None) -> None: ...
+
+    def update_item(self, item_id: int, name: str, category: int, quantity: int, defective_quantity: int,
+                    version: int | None = None) -> int | None: ...
+
+    def adjust_stock(self, item_id: int, quantity_delta: int, defective_delta: int = 0) -> tuple[int, int] | None: ...
+
+    def add_items(self, rows: Iterable[tuple], chunk_size: int = 500) -> list[int]: ...
+
+    def upsert_items(self, rows: Iterable[tuple], chunk_size: int = 500) -> list[int]: ...
+
+    def update_items(self, rows: Iterable[tuple], chunk_size: int = 500) -> list[int]: ...
+
+    def delete_items(self, item_ids: Iterable[int], chunk_size: int = 500) -> list[int]: ...
+
+    def get_item(self, item_id: int) -> Item | None: ...
+
+    def get_item_by_name(self, name: str) -> Item | None: ...
+
+    def page(self, after_id: int = 0, limit: int = 100) -> list[Item]: ...
+
+    def search(self, query: str, limit: int = 20) -> list[Item]: ...
+
+    def nth_id(self, position: int) -> int | None: ...
+
+    def count(self) -> int: ...
+
+    def iter_items(self, batch_size: int = 500, after_id: int = 0) -> Iterator[Item]: ...
+
+    def get_all_items(self) -> list[Item] | None: ...
+
+    def summary(self) -> dict[int, tuple[int, int, int]]: ...
+
+    def check_summary(self) -> list[tuple[int, tuple, tuple]]: ...
+
+
+class AccountBackend(Protocol):
+    """Account and login failure storage, implemented by AccountOperations and MemoryAccountOperations."""
+    def create_account(self, username: str, password_hash: str, permission: int,
+                       kdf: str = "sha256", salt: str | None = None, kdf_params: str | None = None) -> Account | None: ...
+
+    def get_account(self, username: str) -> Account | None: ...
+
+    def get_account_by_username(self, username: str, password_hash: str) -> Account | None: ...
+
+    def update_password_hash(self, account_id: int, password_hash: str, kdf: str, salt: str | None, kdf_params: str | None,
+                             version: int | None = None) -> None: ...
+
+    def delete_account(self, account_id: int) -> None: ...
+
+    def get_login_failures(self, account_id: int, source: str = "") -> tuple[int, float | None] | None: ...
+
+    def record_login_failure(self, account_id: int, source: str, threshold: int, lockout_seconds: float,
+                             now: float) -> float | None: ...
+
+    def clear_login_failures(self, account_id: int, source: str = "") -> None: ...
+
+
+class StorageService(Protocol):
+    """What the menu, batch runner and API need from a database service.
+
+    Implemented by DatabaseService, the default SQLite backend, and
+    MemoryDatabaseService. See get_db() for choosing one.
+    """
+    items: ItemBackend
+    accounts: AccountBackend
+    write_behind: object | None
+
+    @property
+    def autocommit(self) -> bool: ...
+
+    def transaction(self) -> AbstractContextManager: ...
+
+    def acting_account_id(self) -> int | None: ...
+
+    def acting_as(self, account_id: int | None) -> AbstractContextManager: ...
+
+    def flush(self) -> int: ...
+
+    def disconnect(self) -> None: ...
@@ -0,0 +1,5 @@
+class VersionConflictError(Exception):
+    """Raised when a row was changed or deleted since the version a caller read.
+
+    Reload the row and apply the change again, or give up.
+    """
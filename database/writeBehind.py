@@ -0,0 +1,136 @@
+import atexit
+import logging
+import threading
+import weakref
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """Queue of Item stock changes, applied to the database in batches.
+
+    Deltas for the same item and account are added together while queued.
+    The queue is flushed as one transaction when `max_pending` items are
+    waiting, `max_unflushed_ms` after the first queued change, on flush() and
+    when the process exits normally. Changes still queued when the process is
+    killed are lost, so `max_unflushed_ms` bounds how much work a crash loses.
+
+    Item validates changes against its own quantities when queueing. A change
+    the database refuses at flush time, because another connection changed
+    the item meanwhile, is logged and counted in `rejected`.
+    """
+    def __init__(self, db, max_pending: int = 1000, max_unflushed_ms: float = 200):
+        if max_pending < 1 or max_unflushed_ms <= 0:
+            raise ValueError("Queue size and flush delay must be positive")
+        self.db = db
+        self.max_pending = max_pending
+        self.max_unflushed_ms = max_unflushed_ms
+        # (item id, account id) -> [quantity delta, defective delta]
+        self._pending: dict[tuple[int, int | None], list[int]] = {}
+        self._lock = threading.Lock()
+        # Only one flush writes at a time, so batches are applied in order
+        self._flush_lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+        self.queued = 0
+        self.flushes = 0
+        self.rejected = 0
+        # Flush on exit without keeping the service alive just for that
+        reference = weakref.ref(self)
+        def flush_at_exit() -> None:
+            queue = reference()
+            if queue is not None:
+                queue.flush()
+        self._exit_hook = flush_at_exit
+        atexit.register(self._exit_hook)
+
+    def adjust(self, item_id: int, quantity_delta: int, defective_delta: int = 0) -> None:
+        """Queue stock deltas for an item, recorded against the thread's acting account."""
+        key = (item_id, self.db.acting_account_id())
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                self._pending[key] = [quantity_delta, defective_delta]
+            else:
+                entry[0] += quantity_delta
+                entry[1] += defective_delta
+            self.queued += 1
+            full = len(self._pending) >= self.max_pending
+            if self._timer is None:
+                self._start_timer()
+        # Inside a transaction() the flush would be undone by a rollback, so the timer flushes instead
+        if full and self.db.autocommit:
+            self.flush()
+
+    def pending(self) -> int:
+        """Number of queued item changes, after coalescing."""
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """Apply every queued change in one transaction, returning the number of item changes written.
+
+        If the transaction fails the changes are queued again and the error is raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not batch:
+                return 0
+            written = 0
+            try:
+                with self.db.transaction():
+                    for (item_id, account_id), (quantity_delta, defective_delta) in batch.items():
+                        if not quantity_delta and not defective_delta:
+                            continue
+                        with self.db.acting_as(account_id):
+                            result = self.db.items.adjust_stock(item_id, quantity_delta, defective_delta)
+                        if result is None:
+                            self.rejected += 1
+                            logger.warning("Dropped queued stock change %+d/%+d for item %d, which no longer has enough stock or exists",
+                                           quantity_delta, defective_delta, item_id)
+                        else:
+                            written += 1
+            except BaseException:
+                self._requeue(batch)
+                raise
+            self.flushes += 1
+            return written
+
+    def _requeue(self, batch: dict[tuple[int, int | None], list[int]]) -> None:
+        """Put a batch that failed to flush back in front of any newer changes."""
+        with self._lock:
+            for key, (quantity_delta, defective_delta) in batch.items():
+                entry = self._pending.setdefault(key, [0, 0])
+                entry[0] += quantity_delta
+                entry[1] += defective_delta
+            if self._timer is None:
+                self._start_timer()
+
+    def _start_timer(self) -> None:
+        """Flush once `max_unflushed_ms` have passed. Called with the lock held."""
+        self._timer = threading.Timer(self.max_unflushed_ms / 1000, self._flush_on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_on_timer(self) -> None:
+        """Flush from the timer thread, where an error has no caller to go to."""
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Write-behind flush failed, retrying later")
+
+    def close(self) -> None:
+        """Flush the remaining changes and stop flushing on exit."""
+        atexit.unregister(self._exit_hook)
+        self.flush()
+
+    def stats(self) -> dict[str, int]:
+        """Return the queue counters."""
+        return {
+            "queued": self.queued,
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,10 @@
+class MovementKind(int):
+    """Enumeration for the kinds of stock movement recorded in the StockMovements ledger."""
+    CREATE = 1
+    DELETE = 2
+    INCREASE = 3
+    DECREASE = 4
+    MARK_DEFECTIVE = 5
+    REPAIR = 6
+    # Any other change, e.g. quantities overwritten by update_item or an import
+    ADJUST = 7
@@ -0,0 +1,103 @@
+"""
+Command line import and export of the Items table, and stock ledger upkeep.
+
+Imports upsert items by name, one transaction per chunk, and an interrupted
+import continues after the last committed chunk when run again. Snapshot
+and compact are meant to be run periodically, e.g. from cron. Run with:
+python inventory.py import FILE [--format csv|jsonl] [--chunk-size N] [--restart]
+python inventory.py export FILE [--format csv|jsonl]
+python inventory.py snapshot [--every N]
+python inventory.py compact --keep-days DAYS
+"""
+import argparse
+import os
+import sys
+import time
+from database.databaseService import configure, get_db
+from database.itemTransfer import READERS, clear_progress, export_items, import_items
+
+
+def file_format(path: str, requested: str | None) -> str:
+    """Return the requested format, or guess it from the file extension."""
+    if requested:
+        return requested
+    if path.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "csv"
+
+
+def run_import(args: argparse.Namespace) -> int:
+    """Import a file, printing rejects to stderr and a summary to stdout."""
+    db = get_db()
+    # Progress is stored per absolute path, so a re-run resumes wherever it is started from
+    source = os.path.abspath(args.file)
+    if args.restart:
+        clear_progress(db, source)
+
+    def reject(line_number: int, reason: str) -> None:
+        print(f"{args.file}:{line_number}: {reason}", file=sys.stderr)
+
+    with open(args.file, newline="", encoding="utf-8") as file:
+        records = READERS[file_format(args.file, args.format)](file)
+        report = import_items(db, records, source, args.chunk_size, reject)
+
+    if report.skipped:
+        print(f"Resumed after {report.skipped} records committed by an earlier run")
+    print(f"Imported {report.imported} items, rejected {report.rejected}, "
+          f"in {report.seconds:.2f}s ({report.records_per_second:.0f} records/s)")
+    return 1 if report.rejected else 0
+
+
+def run_export(args: argparse.Namespace) -> int:
+    """Export every item to a file."""
+    with open(args.file, "w", newline="", encoding="utf-8") as file:
+        count = export_items(get_db(), file, file_format(args.file, args.format))
+    print(f"Exported {count} items to {args.file}")
+    return 0
+
+
+def run_snapshot(args: argparse.Namespace) -> int:
+    """Snapshot the stock quantities, if enough movements happened since the last snapshot."""
+    snapshot_id = get_db().movements.snapshot_if_due(args.every)
+    if snapshot_id is None:
+        print(f"Fewer than {args.every} movements since the last snapshot, nothing to do")
+    else:
+        print(f"Created snapshot {snapshot_id}")
+    return 0
+
+
+def run_compact(args: argparse.Namespace) -> int:
+    """Drop stock history older than the latest snapshot before the retention period."""
+    removed = get_db().movements.compact(time.time() - args.keep_days * 86400)
+    print(f"Removed {removed} stock movements")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import and export inventory items, and maintain the stock ledger")
+    parser.add_argument("--database", help="database file, defaults to $INVENTORY_DB or inventory.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="upsert items by name from a file")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--format", choices=sorted(READERS), help="defaults to the file extension")
+    import_parser.add_argument("--chunk-size", type=int, default=500, help="records per transaction")
+    import_parser.add_argument("--restart", action="store_true", help="ignore the progress of an interrupted import")
+    import_parser.set_defaults(run=run_import)
+
+    export_parser = commands.add_parser("export", help="write every item to a file")
+    export_parser.add_argument("file")
+    export_parser.add_argument("--format", choices=sorted(READERS), help="defaults to the file extension")
+    export_parser.set_defaults(run=run_export)
+
+    snapshot_parser = commands.add_parser("snapshot", help="store current stock quantities for fast history rebuilds")
+    snapshot_parser.add_argument("--every", type=int, default=10000, help="only if this many movements happened since the last snapshot")
+    snapshot_parser.set_defaults(run=run_snapshot)
+
+    compact_parser = commands.add_parser("compact", help="drop stock history already covered by an older snapshot")
+    compact_parser.add_argument("--keep-days", type=float, required=True, help="history to keep rebuildable, in days")
+    compact_parser.set_defaults(run=run_compact)
+
+    args = parser.parse_args()
+    configure(args.database)
+    sys.exit(args.run(args))
@@ -1,6 +1,34 @@
+import argparse
+import getpass
+import os
+import sys
 from classes.menu import Menu
+from classes.batchRunner import run_batch
+from database.databaseService import BACKENDS, configure, get_db
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inventory Management System")
+    parser.add_argument("--database", help="database file, defaults to $INVENTORY_DB or inventory.db (inventory.json for memory)")
+    parser.add_argument("--backend", choices=BACKENDS, default="sqlite",
+                        help="storage backend, memory keeps everything in RAM and snapshots it to the database file")
+    parser.add_argument("--load-sqlite", metavar="FILE", help="with --backend memory, replace its contents with a SQLite database's and exit")
+    parser.add_argument("--batch", metavar="FILE", help="run JSON line commands from FILE, or - for stdin, instead of the menu")
+    parser.add_argument("--user", help="account to run the batch as, its password is read from $INVENTORY_PASSWORD or prompted for")
+    parser.add_argument("--group-size", type=int, default=500, help="batch commands per transaction")
+    args = parser.parse_args()
+    configure(args.database, args.backend)
+    if args.load_sqlite:
+        if args.backend != "memory":
+            parser.error("--load-sqlite requires --backend memory")
+        get_db().load_sqlite(args.load_sqlite)
+        get_db().disconnect()
+        sys.exit(0)
+    if args.batch:
+        if not args.user:
+            parser.error("--batch requires --user")
+        password = os.environ.get("INVENTORY_PASSWORD")
+        if password is None:
+            password = getpass.getpass()
+        sys.exit(run_batch(args.batch, args.user, password, args.group_size))
     menu = Menu()
     menu.run()
-    
\ No newline at end of file
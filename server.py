@@ -0,0 +1,33 @@
+"""
+HTTP/JSON API over the inventory for handhelds and dashboards, see ApiServer.
+Run with:
+python server.py [--host 127.0.0.1] [--port 8080] [--database FILE] [--backend sqlite|memory] [--session-hours 8]
+"""
+import argparse
+import logging
+from classes.apiServer import ApiServer
+from classes.sessionStore import SessionStore
+from database.databaseService import BACKENDS, configure
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the inventory as an HTTP/JSON API")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--database", help="database file, defaults to $INVENTORY_DB or inventory.db (inventory.json for memory)")
+    parser.add_argument("--backend", choices=BACKENDS, default="sqlite",
+                        help="storage backend, memory keeps everything in RAM and snapshots it to the database file")
+    parser.add_argument("--session-hours", type=float, default=8, help="idle time before a login token expires")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(asctime)s %(message)s")
+    configure(args.database, args.backend)
+    server = ApiServer((args.host, args.port), sessions=SessionStore(ttl=args.session_hours * 3600))
+    print(f"Serving on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.db.disconnect()
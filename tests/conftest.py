@@ -13,9 +13,10 @@ TEST_DB = "test_inventory.db"
 @pytest.fixture
 def test_database():
     """Set up and tear down test database"""
-    # Remove test database if it exists
-    if os.path.exists(TEST_DB):
-        os.remove(TEST_DB)
+    # Remove test database and any WAL files left behind if they exist
+    for path in (TEST_DB, TEST_DB + "-wal", TEST_DB + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
     
     # Create test database with schema
     conn = sqlite3.connect(TEST_DB)
@@ -64,8 +65,9 @@ def test_database():
     # Try multiple times to remove the file
     for _ in range(5):
         try:
-            if os.path.exists(TEST_DB):
-                os.remove(TEST_DB)
+            for path in (TEST_DB, TEST_DB + "-wal", TEST_DB + "-shm"):
+                if os.path.exists(path):
+                    os.remove(path)
             break
         except PermissionError:
             import time
@@ -85,6 +87,7 @@ def mock_db():
     with patch('database.databaseService.db') as mock_db:
         mock_db.items = Mock()
         mock_db.accounts = Mock()
+        mock_db.write_behind = None
         yield mock_db
 
 @pytest.fixture
@@ -93,4 +96,18 @@ def db_service(test_database):
     from database.databaseService import DatabaseService
     service = DatabaseService(test_database)
     yield service
-    service.disconnect()
\ No newline at end of file
+    service.disconnect()
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def store(request, test_database, tmp_path):
+    """Provide each storage backend holding the test data, closed afterwards"""
+    from database.databaseService import DatabaseService
+    from database.memoryDatabaseService import MemoryDatabaseService
+    if request.param == "sqlite":
+        service = DatabaseService(test_database)
+    else:
+        service = MemoryDatabaseService(str(tmp_path / "inventory.json"))
+        service.load_sqlite(test_database)
+    yield service
+    service.disconnect()
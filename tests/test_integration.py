@@ -1,5 +1,18 @@
+import asyncio
+import http.client
+import io
+import json
+import multiprocessing
 import os
+import sqlite3
+import subprocess
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+import pytest
 
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
@@ -7,6 +20,15 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from database.databaseService import DatabaseService
 from enums.category import Category
 from enums.accountPermission import AccountPermission
+from classes.account import Account
+from database.itemOperations import DuplicateItemError
+from database.versionConflictError import VersionConflictError
+from database.migrations import MIGRATIONS, migrate
+from database.asyncDatabaseService import AsyncDatabaseService
+from classes.rateLimiter import RateLimiter
+from enums.page import Page
+from enums.movementKind import MovementKind
+from database.itemTransfer import READERS, export_items, get_progress, import_items
 
 
 class TestDatabaseServiceIntegration:
@@ -40,11 +62,164 @@ class TestDatabaseServiceIntegration:
         assert "Accounts" in tables
         
         db_service.disconnect()
+    
+    def test_migrations_upgrade_existing_database(self, test_database):
+        """Test a database created before migrations is brought up to date without losing data"""
+        db_service = DatabaseService(test_database)
+        
+        version = db_service.cursor.execute("PRAGMA user_version;").fetchone()[0]
+        assert version == len(MIGRATIONS)
+        db_service.cursor.execute("SELECT name FROM sqlite_master WHERE type='index';")
+        indexes = [row[0] for row in db_service.cursor.fetchall()]
+        assert "idx_items_name" in indexes
+        assert db_service.items.get_item(1).name == "Test Hammer"
+        
+        db_service.disconnect()
+    
+    def test_migrations_rename_names_differing_in_case(self, test_database, caplog):
+        """Test items whose names only differ in case from an older item's are renamed before the unique index"""
+        connection = sqlite3.connect(test_database)
+        connection.executemany("INSERT INTO Items (name, category, quantity, defective_quantity) VALUES (?, 1, 1, 0)",
+                               [("TEST HAMMER",), ("Saw",), ("test hammer",)])
+        connection.commit()
+        connection.close()
+        
+        db_service = DatabaseService(test_database)
+        
+        assert [item.name for item in db_service.items.get_all_items()] == [
+            "Test Hammer", "TEST HAMMER (2)", "Saw", "test hammer (4)"
+        ]
+        assert "Renamed 2 items" in caplog.text
+        db_service.disconnect()
+    
+    def test_migrations_up_to_date_cost_one_pragma(self, test_database):
+        """Test an up to date database only reads the schema version on startup"""
+        DatabaseService(test_database).disconnect()
+        
+        connection = sqlite3.connect(test_database)
+        statements = []
+        connection.set_trace_callback(statements.append)
+        assert migrate(connection) == 0
+        assert statements == ["PRAGMA user_version;"]
+        connection.close()
+    
+    def test_failed_migration_rolls_back(self, test_database):
+        """Test a failing migration leaves the schema and version untouched"""
+        def broken(cursor):
+            cursor.execute("CREATE TABLE Extra(id INTEGER);")
+            cursor.execute("SELECT * FROM MissingTable;")
+        
+        connection = sqlite3.connect(test_database)
+        with pytest.raises(sqlite3.OperationalError):
+            migrate(connection, MIGRATIONS + [broken])
+        
+        assert connection.execute("PRAGMA user_version;").fetchone()[0] == 0
+        tables = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type='table';")]
+        assert "Extra" not in tables
+        connection.close()
+
+    
+    def test_import_does_not_connect(self, tmp_path):
+        """Test importing the application opens no database until it is used"""
+        root = os.path.join(os.path.dirname(__file__), '..')
+        code = (
+            "import sys; sys.path.insert(0, sys.argv[1]); import main, classes.item, classes.auth; "
+            "import database.databaseService as service; assert service.db is None"
+        )
+        subprocess.run([sys.executable, "-c", code, root], cwd=tmp_path, check=True)
+        assert os.listdir(tmp_path) == []
+    
+    def test_get_db_uses_configured_file(self, test_database, monkeypatch):
+        """Test the shared service is created lazily from the environment or configure()"""
+        from database import databaseService
+        
+        monkeypatch.setenv("INVENTORY_DB", test_database)
+        databaseService.configure()
+        try:
+            service = databaseService.get_db()
+            assert service.database_file == test_database
+            assert databaseService.get_db() is service
+            
+            databaseService.configure(test_database, item_cache_size=5)
+            assert databaseService.get_db() is not service
+            assert databaseService.get_db().items.max_size == 5
+        finally:
+            databaseService.configure()
+    
+    def test_items_use_the_service_that_loaded_them(self, db_service):
+        """Test an item's mutations go to the database it was read from"""
+        item = db_service.items.get_item(1)
+        item.increase_quantity(5)
+        
+        assert item.quantity == 15
+        assert db_service.items.get_item(1).quantity == 15
+
+
+class TestQueryInstrumentationIntegration:
+    """Integration tests for the instrumented statement path of DatabaseService"""
+    
+    def test_statements_are_counted(self, test_database):
+        """Test per-statement count, time and rows are collected"""
+        db_service = DatabaseService(test_database, query_stats=True)
+        db_service.items.get_item(1)
+        db_service.items.get_item(2)
+        db_service.items.page(0, 10)
+        db_service.items.adjust_stock(1, 1)
+        
+        stats = db_service.query_stats()
+        get_item = stats["SELECT id, name, category, quantity, defective_quantity, version FROM Items WHERE id = ?;"]
+        
+        assert (get_item["count"], get_item["rows"]) == (2, 1)
+        assert get_item["max_ms"] <= get_item["total_ms"]
+        assert sum(entry["count"] for entry in stats.values()) == 4
+        db_service.reset_query_stats()
+        assert db_service.query_stats() == {}
+        db_service.disconnect()
+    
+    def test_hooks_wrap_every_statement(self, db_service):
+        """Test the start and end hooks see each statement, including failed ones"""
+        calls = []
+        start = db_service.on_query_start(lambda sql, parameters: calls.append(("start", parameters)))
+        db_service.on_query_end(lambda sql, parameters, seconds, rows: calls.append(("end", rows)))
+        
+        db_service.items.get_item(1)
+        with pytest.raises(DuplicateItemError):
+            db_service.items.add_item("test hammer", Category.Parts)
+        db_service.remove_query_hook(start)
+        db_service.items.add_items([("Saw", Category.Parts), ("Axe", Category.Parts)])
+        
+        assert calls == [("start", (1,)), ("end", 1), ("start", ("test hammer", 1, 0, 0)), ("end", 0), ("end", 2)]
+    
+    def test_slow_queries_are_logged(self, db_service, caplog):
+        """Test statements over the threshold are logged and faster ones are not"""
+        db_service.slow_query_ms = 0
+        with caplog.at_level("WARNING", logger="database.databaseService"):
+            db_service.items.get_all_items()
+            db_service.slow_query_ms = 60_000
+            db_service.items.get_all_items()
+        
+        assert len(caplog.records) == 1
+        assert "Slow query" in caplog.text and "FROM Items" in caplog.text
+    
+    def test_disabled_by_default(self, db_service):
+        """Test statements run directly unless instrumentation is asked for"""
+        assert not db_service._instrumented
+        hook = db_service.on_query_end(lambda *args: None)
+        assert db_service._instrumented
+        db_service.remove_query_hook(hook)
+        
+        assert not db_service._instrumented
+        assert db_service.query_stats() == {}
 
 
 class TestItemOperationsIntegration:
     """Integration tests for ItemOperations"""
     
+    @pytest.fixture
+    def db_service(self, store):
+        """Run every test against each storage backend"""
+        return store
+    
     def test_add_item(self, test_database):
         """Test adding a new item to database"""
         db_service = DatabaseService(test_database)
@@ -64,10 +239,44 @@ class TestItemOperationsIntegration:
         
         db_service.disconnect()
     
-    def test_get_item(self, test_database):
-        """Test retrieving an item by ID"""
+    def test_add_item_duplicate_name(self, db_service):
+        """Test adding an item whose name differs only in case is rejected"""
+        with pytest.raises(DuplicateItemError):
+            db_service.items.add_item("TEST HAMMER", Category.Parts, 1, 0)
+        with pytest.raises(DuplicateItemError):
+            db_service.items.add_items([("Unique Item", Category.Parts), ("test hammer", Category.Parts)])
+        
+        assert len(db_service.items.get_all_items()) == 1
+    
+    def test_update_item_duplicate_name(self, db_service):
+        """Test renaming an item to another item's name, ignoring case, is rejected"""
+        db_service.items.add_item("Saw", Category.Parts, 1, 0)
+        
+        with pytest.raises(DuplicateItemError):
+            db_service.items.update_item(2, "test hammer", Category.Parts, 1, 0)
+        with pytest.raises(DuplicateItemError):
+            db_service.items.update_item(2, "TEST HAMMER", Category.Parts, 1, 0, 0)
+        with pytest.raises(DuplicateItemError):
+            db_service.items.update_items([(2, "Test Hammer", Category.Parts, 1, 0)])
+        
+        assert db_service.items.get_item(2).name == "Saw"
+        assert db_service.items.update_item(2, "SAW", Category.Parts, 1, 0) == 1
+    
+    def test_get_item_by_name(self, test_database):
+        """Test looking an item up by name ignores case and uses the index"""
         db_service = DatabaseService(test_database)
         
+        assert db_service.items.get_item_by_name("test HAMMER").id == 1
+        assert db_service.items.get_item_by_name("Missing") is None
+        
+        db_service.cursor.execute("EXPLAIN QUERY PLAN SELECT id FROM Items WHERE name = ? COLLATE NOCASE", ("x",))
+        plan = " ".join(row[3] for row in db_service.cursor.fetchall())
+        assert "idx_items_name" in plan
+        
+        db_service.disconnect()
+    
+    def test_get_item(self, db_service):
+        """Test retrieving an item by ID"""
         item = db_service.items.get_item(1)  # ID from test data
         
         assert item is not None
@@ -76,13 +285,9 @@ class TestItemOperationsIntegration:
         assert item.category == Category.Parts
         assert item.quantity == 10
         assert item.defective_quantity == 2
-        
-        db_service.disconnect()
     
-    def test_get_all_items(self, test_database):
+    def test_get_all_items(self, db_service):
         """Test retrieving all items"""
-        db_service = DatabaseService(test_database)
-        
         # Add another item for testing
         db_service.items.add_item("Test Screwdriver", Category.Parts, 25, 0)
         
@@ -92,13 +297,40 @@ class TestItemOperationsIntegration:
         assert len(items) >= 2
         assert any(item.name == "Test Hammer" for item in items)
         assert any(item.name == "Test Screwdriver" for item in items)
+    
+    def test_page(self, db_service):
+        """Test keyset pagination returns items in ID order"""
+        db_service.items.add_items((f"Washer {i}", Category.Parts, i) for i in range(4))
         
-        db_service.disconnect()
+        first_page = db_service.items.page(0, 3)
+        assert [item.id for item in first_page] == [1, 2, 3]
+        second_page = db_service.items.page(first_page[-1].id, 3)
+        assert [item.id for item in second_page] == [4, 5]
+        assert db_service.items.page(5, 3) == []
     
-    def test_update_item(self, test_database):
-        """Test updating an existing item"""
-        db_service = DatabaseService(test_database)
+    def test_iter_items(self, db_service):
+        """Test iterating over items in batches yields every item once"""
+        db_service.items.add_items((f"Washer {i}", Category.Parts, i) for i in range(6))
+        
+        ids = [item.id for item in db_service.items.iter_items(batch_size=2)]
+        assert ids == [1, 2, 3, 4, 5, 6, 7]
+        ids = [item.id for item in db_service.items.iter_items(batch_size=7, after_id=5)]
+        assert ids == [6, 7]
+    
+    def test_iter_items_interleaved_writes(self, db_service):
+        """Test other operations can run while an iteration is paused"""
+        db_service.items.add_items((f"Washer {i}", Category.Parts, i) for i in range(3))
         
+        names = []
+        for item in db_service.items.iter_items(batch_size=1):
+            db_service.items.adjust_stock(item.id, 1)
+            names.append(item.name)
+        
+        assert len(names) == 4
+        assert db_service.items.get_item(4).quantity == 3
+    
+    def test_update_item(self, db_service):
+        """Test updating an existing item"""
         # Update the test item
         db_service.items.update_item(1, "Updated Hammer", Category.Parts, 20, 3)
         
@@ -108,8 +340,6 @@ class TestItemOperationsIntegration:
         assert updated_item.name == "Updated Hammer"
         assert updated_item.quantity == 20
         assert updated_item.defective_quantity == 3
-        
-        db_service.disconnect()
     
     def test_delete_item(self, test_database):
         """Test deleting an item"""
@@ -131,10 +361,1411 @@ class TestItemOperationsIntegration:
         
         db_service.disconnect()
 
+    
+    def test_adjust_stock(self, db_service):
+        """Test quantity deltas are applied in the database and returned"""
+        assert db_service.items.adjust_stock(1, 5) == (15, 2)
+        assert db_service.items.adjust_stock(1, -3, 3) == (12, 5)
+        assert db_service.items.adjust_stock(1, -13) is None
+        assert db_service.items.adjust_stock(1, 6, -6) is None
+        assert db_service.items.adjust_stock(99, 1) is None
+        
+        item = db_service.items.get_item(1)
+        assert item.quantity == 12
+        assert item.defective_quantity == 5
+    
+    def test_adjust_stock_concurrent_services(self, test_database):
+        """Test two services changing the same item do not lose updates"""
+        first = DatabaseService(test_database)
+        second = DatabaseService(test_database)
+        
+        # Both read the item before either change
+        first.items.get_item(1)
+        second.items.get_item(1)
+        
+        assert first.items.adjust_stock(1, 5) == (15, 2)
+        assert second.items.adjust_stock(1, -4) == (11, 2)
+        assert first.items.get_item(1).quantity == 11
+        
+        first.disconnect()
+        second.disconnect()
+
+
+class TestBulkItemOperationsIntegration:
+    """Integration tests for the batch item write API"""
+    
+    @pytest.fixture
+    def db_service(self, store):
+        """Run every test against each storage backend"""
+        return store
+    
+    def test_add_items_chunks(self, db_service):
+        """Test adding many items returns one result per chunk"""
+        rows = [(f"Bolt {i}", Category.Parts, i) for i in range(5)]
+        results = db_service.items.add_items(rows, chunk_size=2)
+        
+        assert results == [2, 2, 1]
+        items = db_service.items.get_all_items()
+        assert len(items) == 6
+        assert any(item.name == "Bolt 4" and item.quantity == 4 and item.defective_quantity == 0 for item in items)
+    
+    def test_update_and_delete_items(self, db_service):
+        """Test updating and deleting many items at once"""
+        db_service.items.add_items([("Nut", Category.Parts, 1, 0), ("Glue", Category.Consumables, 2, 0)])
+        
+        results = db_service.items.update_items([
+            (1, "Hammer", Category.Parts, 11, 1),
+            (2, "Nut", Category.Parts, 5, 0),
+        ])
+        assert results == [2]
+        assert db_service.items.get_item(1).name == "Hammer"
+        assert db_service.items.get_item(2).quantity == 5
+        
+        results = db_service.items.delete_items([2, 3, 99])
+        assert results == [2]
+        assert len(db_service.items.get_all_items()) == 1
+    
+    def test_add_items_rolls_back_on_error(self, db_service):
+        """Test a failing row leaves none of the batch behind"""
+        rows = [("Good Item", Category.Parts, 1, 0), (None, Category.Parts, 1, 0)]
+        with pytest.raises(sqlite3.IntegrityError):
+            db_service.items.add_items(rows, chunk_size=1)
+        
+        assert len(db_service.items.get_all_items()) == 1
+    
+    def test_transaction_commits_once(self, test_database):
+        """Test operations grouped in a transaction are committed together"""
+        db_service = DatabaseService(test_database)
+        
+        with db_service.transaction():
+            db_service.items.add_item("Grouped Item", Category.Parts, 3, 0)
+            db_service.items.delete_item(1)
+            
+            # Nothing is visible to other connections until the block exits
+            other = sqlite3.connect(test_database)
+            assert other.execute("SELECT COUNT(*) FROM Items").fetchone()[0] == 1
+            other.close()
+        
+        other = sqlite3.connect(test_database)
+        names = [row[0] for row in other.execute("SELECT name FROM Items")]
+        other.close()
+        assert names == ["Grouped Item"]
+        
+        db_service.disconnect()
+    
+    def test_transaction_rolls_back_on_error(self, db_service):
+        """Test an exception inside a transaction discards all grouped operations"""
+        with pytest.raises(RuntimeError):
+            with db_service.transaction():
+                db_service.items.add_item("Discarded Item", Category.Parts, 3, 0)
+                db_service.items.delete_item(1)
+                raise RuntimeError("abort")
+        
+        items = db_service.items.get_all_items()
+        assert [item.name for item in items] == ["Test Hammer"]
+        assert db_service.items.autocommit
+    
+    def test_nested_transaction_rolls_back_alone(self, db_service):
+        """Test a nested block that raises undoes only its own writes"""
+        with db_service.transaction():
+            db_service.items.adjust_stock(1, 1)
+            with pytest.raises(RuntimeError):
+                with db_service.transaction():
+                    db_service.items.add_item("Discarded Item", Category.Parts, 3, 0)
+                    db_service.items.adjust_stock(1, 5)
+                    raise RuntimeError("abort")
+            with db_service.transaction():
+                db_service.items.add_item("Kept Item", Category.Parts, 1, 0)
+        
+        assert [item.name for item in db_service.items.get_all_items()] == ["Test Hammer", "Kept Item"]
+        assert db_service.items.get_item(1).quantity == 11
+        # The rolled back item's ID is free again, as it would be after a full rollback
+        assert db_service.items.get_item_by_name("Kept Item").id == 2
+
+
+class TestItemTransferIntegration:
+    """Integration tests for streaming item import and export"""
+    
+    def test_import_upserts_by_name(self, db_service):
+        """Test an import adds new items and overwrites existing ones, ignoring case"""
+        records = enumerate([
+            {"name": "test hammer", "category": "1", "quantity": "7", "defective_quantity": "0"},
+            {"name": "Wrench", "category": "Parts", "quantity": "3"},
+            {"name": "Broken", "category": "1", "quantity": "-3"},
+        ], 2)
+        rejects = []
+        
+        report = import_items(db_service, records, chunk_size=2, on_reject=lambda line, reason: rejects.append(line))
+        
+        assert (report.imported, report.rejected, report.chunks) == (2, 1, 2)
+        assert rejects == [4]
+        hammer = db_service.items.get_item_by_name("Test Hammer")
+        assert (hammer.id, hammer.name, hammer.quantity, hammer.defective_quantity) == (1, "Test Hammer", 7, 0)
+        assert db_service.items.get_item_by_name("wrench").quantity == 3
+    
+    def test_export_import_round_trip(self, db_service, tmp_path):
+        """Test exported files import into an empty database unchanged, in both formats"""
+        db_service.items.add_items([(f"Item {n}", 1 + n % 2, n, n % 3) for n in range(25)])
+        expected = [(item.name, item.category, item.quantity, item.defective_quantity) for item in db_service.items.iter_items()]
+        
+        for file_format in READERS:
+            path = tmp_path / f"items.{file_format}"
+            with open(path, "w", newline="") as file:
+                assert export_items(db_service, file, file_format, batch_size=10) == 26
+            target = DatabaseService(str(tmp_path / f"{file_format}.db"))
+            with open(path, newline="") as file:
+                report = import_items(target, READERS[file_format](file), chunk_size=10)
+            
+            assert (report.imported, report.rejected) == (26, 0)
+            assert [(item.name, item.category, item.quantity, item.defective_quantity) for item in target.items.iter_items()] == expected
+            target.disconnect()
+    
+    def test_interrupted_import_resumes(self, db_service):
+        """Test a failed import keeps its committed chunks and a re-run continues after them"""
+        records = [(n, {"name": f"Bolt {n}", "category": 1, "quantity": n}) for n in range(1, 11)]
+        
+        def failing():
+            yield from records[:7]
+            raise OSError("Disk went away")
+        
+        with pytest.raises(OSError):
+            import_items(db_service, failing(), source="bolts.csv", chunk_size=3)
+        # Two full chunks were committed, the third was lost with the error
+        assert get_progress(db_service, "bolts.csv") == 6
+        assert db_service.items.get_item_by_name("Bolt 7") is None
+        
+        report = import_items(db_service, iter(records), source="bolts.csv", chunk_size=3)
+        
+        assert (report.skipped, report.imported) == (6, 4)
+        assert len(db_service.items.get_all_items()) == 11
+        assert get_progress(db_service, "bolts.csv") == 0
+    
+    def test_command_line(self, test_database, tmp_path):
+        """Test the inventory import and export commands"""
+        root = os.path.join(os.path.dirname(__file__), '..')
+        source = tmp_path / "items.csv"
+        source.write_text("name,category,quantity,defective_quantity\nWrench,Parts,3,1\nBad,1,x,0\n")
+        database = os.path.abspath(test_database)
+        
+        result = subprocess.run([sys.executable, os.path.join(root, "inventory.py"), "--database", database, "import", str(source)],
+                                cwd=tmp_path, capture_output=True, text=True)
+        assert result.returncode == 1
+        assert "Imported 1 items, rejected 1" in result.stdout
+        assert "items.csv:3: quantity must be an integer" in result.stderr
+        
+        target = tmp_path / "out.jsonl"
+        subprocess.run([sys.executable, os.path.join(root, "inventory.py"), "--database", database, "export", str(target)],
+                       cwd=tmp_path, check=True, capture_output=True)
+        assert target.read_text().splitlines()[-1] == '{"name": "Wrench", "category": 1, "quantity": 3, "defective_quantity": 1}'
+
+
+class TestBatchRunnerIntegration:
+    """Integration tests for running commands without the menu"""
+    
+    @pytest.fixture
+    def db_service(self, store):
+        """Run every test against each storage backend"""
+        return store
+    
+    @pytest.fixture
+    def runner(self, db_service):
+        """Batch runner logged in as a WRITE account"""
+        from classes.batchRunner import BatchRunner
+        
+        return BatchRunner(Account(2, "clerk", "", AccountPermission.WRITE), db_service, group_size=2)
+    
+    def run(self, runner, *commands) -> list[dict]:
+        """Run command objects and return the parsed result lines."""
+        output = io.StringIO()
+        runner.run([json.dumps(command) for command in commands], output)
+        return [json.loads(line) for line in output.getvalue().splitlines()]
+    
+    def test_item_commands(self, runner, db_service):
+        """Test stock and item commands report results and change the database"""
+        results = self.run(
+            runner,
+            {"op": "increase", "id": 1, "amount": 5},
+            {"op": "mark_defective", "id": 1, "amount": 3},
+            {"op": "add", "name": "Saw", "category": "Consumables", "quantity": 4},
+            {"op": "update", "id": 2, "name": "Hand Saw", "category": 2, "quantity": 6, "defective_quantity": 0, "version": 0},
+            {"op": "search", "query": "hand"},
+        )
+        
+        assert [result["line"] for result in results] == [1, 2, 3, 4, 5]
+        assert results[1]["result"] == {"quantity": 12, "defective_quantity": 5}
+        assert results[2]["result"]["id"] == 2
+        assert results[3]["result"] == {"version": 1}
+        assert [item["name"] for item in results[4]["result"]] == ["Hand Saw"]
+        assert db_service.items.get_item(2).quantity == 6
+        if isinstance(db_service, DatabaseService):
+            # Only the SQLite backend keeps a stock ledger
+            assert [movement[5] for movement in db_service.movements.history(item_id=1)] == [2, 2]
+    
+    def test_failed_commands_change_nothing(self, runner, db_service):
+        """Test bad commands get errors while the rest of their group still commits"""
+        results = self.run(
+            runner,
+            {"op": "decrease", "id": 1, "amount": 11},
+            {"op": "increase", "id": 1, "amount": 1},
+            {"op": "update", "id": 1, "name": "Hammer", "category": 1, "quantity": 1, "defective_quantity": 0, "version": 7},
+            {"op": "add", "name": "test hammer", "category": 1},
+            {"op": "increase", "id": 1, "amount": -1},
+            {"op": "fly"},
+            {"op": "create_account", "username": "x", "password": "y", "permission": 3},
+            {"op": "get"},
+        )
+        
+        assert [result["ok"] for result in results] == [False, True] + [False] * 6
+        assert results[0]["error"] == "Cannot decrease quantity below zero"
+        assert results[6]["error"] == "Account 'clerk' may not create_account"
+        assert results[7]["error"] == "Missing field 'id'"
+        assert runner.failed == 7
+        assert db_service.items.get_item(1).quantity == 11
+    
+    def test_group_is_rolled_back_on_error(self, runner, db_service):
+        """Test an unexpected error rolls back and reports its whole group"""
+        def broken(item_id):
+            raise RuntimeError("Handler crashed")
+        
+        runner.operations["get"] = (broken, (AccountPermission.WRITE,))
+        results = self.run(runner, {"op": "increase", "id": 1, "amount": 1}, {"op": "get", "id": 1},
+                           {"op": "increase", "id": 1, "amount": 1})
+        
+        assert [result["ok"] for result in results] == [False, False, True]
+        assert results[0]["error"] == "Rolled back: Handler crashed"
+        assert db_service.items.get_item(1).quantity == 11
+    
+    def test_deleting_own_account_logs_out_after_commit(self, db_service):
+        """Test a self-deleted account stays logged in when its group rolls back, and is logged out once it commits"""
+        from classes.batchRunner import BatchRunner
+        
+        account = db_service.accounts.create_account("clerk", "", AccountPermission.WRITE)
+        runner = BatchRunner(account, db_service, group_size=2)
+        
+        delete_account, permissions = runner.operations["delete_account"]
+        
+        def delete_then_crash(command):
+            delete_account(command)
+            raise RuntimeError("Handler crashed")
+        
+        runner.operations["delete_account"] = (delete_then_crash, permissions)
+        results = self.run(runner, {"op": "get", "id": 1}, {"op": "delete_account"})
+        
+        assert results[1]["error"] == "Rolled back: Handler crashed"
+        assert runner.account is account
+        assert db_service.accounts.get_account("clerk") is not None
+        
+        runner.operations["delete_account"] = (delete_account, permissions)
+        results = self.run(runner, {"op": "delete_account"}, {"op": "get", "id": 1}, {"op": "get", "id": 1})
+        
+        assert [result["ok"] for result in results] == [True, False, False]
+        assert results[1]["error"] == "Not logged in"
+        assert runner.account is None
+        assert db_service.accounts.get_account("clerk") is None
+    
+    def test_create_account_rejects_boolean_permission(self, db_service):
+        """Test a JSON true is not taken as the ADMIN permission level"""
+        from classes.batchRunner import BatchRunner
+        
+        runner = BatchRunner(Account(1, "admin", "", AccountPermission.ADMIN), db_service)
+        results = self.run(runner, {"op": "create_account", "username": "x", "password": "y", "permission": True})
+        
+        assert results[0]["error"] == "Permission must be 1 for ADMIN, 2 for WRITE or 3 for READ"
+        assert db_service.accounts.get_account("x") is None
+    
+    def test_database_errors_fail_only_their_command(self, db_service):
+        """Test a command failing in the database is undone alone and the rest of its group commits"""
+        from classes.batchRunner import BatchRunner
+        
+        runner = BatchRunner(Account(2, "clerk", "", AccountPermission.WRITE), db_service)
+        db_service.items.add_item("Saw", Category.Parts, 4)
+        
+        def add_then_fail(command):
+            db_service.items.adjust_stock(1, 100)
+            raise sqlite3.IntegrityError("CHECK constraint failed")
+        
+        runner.operations["restock"] = (add_then_fail, (AccountPermission.WRITE,))
+        results = self.run(
+            runner,
+            {"op": "increase", "id": 1, "amount": 1},
+            {"op": "update", "id": 2, "name": "TEST HAMMER", "category": 1, "quantity": 4, "defective_quantity": 0},
+            {"op": "get", "id": [1]},
+            {"op": "delete", "id": 2, "version": "0"},
+            {"op": "restock"},
+            {"op": "increase", "id": 2, "amount": 1},
+        )
+        
+        assert [result["ok"] for result in results] == [True, False, False, False, False, True]
+        assert results[1]["error"] == "Item with the name 'TEST HAMMER' already exists"
+        assert results[2]["error"] == "id must be a non-negative integer"
+        assert results[3]["error"] == "version must be a non-negative integer"
+        assert results[4]["error"] == "CHECK constraint failed"
+        assert db_service.items.get_item(1).quantity == 11
+        assert db_service.items.get_item(2).name == "Saw"
+        assert db_service.items.get_item(2).quantity == 5
+    
+    def test_read_accounts_cannot_write(self, db_service):
+        """Test a READ account can query but not change stock"""
+        from classes.batchRunner import BatchRunner
+        
+        runner = BatchRunner(Account(2, "viewer", "", AccountPermission.READ), db_service)
+        results = self.run(runner, {"op": "get", "id": 1}, {"op": "increase", "id": 1, "amount": 1}, {"op": "summary"})
+        
+        assert results[0]["result"]["quantity"] == 10
+        assert results[1] == {"line": 2, "ok": False, "error": "Account 'viewer' may not increase"}
+        assert results[2]["result"] == {"1": [10, 2, 12]}
+    
+    def test_main_batch_mode(self, test_database, tmp_path):
+        """Test main.py runs a command file as the given user and prints JSON results"""
+        root = os.path.join(os.path.dirname(__file__), '..')
+        commands = tmp_path / "ops.jsonl"
+        commands.write_text('{"op": "increase", "id": 1, "amount": 2}\n\n{"op": "get", "id": 9}\n')
+        environment = dict(os.environ, INVENTORY_PASSWORD="admin")
+        
+        result = subprocess.run([sys.executable, os.path.join(root, "main.py"), "--database", os.path.abspath(test_database),
+                                 "--batch", str(commands), "--user", "admin"],
+                                cwd=tmp_path, capture_output=True, text=True, env=environment)
+        
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.splitlines() == [
+            '{"line": 1, "ok": true, "result": {"quantity": 12, "defective_quantity": 2}}',
+            '{"line": 3, "ok": true, "result": null}',
+        ]
+        assert "Ran 2 commands, 0 failed" in result.stderr
+
+
+class TestApiServerIntegration:
+    """Integration tests for the HTTP/JSON API"""
+    
+    @pytest.fixture
+    def db_service(self, store):
+        """Run every test against each storage backend"""
+        return store
+    
+    @pytest.fixture
+    def server(self, db_service):
+        """API server on a free localhost port, with the admin account able to log in cheaply"""
+        from classes.apiServer import ApiServer
+        
+        server = ApiServer(("127.0.0.1", 0), db_service)
+        server.auth.n = 2 ** 8
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+        server.server_close()
+    
+    def request(self, connection, method, path, body=None, token=None, headers=None):
+        """Send a request on a kept-alive connection and return (status, headers, JSON body or None)."""
+        headers = dict(headers or {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        data = json.dumps(body).encode() if body is not None else None
+        connection.request(method, path, data, headers)
+        response = connection.getresponse()
+        payload = response.read()
+        return response.status, response.headers, json.loads(payload) if payload else None
+    
+    def login(self, connection, username="admin", password="admin") -> str:
+        """Log in and return the session token."""
+        status, _, body = self.request(connection, "POST", "/login", {"username": username, "password": password})
+        assert status == 200
+        return body["token"]
+    
+    def test_items_and_conditional_get(self, server, db_service):
+        """Test item listings carry an ETag that turns into 304 until an item changes"""
+        connection = http.client.HTTPConnection(*server.server_address)
+        token = self.login(connection)
+        
+        status, headers, body = self.request(connection, "GET", "/items?limit=10", token=token)
+        assert status == 200
+        assert body == {"items": [{"id": 1, "name": "Test Hammer", "category": 1, "quantity": 10,
+                                   "defective_quantity": 2, "version": 0}], "next_after_id": None}
+        tag = headers["ETag"]
+        status, _, body = self.request(connection, "GET", "/items?limit=10", token=token, headers={"If-None-Match": tag})
+        assert (status, body) == (304, None)
+        
+        db_service.items.adjust_stock(1, 1)
+        status, headers, _ = self.request(connection, "GET", "/items?limit=10", token=token, headers={"If-None-Match": tag})
+        assert status == 200 and headers["ETag"] != tag
+        assert self.request(connection, "GET", "/items/1", token=token)[2]["quantity"] == 11
+        assert self.request(connection, "GET", "/items/9", token=token)[0] == 404
+        assert self.request(connection, "GET", "/search?q=hamm", token=token)[2]["items"][0]["id"] == 1
+        assert self.request(connection, "GET", "/summary", token=token)[2] == {"1": [11, 2, 13]}
+        connection.close()
+    
+    def test_malformed_content_length(self, server):
+        """Test a Content-Length that is not a number gets a JSON 400 instead of a dropped connection"""
+        connection = http.client.HTTPConnection(*server.server_address)
+        connection.putrequest("POST", "/login")
+        connection.putheader("Content-Length", "abc")
+        connection.endheaders()
+        response = connection.getresponse()
+        
+        assert response.status == 400
+        assert json.loads(response.read()) == {"error": "Content-Length must be a non-negative integer"}
+        connection.close()
+    
+    def test_stock_changes(self, server, db_service):
+        """Test stock deltas are applied for writers, refused for readers and checked for stock"""
+        connection = http.client.HTTPConnection(*server.server_address)
+        token = self.login(connection)
+        
+        status, _, body = self.request(connection, "POST", "/items/1/stock", {"quantity_delta": -3, "defective_delta": 3}, token)
+        assert (status, body) == (200, {"quantity": 7, "defective_quantity": 5})
+        assert self.request(connection, "POST", "/items/1/stock", {"quantity_delta": -8}, token)[0] == 409
+        assert self.request(connection, "POST", "/items/1/stock", {"quantity_delta": "1"}, token)[0] == 400
+        if isinstance(db_service, DatabaseService):
+            assert db_service.movements.history()[-1][5] == 1
+        
+        server.auth.create_account("viewer", "secret", AccountPermission.READ)
+        reader = self.login(connection, "viewer", "secret")
+        assert self.request(connection, "POST", "/items/1/stock", {"quantity_delta": 1}, reader)[0] == 403
+        connection.close()
+    
+    def test_sessions(self, server):
+        """Test requests need a live token and logout ends it"""
+        connection = http.client.HTTPConnection(*server.server_address)
+        
+        status, headers, _ = self.request(connection, "GET", "/items")
+        assert status == 401 and headers["WWW-Authenticate"] == "Bearer"
+        assert self.request(connection, "POST", "/login", {"username": "admin", "password": "wrong"})[0] == 401
+        token = self.login(connection)
+        assert self.request(connection, "POST", "/logout", token=token)[0] == 204
+        assert self.request(connection, "GET", "/items", token=token)[0] == 401
+        assert self.request(connection, "GET", "/nowhere", token=token)[0] == 404
+        connection.close()
+    
+    def test_session_store_expires_and_evicts(self):
+        """Test sessions expire after their idle time and the oldest are dropped at the limit"""
+        from classes.sessionStore import SessionStore
+        
+        sessions = SessionStore(ttl=10, max_sessions=2)
+        first = sessions.create("a", now=0)
+        second = sessions.create("b", now=0)
+        assert sessions.get(first, now=5) == "a"
+        third = sessions.create("c", now=6)
+        
+        assert sessions.get(second, now=6) is None
+        assert sessions.get(first, now=14) == "a"
+        assert sessions.get(third, now=17) is None
+
+
+class TestCategorySummaryIntegration:
+    """Integration tests for the trigger-maintained category totals"""
+    
+    @pytest.fixture
+    def db_service(self, store):
+        """Run every test against each storage backend"""
+        return store
+    
+    def test_summary_counts_existing_items(self, db_service):
+        """Test the migration counts items stored before it ran"""
+        assert db_service.items.summary() == {Category.Parts: (10, 2, 12)}
+    
+    def test_summary_follows_writes(self, db_service):
+        """Test every kind of item write keeps the totals in step"""
+        items = db_service.items
+        items.add_item("Glue", Category.Consumables, 5, 1)
+        items.add_items([("Tape", Category.Consumables, 3), ("Saw", Category.Parts, 1)])
+        items.adjust_stock(1, -4, 4)
+        glue = items.get_item_by_name("Glue")
+        items.update_item(glue.id, "Wood Glue", Category.Parts, 6, 0)
+        items.upsert_items([("tape", Category.Consumables, 10, 2)])
+        items.delete_item(items.get_item_by_name("Saw").id)
+        
+        assert items.summary() == {Category.Parts: (12, 6, 18), Category.Consumables: (10, 2, 12)}
+        assert items.check_summary() == []
+    
+    def test_empty_category_is_left_out(self, db_service):
+        """Test a category without items does not appear in the summary"""
+        db_service.items.delete_item(1)
+        
+        assert db_service.items.summary() == {}
+        assert db_service.items.check_summary() == []
+    
+    def test_check_and_rebuild_summary(self, test_database):
+        """Test the consistency checker reports drift and rebuilding repairs it"""
+        db_service = DatabaseService(test_database)
+        db_service.cursor.execute("UPDATE CategoryTotals SET quantity = 99;")
+        db_service.cursor.execute("INSERT INTO CategoryTotals VALUES (2, 1, 1, 0);")
+        db_service.connection.commit()
+        
+        assert db_service.items.check_summary() == [(1, (1, 99, 2), (1, 10, 2)), (2, (1, 1, 0), (0, 0, 0))]
+        
+        db_service.items.rebuild_summary()
+        assert db_service.items.check_summary() == []
+        assert db_service.items.summary() == {Category.Parts: (10, 2, 12)}
+        
+        db_service.disconnect()
+
+
+class TestItemSearchIntegration:
+    """Integration tests for item name search"""
+    
+    @pytest.fixture
+    def db_service(self, store):
+        """Run every test against each storage backend"""
+        return store
+    
+    @pytest.fixture
+    def items(self, db_service):
+        db_service.items.add_items([
+            ("M8 Hex Bolt", Category.Parts, 5),
+            ("M8 Nut", Category.Parts, 9),
+            ("M10 Hex Bolt", Category.Parts, 2),
+            ("Hex Key Set", Category.Parts, 1),
+            ("Bolt Cutter", Category.Parts, 1),
+        ])
+        return db_service.items
+    
+    def test_search_matches_word_prefixes(self, items):
+        """Test every query word must start a word of the name, in any order and case"""
+        assert [item.name for item in items.search("m8 hex bolt")] == ["M8 Hex Bolt"]
+        assert {item.name for item in items.search("bolt he")} == {"M8 Hex Bolt", "M10 Hex Bolt"}
+        assert [item.name for item in items.search("hamm")] == ["Test Hammer"]
+        assert items.search("washer") == []
+    
+    def test_search_ranks_and_limits(self, items):
+        """Test closer matches rank first and the limit is applied"""
+        results = items.search("bolt", limit=2)
+        
+        assert len(results) == 2
+        assert results[0].name == "Bolt Cutter"
+    
+    def test_search_follows_writes(self, items):
+        """Test renamed and deleted items are found by their current name only"""
+        nut = items.get_item_by_name("M8 Nut")
+        items.update_item(nut.id, "M8 Washer", Category.Parts, 9, 0)
+        items.delete_item(items.get_item_by_name("Hex Key Set").id)
+        
+        assert items.search("nut") == []
+        assert [item.id for item in items.search("washer")] == [nut.id]
+        assert {item.name for item in items.search("hex")} == {"M8 Hex Bolt", "M10 Hex Bolt"}
+    
+    def test_search_ignores_query_syntax(self, items):
+        """Test FTS5 operators and quotes in a query are treated as words"""
+        assert items.search('bolt" OR (nut') == []
+        assert [item.name for item in items.search("hex-bolt m8*")] == ["M8 Hex Bolt"]
+        assert items.search("  ") == []
+    
+    def test_search_falls_back_to_name_prefix(self, items):
+        """Test searching without FTS5 finds names starting with the query, using the name index"""
+        items.full_text_search = False
+        
+        assert [item.name for item in items.search("m8")] == ["M8 Hex Bolt", "M8 Nut"]
+        assert [item.name for item in items.search("bolt")] == ["Bolt Cutter"]
+        assert items.search("M8%") == []
+    
+    def test_menu_search_selects_item(self, db_service, items, monkeypatch, capsys):
+        """Test the edit inventory search option opens the chosen item"""
+        from classes.menu import Menu
+        
+        answers = iter(["m8 n", "1"])
+        monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+        menu = Menu(db_service)
+        menu.current_page = Page.EDIT_INVENTORY
+        
+        menu.edit_inventory_page(6)
+        
+        assert "M8 Nut" in capsys.readouterr().out
+        assert menu.current_page == Page.EDIT_ITEM
+        assert menu.selected_item.name == "M8 Nut"
+
+
+class TestMenuPagingIntegration:
+    """Integration tests for the paged inventory screens"""
+    
+    @pytest.fixture
+    def db_service(self, store):
+        """Run every test against each storage backend"""
+        return store
+    
+    @pytest.fixture
+    def menu(self, db_service, monkeypatch):
+        """Menu on a 20 line terminal, three items per page, with eleven items"""
+        from classes.menu import Menu
+        
+        monkeypatch.setattr("shutil.get_terminal_size", lambda *args: os.terminal_size((80, 20)))
+        db_service.items.add_items([(f"Item {n}", Category.Parts, n) for n in range(1, 11)])
+        menu = Menu(db_service)
+        menu.current_page = Page.EDIT_INVENTORY
+        menu.show_page(0)
+        return menu
+    
+    def test_nth_id_and_count(self, db_service):
+        """Test page starts are found by position and the count comes from the totals"""
+        db_service.items.add_items([("A", 1), ("B", 2)])
+        
+        assert [db_service.items.nth_id(n) for n in range(4)] == [1, 2, 3, None]
+        assert db_service.items.count() == 3
+    
+    def test_pages_keep_item_numbers(self, menu, capsys):
+        """Test only one page is shown and numbering continues on the next page"""
+        menu.print_items(7)
+        assert capsys.readouterr().out.count("Item ") == 2
+        assert menu.item_ids == [1, 2, 3]
+        assert menu.page_count == 4
+        
+        menu.edit_inventory_page(3)
+        menu.print_items(7)
+        output = capsys.readouterr().out
+        
+        assert "  10. Item 3" in output and "Page 2 of 4" in output
+        menu.edit_inventory_page(11)
+        assert menu.current_page == Page.EDIT_ITEM
+        assert menu.selected_item.name == "Item 4"
+    
+    def test_numbers_from_other_pages_are_rejected(self, menu, monkeypatch):
+        """Test a number not shown on the current page does not select an item"""
+        monkeypatch.setattr("builtins.input", lambda prompt="": "")
+        menu.print_items(7)
+        
+        menu.edit_inventory_page(10)
+        
+        assert menu.current_page == Page.EDIT_INVENTORY
+        assert menu.selected_item is None
+    
+    def test_jump_and_previous_page(self, menu, monkeypatch, capsys):
+        """Test jumping to a page and stepping back find the right items"""
+        monkeypatch.setattr("builtins.input", lambda prompt="": "4")
+        menu.print_items(7)
+        
+        menu.go_to_page()
+        menu.print_items(7)
+        assert menu.item_ids == [10, 11]
+        menu.previous_page()
+        menu.print_items(7)
+        
+        assert menu.item_ids == [7, 8, 9]
+        assert "Page 3 of 4" in capsys.readouterr().out
+    
+    def test_frame_is_written_once(self, menu, monkeypatch):
+        """Test a redraw reaches the terminal as a single write"""
+        from classes.account import Account
+        
+        writes = []
+        monkeypatch.setattr("sys.stdout", Mock(write=writes.append))
+        monkeypatch.setattr("builtins.input", lambda prompt="": "1")
+        menu.account = Account(1, "admin", "", AccountPermission.ADMIN)
+        
+        menu.display()
+        
+        assert len(writes) == 1
+        assert "Item 2" in writes[0] and "Item 3" not in writes[0]
+        assert menu.current_page == Page.INVENTORY
+
+
+class TestRowVersionIntegration:
+    """Integration tests for optimistic concurrency with the version columns"""
+    
+    @pytest.fixture
+    def db_service(self, store):
+        """Run every test against each storage backend"""
+        return store
+    
+    def test_update_checks_version(self, db_service):
+        """Test an update based on a stale read is refused and every write bumps the version"""
+        hammer = db_service.items.get_item(1)
+        assert hammer.version == 0
+        
+        assert db_service.items.update_item(1, "Claw Hammer", Category.Parts, 8, 2, hammer.version) == 1
+        with pytest.raises(VersionConflictError):
+            db_service.items.update_item(1, "Hammer", Category.Parts, 10, 2, hammer.version)
+        db_service.items.adjust_stock(1, 1)
+        db_service.items.update_items([(1, "Claw Hammer", Category.Parts, 9, 2)])
+        
+        assert db_service.items.get_item(1).version == 3
+        assert db_service.items.update_item(99, "Saw", Category.Parts, 1, 0) is None
+        with pytest.raises(VersionConflictError):
+            db_service.items.update_item(99, "Saw", Category.Parts, 1, 0, 0)
+    
+    def test_delete_checks_version(self, db_service):
+        """Test a delete based on a stale read keeps the item"""
+        hammer = db_service.items.get_item(1)
+        db_service.items.get_item(1).increase_quantity(1)
+        
+        with pytest.raises(VersionConflictError):
+            db_service.items.delete_item(1, hammer.version)
+        db_service.items.delete_item(1, hammer.version + 1)
+        
+        assert db_service.items.get_item(1) is None
+    
+    def test_item_tracks_its_own_changes(self, db_service):
+        """Test an item's own stock changes keep its version current, but not other writers' changes"""
+        hammer = db_service.items.get_item(1)
+        hammer.increase_quantity(1)
+        db_service.items.update_item(1, "Claw Hammer", Category.Parts, 11, 2, hammer.version)
+        
+        stale = db_service.items.get_item(1)
+        db_service.items.adjust_stock(1, 1)
+        stale.increase_quantity(1)
+        with pytest.raises(VersionConflictError):
+            db_service.items.update_item(1, "Hammer", Category.Parts, 13, 2, stale.version)
+    
+    def test_cached_update_keeps_version(self, test_database):
+        """Test the item cache hands out the version written through it"""
+        service = DatabaseService(test_database, item_cache_size=10)
+        try:
+            service.items.get_all_items()
+            service.items.update_item(1, "Claw Hammer", Category.Parts, 8, 2, 0)
+            service.items.adjust_stock(1, 1)
+            
+            assert service.items.get_item(1).version == 2
+            service.items.delete_item(1, 2)
+        finally:
+            service.disconnect()
+    
+    def test_rehash_does_not_overwrite_a_new_password(self, db_service):
+        """Test a login rehash is skipped when the account changed since it was read"""
+        from classes.auth import Authenticator
+        
+        auth = Authenticator(db_service, n=2 ** 8)
+        db_service.accounts.create_account("legacy", auth.hash_password("old"), AccountPermission.READ)
+        read = db_service.accounts.get_account
+        def read_then_change(username):
+            account = read(username)
+            db_service.accounts.update_password_hash(account.id, "changed", "scrypt", None, None)
+            return account
+        db_service.accounts.get_account = read_then_change
+        
+        assert auth.find_account("legacy", "old") is not None
+        
+        db_service.accounts.get_account = read
+        assert read("legacy").password_hash == "changed"
+    
+    def test_menu_reloads_item_on_conflict(self, db_service, monkeypatch):
+        """Test deleting an item changed from another terminal reloads it instead"""
+        from classes.menu import Menu
+        
+        answers = iter(["y", "", "y", ""])
+        monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+        menu = Menu(db_service)
+        menu.current_page = Page.EDIT_ITEM
+        menu.selected_item = db_service.items.get_item(1)
+        db_service.items.adjust_stock(1, 5)
+        
+        menu.edit_item_page(5)
+        assert menu.current_page == Page.EDIT_ITEM
+        assert menu.selected_item.quantity == 15
+        
+        menu.edit_item_page(5)
+        assert db_service.items.get_item(1) is None
+        assert menu.current_page == Page.EDIT_INVENTORY
+
+
+class TestStockLedgerIntegration:
+    """Integration tests for the StockMovements ledger and its snapshots"""
+    
+    def test_mutations_are_recorded(self, db_service):
+        """Test each kind of stock change appends a movement with the acting account"""
+        with db_service.acting_as(7):
+            hammer = db_service.items.get_item(1)
+            hammer.increase_quantity(5)
+            hammer.decrease_quantity(2)
+            hammer.mark_defective(3)
+            hammer.repair_defective(1)
+        db_service.items.add_item("Saw", Category.Parts, 4)
+        db_service.items.update_item(1, "Claw Hammer", Category.Parts, 1, 1)
+        db_service.items.delete_item(2)
+        
+        movements = [movement[1:6] for movement in db_service.movements.history()]
+        assert movements == [
+            (1, MovementKind.INCREASE, 5, 0, 7),
+            (1, MovementKind.DECREASE, -2, 0, 7),
+            (1, MovementKind.MARK_DEFECTIVE, -3, 3, 7),
+            (1, MovementKind.REPAIR, 1, -1, 7),
+            (2, MovementKind.CREATE, 4, 0, None),
+            (1, MovementKind.ADJUST, -10, -3, None),
+            (2, MovementKind.DELETE, -4, 0, None),
+        ]
+        assert [movement[0] for movement in db_service.movements.history(item_id=2)] == [5, 7]
+    
+    def test_movements_share_the_transaction(self, db_service):
+        """Test a rolled back change leaves no movement, and renames are not movements"""
+        with pytest.raises(RuntimeError):
+            with db_service.transaction():
+                db_service.items.adjust_stock(1, 5)
+                raise RuntimeError("Abort")
+        db_service.items.update_item(1, "Claw Hammer", Category.Parts, 10, 2)
+        
+        assert db_service.movements.history() == []
+    
+    def test_plain_sqlite_clients_are_recorded(self, db_service, test_database):
+        """Test clients without DatabaseService's connection setup can change stock, recorded without an account"""
+        with db_service.acting_as(7):
+            db_service.items.adjust_stock(1, 1)
+        
+        connection = sqlite3.connect(test_database)
+        try:
+            connection.execute("INSERT INTO Items (name, category, quantity, defective_quantity) VALUES ('Saw', 1, 4, 0);")
+            connection.execute("UPDATE Items SET quantity = quantity + 2 WHERE id = 1;")
+            connection.execute("DELETE FROM Items WHERE id = 2;")
+            connection.commit()
+        finally:
+            connection.close()
+        
+        movements = [movement[1:6] for movement in db_service.movements.history()]
+        assert movements == [
+            (1, MovementKind.INCREASE, 1, 0, 7),
+            (2, MovementKind.CREATE, 4, 0, None),
+            (1, MovementKind.INCREASE, 2, 0, None),
+            (2, MovementKind.DELETE, -4, 0, None),
+        ]
+    
+    def test_acting_account_survives_a_rollback(self, db_service):
+        """Test switching account inside a rolled back transaction does not leave the connection acting for it"""
+        with db_service.acting_as(7):
+            db_service.items.adjust_stock(1, 1)
+            with pytest.raises(RuntimeError):
+                with db_service.transaction(), db_service.acting_as(8):
+                    db_service.items.adjust_stock(1, 1)
+                    raise RuntimeError("Abort")
+            db_service.items.adjust_stock(1, 1)
+        
+        assert [movement[5] for movement in db_service.movements.history()] == [7, 7]
+    
+    def test_quantities_at_a_point_in_time(self, db_service):
+        """Test quantities are rebuilt from a snapshot and the movements after it"""
+        db_service.items.adjust_stock(1, 5)
+        db_service.items.add_item("Saw", Category.Parts, 4)
+        time.sleep(0.01)
+        first = time.time()
+        time.sleep(0.01)
+        db_service.movements.snapshot()
+        db_service.items.delete_item(2)
+        db_service.items.adjust_stock(1, -3, 3)
+        time.sleep(0.01)
+        second = time.time()
+        time.sleep(0.01)
+        db_service.items.add_item("Axe", Category.Parts, 1)
+        
+        assert db_service.movements.quantities_at(first) == {1: (15, 2), 2: (4, 0)}
+        assert db_service.movements.quantities_at(second) == {1: (12, 5)}
+        assert db_service.movements.quantities_at(time.time()) == {1: (12, 5), 3: (1, 0)}
+        with pytest.raises(ValueError):
+            db_service.movements.quantities_at(0)
+    
+    def test_snapshot_when_due_and_compact(self, db_service):
+        """Test snapshots are only taken when due and compaction keeps history rebuildable from the kept snapshot"""
+        for _ in range(3):
+            db_service.items.adjust_stock(1, 1)
+        assert db_service.movements.snapshot_if_due(every=4) is None
+        assert db_service.movements.snapshot_if_due(every=3) is not None
+        db_service.items.adjust_stock(1, 1)
+        time.sleep(0.01)
+        
+        assert db_service.movements.compact(time.time()) == 3
+        assert len(db_service.movements.history()) == 1
+        assert db_service.movements.quantities_at(time.time()) == {1: (14, 2)}
+        assert db_service.movements.compact(time.time()) == 0
+
+
+class TestWriteBehindIntegration:
+    """Integration tests for write-behind batching of Item stock changes"""
+    
+    def test_changes_are_coalesced_until_flushed(self, test_database):
+        """Test repeated changes to an item are queued as one and committed by flush()"""
+        service = DatabaseService(test_database, write_behind=True, max_unflushed_ms=60000)
+        try:
+            hammer = service.items.get_item(1)
+            with service.acting_as(7):
+                hammer.increase_quantity(5)
+                hammer.decrease_quantity(2)
+                hammer.mark_defective(1)
+            
+            assert (hammer.quantity, hammer.defective_quantity) == (12, 3)
+            assert service.write_behind.pending() == 1
+            assert service.items.get_item(1).quantity == 10
+            with pytest.raises(ValueError):
+                hammer.decrease_quantity(13)
+            
+            assert service.flush() == 1
+            assert (service.items.get_item(1).quantity, service.items.get_item(1).defective_quantity) == (12, 3)
+            assert [movement[2:6] for movement in service.movements.history()] == [(MovementKind.ADJUST, 2, 1, 7)]
+            assert service.write_behind.stats() == {"queued": 3, "pending": 0, "flushes": 1, "rejected": 0}
+        finally:
+            service.disconnect()
+    
+    def test_flushes_on_size_time_and_disconnect(self, test_database):
+        """Test the queue flushes when full, after the delay and when the service disconnects"""
+        service = DatabaseService(test_database, write_behind=True, write_behind_max_pending=2, max_unflushed_ms=50)
+        service.items.add_item("Saw", Category.Parts, 4)
+        hammer, saw = service.items.get_item(1), service.items.get_item(2)
+        hammer.increase_quantity(1)
+        saw.increase_quantity(1)
+        assert service.write_behind.pending() == 0
+        assert service.items.get_item(2).quantity == 5
+        
+        hammer.increase_quantity(1)
+        time.sleep(0.3)
+        assert service.items.get_item(1).quantity == 12
+        
+        hammer.increase_quantity(1)
+        service.disconnect()
+        reopened = DatabaseService(test_database)
+        assert reopened.items.get_item(1).quantity == 13
+        reopened.disconnect()
+    
+    def test_refused_change_is_dropped(self, test_database):
+        """Test a queued change the database no longer allows is counted and the rest still commit"""
+        service = DatabaseService(test_database, write_behind=True, max_unflushed_ms=60000)
+        try:
+            service.items.add_item("Saw", Category.Parts, 4)
+            hammer, saw = service.items.get_item(1), service.items.get_item(2)
+            hammer.decrease_quantity(8)
+            saw.increase_quantity(1)
+            service.items.adjust_stock(1, -5)
+            
+            assert service.flush() == 1
+            assert service.write_behind.rejected == 1
+            assert service.items.get_item(1).quantity == 5
+            assert service.items.get_item(2).quantity == 5
+        finally:
+            service.disconnect()
+
+
+class TestCachedItemOperationsIntegration:
+    """Integration tests for the read-through item cache"""
+    
+    def test_repeated_reads_hit_cache(self, test_database):
+        """Test repeated lookups are served without querying the database"""
+        db_service = DatabaseService(test_database, item_cache_size=10)
+        
+        assert db_service.items.get_item(1).name == "Test Hammer"
+        assert len(db_service.items.get_all_items()) == 1
+        
+        # Remove the row behind the cache's back, reads keep coming from memory
+        db_service.cursor.execute("DELETE FROM Items")
+        db_service.connection.commit()
+        assert db_service.items.get_item(1).name == "Test Hammer"
+        assert db_service.items.get_item_by_name("test hammer").id == 1
+        assert [item.id for item in db_service.items.iter_items()] == [1]
+        
+        stats = db_service.items.stats()
+        assert stats["misses"] == 2
+        assert stats["hits"] >= 3
+        
+        db_service.disconnect()
+    
+    def test_name_index_folds_ascii_only(self, test_database):
+        """Test names differing only in the case of a non-ASCII letter are cached apart"""
+        db_service = DatabaseService(test_database, item_cache_size=10)
+        
+        db_service.items.add_item("Äpfel", Category.Parts, 3, 0)
+        db_service.items.add_item("äpfel", Category.Parts, 5, 0)
+        assert db_service.items.get_item_by_name("Äpfel").quantity == 3
+        assert db_service.items.get_item_by_name("äpfel").quantity == 5
+        assert db_service.items.get_item_by_name("ÄPFEL").quantity == 3
+        
+        db_service.disconnect()
+    
+    def test_writes_invalidate_cache(self, test_database):
+        """Test writes through the cache are reflected by later reads"""
+        db_service = DatabaseService(test_database, item_cache_size=10)
+        
+        db_service.items.get_all_items()
+        db_service.items.add_item("Cached Wrench", Category.Parts, 4, 0)
+        assert db_service.items.get_item_by_name("Cached Wrench").quantity == 4
+        
+        db_service.items.update_item(2, "Renamed Wrench", Category.Parts, 6, 0)
+        assert db_service.items.get_item_by_name("Cached Wrench") is None
+        assert db_service.items.get_item(2).quantity == 6
+        
+        assert db_service.items.adjust_stock(2, -1, 1) == (5, 1)
+        assert db_service.items.get_item(2).defective_quantity == 1
+        
+        db_service.items.delete_item(1)
+        assert db_service.items.get_item(1) is None
+        assert [item.name for item in db_service.items.get_all_items()] == ["Renamed Wrench"]
+        
+        db_service.disconnect()
+    
+    def test_lru_eviction(self, test_database):
+        """Test the cache never holds more than its size bound"""
+        db_service = DatabaseService(test_database, item_cache_size=2)
+        
+        db_service.items.add_items((f"Spring {i}", Category.Parts, i) for i in range(3))
+        for item_id in [1, 2, 3, 1]:
+            db_service.items.get_item(item_id)
+        
+        stats = db_service.items.stats()
+        assert stats["size"] == 2
+        assert stats["evictions"] == 2
+        # Too many items to serve the listing from the cache
+        assert len(db_service.items.page(0, 10)) == 4
+        
+        db_service.disconnect()
+    
+    def test_transaction_rollback_clears_cache(self, test_database):
+        """Test values written through during a rolled back transaction are dropped"""
+        db_service = DatabaseService(test_database, item_cache_size=10)
+        
+        db_service.items.get_item(1)
+        with pytest.raises(RuntimeError):
+            with db_service.transaction():
+                db_service.items.adjust_stock(1, 5)
+                raise RuntimeError("abort")
+        
+        assert db_service.items.get_item(1).quantity == 10
+        
+        db_service.disconnect()
+
+
+def _stress_writer(database_file: str, increments: int) -> int:
+    """Increase item 1 one unit at a time from a separate process"""
+    db_service = DatabaseService(database_file)
+    for _ in range(increments):
+        db_service.items.adjust_stock(1, 1)
+    db_service.disconnect()
+    return increments
+
+
+def _stress_reader(database_file: str, reads: int) -> float:
+    """Read item 1 repeatedly from a separate process, returning the slowest read"""
+    db_service = DatabaseService(database_file)
+    slowest = 0.0
+    for _ in range(reads):
+        start = time.perf_counter()
+        assert db_service.items.get_item(1) is not None
+        slowest = max(slowest, time.perf_counter() - start)
+    db_service.disconnect()
+    return slowest
+
+
+class TestConcurrentAccessIntegration:
+    """Integration tests for several connections sharing one database file"""
+    
+    def test_connection_settings(self, test_database):
+        """Test the connection is configured for concurrent access"""
+        db_service = DatabaseService(test_database, busy_timeout=1234)
+        
+        assert db_service.cursor.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+        assert db_service.cursor.execute("PRAGMA synchronous;").fetchone()[0] == 1
+        assert db_service.cursor.execute("PRAGMA busy_timeout;").fetchone()[0] == 1234
+        
+        db_service.disconnect()
+    
+    def test_reader_not_blocked_by_open_write(self, test_database):
+        """Test a reader sees the last committed data while a writer holds the lock"""
+        writer = DatabaseService(test_database)
+        reader = DatabaseService(test_database, busy_timeout=0)
+        
+        with writer.transaction():
+            writer.items.adjust_stock(1, 5)
+            assert reader.items.get_item(1).quantity == 10
+        assert reader.items.get_item(1).quantity == 15
+        
+        writer.disconnect()
+        reader.disconnect()
+    
+    def test_uncommitted_writes_are_not_visible_to_other_threads(self, store):
+        """Test an item added in a transaction that rolls back is never seen by another thread"""
+        added = threading.Event()
+        seen = []
+        
+        def read():
+            added.wait()
+            seen.append(store.items.get_item_by_name("Pending Item"))
+        
+        reader = threading.Thread(target=read)
+        reader.start()
+        with pytest.raises(RuntimeError):
+            with store.transaction():
+                store.items.add_item("Pending Item", Category.Parts, 1, 0)
+                assert store.items.get_item_by_name("Pending Item") is not None
+                added.set()
+                # Give the reader time to look while the transaction is open
+                reader.join(0.2)
+                raise RuntimeError("abort")
+        reader.join()
+        
+        assert seen == [None]
+    
+    def test_write_retries_when_locked(self, test_database):
+        """Test a write that finds the database locked is retried once the lock is released"""
+        db_service = DatabaseService(test_database, busy_timeout=0)
+        db_service.items.retry_delay = 0.05
+        blocker = sqlite3.connect(test_database, check_same_thread=False)
+        blocker.execute("BEGIN IMMEDIATE;")
+        
+        timer = threading.Timer(0.1, blocker.commit)
+        timer.start()
+        assert db_service.items.adjust_stock(1, 1) == (11, 2)
+        timer.join()
+        
+        blocker.close()
+        db_service.disconnect()
+    
+    def test_concurrent_reads_from_threads(self, test_database):
+        """Test many threads can look up items and accounts at the same time"""
+        db_service = DatabaseService(test_database, pool_size=4)
+        password_hash = "8c6976e5b5410415bde908bd4dee15dfb167a9c873fc4bb8a81f6f2ab448a918"
+        
+        def lookup(n):
+            if n % 2:
+                return db_service.items.get_item(1).name
+            return db_service.accounts.get_account_by_username("admin", password_hash).username
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lookup, range(2000)))
+        
+        assert results.count("Test Hammer") == 1000
+        assert results.count("admin") == 1000
+        # Worker threads shared the pool without going over its size
+        assert len(db_service.pool._all) <= 4
+        
+        db_service.disconnect()
+    
+    def test_threads_get_their_own_connection(self, test_database):
+        """Test a transaction on one thread is invisible to operations on another"""
+        db_service = DatabaseService(test_database)
+        seen = []
+        
+        def in_thread():
+            seen.append(db_service.items.get_item(1).quantity)
+        
+        with pytest.raises(RuntimeError):
+            with db_service.transaction():
+                db_service.items.adjust_stock(1, 100)
+                worker = threading.Thread(target=in_thread)
+                worker.start()
+                worker.join()
+                assert db_service.items.get_item(1).quantity == 110
+                raise RuntimeError("abort")
+        
+        assert seen == [10]
+        assert db_service.items.get_item(1).quantity == 10
+        
+        db_service.disconnect()
+    
+    def test_multi_process_stress(self, test_database):
+        """Test writers and readers in separate processes all succeed without losing updates"""
+        DatabaseService(test_database).disconnect()
+        
+        context = multiprocessing.get_context("fork")
+        with context.Pool(8) as pool:
+            writers = pool.starmap_async(_stress_writer, [(test_database, 100)] * 4)
+            readers = pool.starmap_async(_stress_reader, [(test_database, 300)] * 4)
+            written = sum(writers.get(timeout=60))
+            slowest_read = max(readers.get(timeout=60))
+        
+        db_service = DatabaseService(test_database)
+        assert db_service.items.get_item(1).quantity == 10 + written
+        db_service.disconnect()
+        # Readers never wait for the busy timeout
+        assert slowest_read < 1.0
+
+
+class TestAsyncDatabaseServiceIntegration:
+    """Integration tests for the asyncio facade"""
+    
+    def test_concurrent_lookups_do_not_stall_event_loop(self, test_database):
+        """Test many concurrent lookups run off the event loop"""
+        password_hash = "8c6976e5b5410415bde908bd4dee15dfb167a9c873fc4bb8a81f6f2ab448a918"
+        
+        async def scenario():
+            async with AsyncDatabaseService(test_database, max_readers=4) as db_service:
+                gaps = []
+                done = asyncio.Event()
+                
+                async def heartbeat():
+                    last = time.perf_counter()
+                    while not done.is_set():
+                        await asyncio.sleep(0.001)
+                        now = time.perf_counter()
+                        gaps.append(now - last)
+                        last = now
+                
+                ticker = asyncio.create_task(heartbeat())
+                lookups = [db_service.items.get_item(1) for _ in range(500)]
+                lookups += [db_service.accounts.get_account_by_username("admin", password_hash) for _ in range(500)]
+                results = await asyncio.gather(*lookups)
+                done.set()
+                await ticker
+                return results, gaps
+        
+        results, gaps = asyncio.run(scenario())
+        
+        assert [item.name for item in results[:500]] == ["Test Hammer"] * 500
+        assert [account.username for account in results[500:]] == ["admin"] * 500
+        assert len(gaps) > 1
+        assert max(gaps) < 0.1
+    
+    def test_writes_and_iteration(self, test_database):
+        """Test queued writes are applied in order and visible to async iteration"""
+        async def scenario():
+            async with AsyncDatabaseService(test_database) as db_service:
+                await db_service.items.add_items((f"Async Bolt {i}", Category.Parts, i) for i in range(5))
+                results = await asyncio.gather(*(db_service.items.adjust_stock(1, 1) for _ in range(20)))
+                ids = [item.id async for item in db_service.items.iter_items(batch_size=2)]
+                
+                def move(service):
+                    service.items.adjust_stock(1, -30)
+                    service.items.delete_item(2)
+                moved = await db_service.transaction(move)
+                return results, ids, moved, await db_service.items.get_item(1), await db_service.items.get_item(2)
+        
+        results, ids, moved, hammer, deleted = asyncio.run(scenario())
+        
+        assert sorted(result[0] for result in results) == list(range(11, 31))
+        assert ids == [1, 2, 3, 4, 5, 6]
+        assert moved is None
+        assert hammer.quantity == 0
+        assert deleted is None
+
+
+class TestMemoryDatabaseServiceIntegration:
+    """Integration tests for the in-memory backend's snapshots and journal"""
+    
+    def test_committed_writes_survive_a_crash(self, tmp_path):
+        """Test a process killed without disconnecting loses no committed write, but an open transaction's"""
+        from database.memoryDatabaseService import MemoryDatabaseService
+        
+        snapshot = str(tmp_path / "inventory.json")
+        root = os.path.join(os.path.dirname(__file__), '..')
+        script = (
+            "import os, sys\n"
+            f"sys.path.insert(0, {root!r})\n"
+            "from database.memoryDatabaseService import MemoryDatabaseService\n"
+            f"db = MemoryDatabaseService({snapshot!r})\n"
+            "db.items.add_items([('Saw', 1, 3), ('Glue', 2, 5)])\n"
+            "db.items.delete_item(1)\n"
+            "db.accounts.create_account('clerk', 'hash', 2)\n"
+            "transaction = db.transaction()\n"
+            "transaction.__enter__()\n"
+            "db.items.adjust_stock(2, 10)\n"
+            "os._exit(0)\n"
+        )
+        subprocess.run([sys.executable, "-c", script], check=True)
+        
+        db_service = MemoryDatabaseService(snapshot)
+        try:
+            assert [item.as_dict() for item in db_service.items.get_all_items()] == [
+                {"id": 2, "name": "Glue", "category": 2, "quantity": 5, "defective_quantity": 0, "version": 0}
+            ]
+            assert db_service.accounts.get_account("clerk").permission == AccountPermission.WRITE
+            # Replayed into a new snapshot, and deleted IDs stay unused
+            assert db_service.snapshots == 1 and os.path.getsize(snapshot + ".journal") == 0
+            db_service.items.add_item("Tape", Category.Consumables)
+            assert db_service.items.get_item_by_name("tape").id == 3
+        finally:
+            db_service.disconnect()
+    
+    def test_rolled_back_transaction_is_not_journaled(self, tmp_path):
+        """Test an undone transaction leaves neither rows nor journal lines behind, and its IDs are handed out again"""
+        from database.memoryDatabaseService import MemoryDatabaseService
+        
+        db_service = MemoryDatabaseService(str(tmp_path / "inventory.json"))
+        db_service.items.add_item("Saw", Category.Parts, 1)
+        with pytest.raises(RuntimeError):
+            with db_service.transaction():
+                db_service.items.add_item("Glue", Category.Consumables, 2)
+                db_service.items.update_item(1, "Hand Saw", Category.Parts, 4, 0)
+                raise RuntimeError("abort")
+        
+        assert [item.name for item in db_service.items.get_all_items()] == ["Saw"]
+        assert db_service.items.search("hand") == [] and db_service.items.check_summary() == []
+        assert len(open(db_service.journal_file).readlines()) == 1
+        db_service.items.add_item("Tape", Category.Consumables)
+        assert db_service.items.get_item_by_name("Tape").id == 2
+        db_service.disconnect()
+    
+    def test_rolled_back_summary_rebuild_is_undone(self, tmp_path):
+        """Test rolling back a summary rebuild restores the totals, and a committed one is not journaled"""
+        from database.memoryDatabaseService import MemoryDatabaseService
+        
+        db_service = MemoryDatabaseService(str(tmp_path / "inventory.json"))
+        db_service.items.add_items([("Saw", Category.Parts, 1), ("Drill", Category.Parts, 1)])
+        db_service.items._totals[Category.Parts][1] = 99
+        with pytest.raises(RuntimeError):
+            with db_service.transaction():
+                db_service.items.adjust_stock(1, 1)
+                db_service.items.rebuild_summary()
+                db_service.items.adjust_stock(1, 1)
+                raise RuntimeError("abort")
+        
+        assert db_service.items.summary() == {Category.Parts: (99, 0, 99)}
+        db_service.items.rebuild_summary()
+        assert db_service.items.check_summary() == []
+        assert len(open(db_service.journal_file).readlines()) == 1
+        db_service.disconnect()
+    
+    def test_second_service_on_a_snapshot_file_is_refused(self, tmp_path):
+        """Test only one service at a time may use a snapshot file, the next one once it disconnects"""
+        from database.memoryDatabaseService import MemoryDatabaseService
+        
+        snapshot = str(tmp_path / "inventory.json")
+        db_service = MemoryDatabaseService(snapshot)
+        db_service.items.add_item("Saw", Category.Parts, 1)
+        with pytest.raises(RuntimeError):
+            MemoryDatabaseService(snapshot)
+        assert db_service.items.get_item(1).quantity == 1
+        db_service.disconnect()
+        
+        db_service = MemoryDatabaseService(snapshot)
+        assert db_service.items.get_item(1).name == "Saw"
+        db_service.disconnect()
+    
+    def test_periodic_snapshot_and_torn_journal_line(self, tmp_path):
+        """Test snapshots are taken in the background and a half written journal line is skipped"""
+        from database.memoryDatabaseService import MemoryDatabaseService
+        
+        snapshot = str(tmp_path / "inventory.json")
+        db_service = MemoryDatabaseService(snapshot, snapshot_seconds=0.05)
+        db_service.items.add_item("Saw", Category.Parts, 1)
+        deadline = time.monotonic() + 5
+        while db_service.snapshots == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert db_service.snapshots == 1
+        db_service.items.adjust_stock(1, 1)
+        db_service.disconnect()
+        with open(snapshot + ".journal", "a") as journal:
+            journal.write('{"next":[9,1],"rows":[["items",1,')
+        
+        db_service = MemoryDatabaseService(snapshot)
+        assert db_service.items.get_item(1).quantity == 2
+        assert db_service.items.next_id == 2
+        db_service.disconnect()
+    
+    def test_sqlite_files_are_imported_not_opened(self, test_database, tmp_path):
+        """Test a SQLite database is refused as a snapshot and imported with load_sqlite()"""
+        from database.memoryDatabaseService import MemoryDatabaseService
+        
+        DatabaseService(test_database).disconnect()
+        with pytest.raises(ValueError):
+            MemoryDatabaseService(test_database)
+        
+        db_service = MemoryDatabaseService(str(tmp_path / "inventory.json"))
+        db_service.items.add_item("Leftover", Category.Parts)
+        db_service.load_sqlite(test_database)
+        assert [item.name for item in db_service.items.get_all_items()] == ["Test Hammer"]
+        assert db_service.items.next_id == 2 and db_service.accounts.next_id == 2
+        db_service.disconnect()
+    
+    def test_get_db_uses_configured_backend(self, tmp_path):
+        """Test the shared service is created for the configured backend"""
+        from database import databaseService
+        from database.memoryDatabaseService import MemoryDatabaseService
+        
+        databaseService.configure(str(tmp_path / "inventory.json"), "memory")
+        try:
+            assert isinstance(databaseService.get_db(), MemoryDatabaseService)
+            with pytest.raises(ValueError):
+                databaseService.configure(backend="postgres")
+        finally:
+            databaseService.configure()
+        assert databaseService.db is None
+
 
 class TestAccountOperationsIntegration:
     """Integration tests for AccountOperations"""
     
+    @pytest.fixture
+    def db_service(self, store):
+        """Run every test against each storage backend"""
+        return store
+    
     def test_create_account(self, test_database):
         """Test creating a new account"""
         db_service = DatabaseService(test_database)
@@ -158,10 +1789,8 @@ class TestAccountOperationsIntegration:
         
         db_service.disconnect()
     
-    def test_get_account_by_username(self, test_database):
+    def test_get_account_by_username(self, db_service):
         """Test retrieving account by username and password hash"""
-        db_service = DatabaseService(test_database)
-        
         # Test with admin account from test data
         password_hash = "8c6976e5b5410415bde908bd4dee15dfb167a9c873fc4bb8a81f6f2ab448a918"
         account = db_service.accounts.get_account_by_username("admin", password_hash)
@@ -169,18 +1798,12 @@ class TestAccountOperationsIntegration:
         assert account is not None
         assert account.username == "admin"
         assert account.permission == AccountPermission.ADMIN
-        
-        db_service.disconnect()
     
-    def test_get_account_invalid_credentials(self, test_database):
+    def test_get_account_invalid_credentials(self, db_service):
         """Test retrieving account with invalid credentials returns None"""
-        db_service = DatabaseService(test_database)
-        
         account = db_service.accounts.get_account_by_username("admin", "wronghash")
         
         assert account is None
-        
-        db_service.disconnect()
     
     def test_delete_account(self, test_database):
         """Test deleting an account"""
@@ -214,11 +1837,16 @@ class TestAccountOperationsIntegration:
 class TestAuthenticationIntegration:
     """Integration tests for authentication flow"""
     
-    def test_successful_authentication_flow(self, test_database):
+    @pytest.fixture
+    def db_service(self, store):
+        """Run every test against each storage backend"""
+        return store
+    
+    def test_successful_authentication_flow(self, db_service):
         """Test complete authentication flow with real database"""
         from classes.auth import Authenticator
         
-        auth = Authenticator()
+        auth = Authenticator(db_service)
         
         # Test with admin credentials
         account = auth.find_account("admin", "admin")
@@ -227,11 +1855,108 @@ class TestAuthenticationIntegration:
         assert account.username == "admin"
         assert account.permission == AccountPermission.ADMIN
     
-    def test_failed_authentication_flow(self, test_database):
+    def test_failed_authentication_flow(self, db_service):
         """Test authentication failure with wrong credentials"""
         from classes.auth import Authenticator
         
-        auth = Authenticator()
+        auth = Authenticator(db_service)
         account = auth.find_account("admin", "wrongpassword")
         
-        assert account is None
\ No newline at end of file
+        assert account is None
+    
+    def test_legacy_hash_upgraded_on_login(self, db_service):
+        """Test logging in with a legacy SHA-256 hash stores a scrypt hash that works next time"""
+        from classes.auth import Authenticator
+        
+        auth = Authenticator(db_service, n=2 ** 8)
+        assert auth.find_account("admin", "admin") is not None
+        
+        stored = db_service.accounts.get_account("admin")
+        assert stored.kdf == "scrypt"
+        assert stored.salt is not None
+        assert stored.password_hash != "8c6976e5b5410415bde908bd4dee15dfb167a9c873fc4bb8a81f6f2ab448a918"
+        assert auth.find_account("admin", "admin").id == stored.id
+        assert auth.find_account("admin", "wrong") is None
+    
+    def test_create_account_and_login_from_threads(self, db_service):
+        """Test accounts created with scrypt can log in concurrently on the hashing threads"""
+        from classes.auth import Authenticator
+        
+        auth = Authenticator(db_service, n=2 ** 8)
+        auth.create_account("picker", "secret", AccountPermission.READ)
+        
+        auth.username_limiter = RateLimiter(capacity=20, refill_rate=1.0)
+        
+        futures = [auth.submit_find_account("picker", "secret" if n % 2 else "guess") for n in range(8)]
+        results = [future.result() for future in futures]
+        
+        assert [result is not None for result in results] == [n % 2 == 1 for n in range(8)]
+    
+    def test_repeated_failures_lock_account(self, db_service, monkeypatch):
+        """Test an account is locked after repeated wrong passwords, for every authenticator"""
+        from classes.auth import Authenticator, LoginRateLimitedError
+        
+        auth = Authenticator(db_service, n=2 ** 8, lockout_threshold=3)
+        auth.username_limiter = RateLimiter(capacity=20, refill_rate=1.0)
+        for _ in range(3):
+            assert auth.find_account("admin", "wrong", "10.0.0.1") is None
+        
+        # The lockout is stored, so a fresh authenticator refuses the same source too
+        other = Authenticator(db_service, n=2 ** 8)
+        with pytest.raises(LoginRateLimitedError):
+            other.find_account("admin", "admin", "10.0.0.1")
+        assert auth.counters()["lockouts"] == 1
+        assert other.counters()["refused_locked"] == 1
+        
+        # Other sources are not locked out by it
+        assert other.find_account("admin", "admin", "10.0.0.2") is not None
+        assert other.find_account("admin", "admin") is not None
+        
+        # Once the lockout expires the right password works and clears the record
+        later = time.time() + auth.lockout_seconds + 1
+        monkeypatch.setattr("classes.auth.time", Mock(time=lambda: later))
+        assert other.find_account("admin", "admin", "10.0.0.1") is not None
+        assert db_service.accounts.get_login_failures(1, "10.0.0.1") is None
+    
+    def test_menu_login_lockout_is_per_terminal(self, db_service, monkeypatch):
+        """Test a lockout caused by another source does not lock the menu out"""
+        from classes.auth import Authenticator
+        from classes.menu import Menu
+        
+        auth = Authenticator(db_service, n=2 ** 8, lockout_threshold=2)
+        for _ in range(2):
+            auth.find_account("admin", "wrong", "10.0.0.1")
+        
+        answers = iter(["admin", "admin"])
+        monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+        menu = Menu(db_service)
+        menu.login_page(1)
+        
+        assert menu.account is not None and menu.account.username == "admin"
+        assert menu.current_page == Page.MAIN
+    
+    def test_username_rate_limit(self, db_service):
+        """Test guessing faster than the limit is refused before any hashing"""
+        from classes.auth import Authenticator, LoginRateLimitedError
+        
+        auth = Authenticator(db_service, n=2 ** 8)
+        for _ in range(5):
+            auth.find_account("nobody", "guess")
+        with pytest.raises(LoginRateLimitedError):
+            auth.find_account("nobody", "guess")
+        
+        assert auth.counters()["username_limited"] == 1
+    
+    def test_throttled_source_keeps_username_tokens(self, db_service):
+        """Test a throttled source cannot drain another user's username bucket"""
+        from classes.auth import Authenticator, LoginRateLimitedError
+        
+        auth = Authenticator(db_service, n=2 ** 8)
+        auth.source_limiter = RateLimiter(capacity=1, refill_rate=0.001)
+        assert auth.find_account("admin", "wrong", "10.0.0.1") is None
+        for _ in range(10):
+            with pytest.raises(LoginRateLimitedError):
+                auth.find_account("admin", "wrong", "10.0.0.1")
+        
+        # Four of the five username tokens are left for the real user
+        assert auth.find_account("admin", "admin", "10.0.0.2") is not None
\ No newline at end of file
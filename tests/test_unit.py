@@ -9,6 +9,8 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from classes.item import Item
 from classes.account import Account
 from classes.auth import Authenticator
+from classes.rateLimiter import RateLimiter
+from database.itemTransfer import parse_record, read_csv, read_jsonl
 from enums.category import Category
 from enums.accountPermission import AccountPermission
 
@@ -29,6 +31,13 @@ class TestItemClass:
         assert item.quantity == 10
         assert item.defective_quantity == 2
     
+    def test_item_from_row(self):
+        """Test building a compact Item record from a database row"""
+        item = Item.from_row((1, "Test Tool", Category.Parts, 10, 2))
+        
+        assert (item.id, item.name, item.category, item.quantity, item.defective_quantity) == (1, "Test Tool", Category.Parts, 10, 2)
+        assert not hasattr(item, "__dict__")
+    
     def test_item_creation_negative_quantity_raises_error(self, mock_db):
         """Test Item creation with negative quantity raises ValueError"""
         with pytest.raises(ValueError, match="Quantity and defective quantity must be non-negative"):
@@ -42,29 +51,29 @@ class TestItemClass:
     def test_increase_quantity(self, mock_db):
         """Test increasing item quantity"""
         # Mock the database operations
-        mock_db.items.update_item = Mock()
+        mock_db.items.adjust_stock = Mock(return_value=(15, 2))
         
         item = Item(1, "Test Tool", Category.Parts, 10, 2)
         item.increase_quantity(5)
         
         assert item.quantity == 15
-        mock_db.items.update_item.assert_called_once_with(1, "Test Tool", Category.Parts, 15, 2)
+        mock_db.items.adjust_stock.assert_called_once_with(1, 5, 0)
     
     def test_decrease_quantity_valid(self, mock_db):
         """Test decreasing item quantity with valid amount"""
         # Mock the database operations
-        mock_db.items.update_item = Mock()
+        mock_db.items.adjust_stock = Mock(return_value=(7, 2))
         
         item = Item(1, "Test Tool", Category.Parts, 10, 2)
         item.decrease_quantity(3)
         
         assert item.quantity == 7
-        mock_db.items.update_item.assert_called_once_with(1, "Test Tool", Category.Parts, 7, 2)
+        mock_db.items.adjust_stock.assert_called_once_with(1, -3, 0)
     
     def test_decrease_quantity_insufficient_stock(self, mock_db):
         """Test decreasing item quantity below available stock raises error"""
-        # Mock the database operations
-        mock_db.items.update_item = Mock()
+        # The database refuses the update
+        mock_db.items.adjust_stock = Mock(return_value=None)
         
         item = Item(1, "Test Tool", Category.Parts, 10, 2)
         
@@ -73,25 +82,24 @@ class TestItemClass:
         
         # Verify quantity unchanged
         assert item.quantity == 10
-        # Ensure update_item was not called
-        mock_db.items.update_item.assert_not_called()
+        mock_db.items.adjust_stock.assert_called_once_with(1, -15, 0)
     
     def test_mark_defective_valid(self, mock_db):
         """Test marking items as defective with valid amount"""
         # Mock the database operations
-        mock_db.items.update_item = Mock()
+        mock_db.items.adjust_stock = Mock(return_value=(7, 5))
         
         item = Item(1, "Test Tool", Category.Parts, 10, 2)
         item.mark_defective(3)
         
         assert item.quantity == 7
         assert item.defective_quantity == 5
-        mock_db.items.update_item.assert_called_once_with(1, "Test Tool", Category.Parts, 7, 5)
+        mock_db.items.adjust_stock.assert_called_once_with(1, -3, 3)
     
     def test_mark_defective_insufficient_stock(self, mock_db):
         """Test marking more items as defective than available raises error"""
-        # Mock the database operations
-        mock_db.items.update_item = Mock()
+        # The database refuses the update
+        mock_db.items.adjust_stock = Mock(return_value=None)
         
         item = Item(1, "Test Tool", Category.Parts, 10, 2)
         
@@ -101,24 +109,24 @@ class TestItemClass:
         # Verify quantities unchanged
         assert item.quantity == 10
         assert item.defective_quantity == 2
-        mock_db.items.update_item.assert_not_called()
+        mock_db.items.adjust_stock.assert_called_once_with(1, -15, 15)
     
     def test_repair_defective_valid(self, mock_db):
         """Test repairing defective items with valid amount"""
         # Mock the database operations
-        mock_db.items.update_item = Mock()
+        mock_db.items.adjust_stock = Mock(return_value=(13, 2))
         
         item = Item(1, "Test Tool", Category.Parts, 10, 5)
         item.repair_defective(3)
         
         assert item.quantity == 13
         assert item.defective_quantity == 2
-        mock_db.items.update_item.assert_called_once_with(1, "Test Tool", Category.Parts, 13, 2)
+        mock_db.items.adjust_stock.assert_called_once_with(1, 3, -3)
     
     def test_repair_defective_insufficient_defective(self, mock_db):
         """Test repairing more defective items than available raises error"""
-        # Mock the database operations
-        mock_db.items.update_item = Mock()
+        # The database refuses the update
+        mock_db.items.adjust_stock = Mock(return_value=None)
         
         item = Item(1, "Test Tool", Category.Parts, 10, 5)
         
@@ -128,7 +136,17 @@ class TestItemClass:
         # Verify quantities unchanged
         assert item.quantity == 10
         assert item.defective_quantity == 5
-        mock_db.items.update_item.assert_not_called()
+        mock_db.items.adjust_stock.assert_called_once_with(1, 8, -8)
+    
+    def test_negative_amount_raises_error(self, mock_db):
+        """Test negative amounts are rejected before touching the database"""
+        mock_db.items.adjust_stock = Mock()
+        
+        item = Item(1, "Test Tool", Category.Parts, 10, 2)
+        
+        with pytest.raises(ValueError, match="Amount must be non-negative"):
+            item.increase_quantity(-1)
+        mock_db.items.adjust_stock.assert_not_called()
 
 
 class TestAccountClass:
@@ -142,6 +160,14 @@ class TestAccountClass:
         assert account.username == "testuser"
         assert account.password_hash == "hashed_password"
         assert account.permission == AccountPermission.WRITE
+    
+    def test_account_from_row(self):
+        """Test building a compact Account record from a database row"""
+        account = Account.from_row((1, "testuser", "hashed_password", AccountPermission.WRITE, "sha256", None, None))
+        
+        assert account.username == "testuser"
+        assert account.password_hash == "hashed_password"
+        assert not hasattr(account, "__dict__")
 
 
 class TestAuthenticatorClass:
@@ -170,24 +196,140 @@ class TestAuthenticatorClass:
     
     def test_find_account_success(self):
         """Test successful account finding"""
-        mock_account = Account(1, "testuser", "hashed_password", AccountPermission.WRITE)
+        auth = Authenticator(n=2 ** 8)
+        password_hash, salt, kdf_params = auth.new_hash("password123")
+        mock_account = Account(1, "testuser", password_hash, AccountPermission.WRITE, "scrypt", salt, kdf_params)
         
         with patch('database.databaseService.db') as mock_db:
-            mock_db.accounts.get_account_by_username.return_value = mock_account
+            mock_db.accounts.get_account.return_value = mock_account
+            mock_db.accounts.get_login_failures.return_value = None
             
-            auth = Authenticator()
             account = auth.find_account("testuser", "password123")
             
             assert account is not None
             assert account.username == "testuser"
             assert account.permission == AccountPermission.WRITE
+            mock_db.accounts.get_account.assert_called_once_with("testuser")
+            mock_db.accounts.update_password_hash.assert_not_called()
+    
+    def test_find_account_wrong_password(self):
+        """Test account finding with the wrong password"""
+        auth = Authenticator(n=2 ** 8)
+        password_hash, salt, kdf_params = auth.new_hash("password123")
+        mock_account = Account(1, "testuser", password_hash, AccountPermission.WRITE, "scrypt", salt, kdf_params)
+        
+        with patch('database.databaseService.db') as mock_db:
+            mock_db.accounts.get_account.return_value = mock_account
+            mock_db.accounts.get_login_failures.return_value = None
+            
+            assert auth.find_account("testuser", "password124") is None
     
     def test_find_account_not_found(self):
         """Test account finding when account doesn't exist"""
         with patch('database.databaseService.db') as mock_db:
-            mock_db.accounts.get_account_by_username.return_value = None
+            mock_db.accounts.get_account.return_value = None
             
-            auth = Authenticator()
+            auth = Authenticator(n=2 ** 8)
             account = auth.find_account("nonexistent", "wrongpassword")
             
-            assert account is None
\ No newline at end of file
+            assert account is None
+    
+    def test_find_account_rehashes_legacy_hash(self):
+        """Test a legacy SHA-256 hash is replaced by a salted scrypt hash on login"""
+        auth = Authenticator(n=2 ** 8)
+        legacy = Account(1, "testuser", auth.hash_password("password123"), AccountPermission.WRITE)
+        
+        with patch('database.databaseService.db') as mock_db:
+            mock_db.accounts.get_account.return_value = legacy
+            mock_db.accounts.get_login_failures.return_value = None
+            
+            account = auth.find_account("testuser", "password123")
+            
+            assert account.kdf == "scrypt"
+            assert account.kdf_params == "n=256,r=8,p=1"
+            assert auth.verify(account, "password123")
+            mock_db.accounts.update_password_hash.assert_called_once_with(
+                1, account.password_hash, "scrypt", account.salt, account.kdf_params, 0
+            )
+    
+    def test_new_hash_is_salted(self):
+        """Test the same password hashes differently for different accounts"""
+        auth = Authenticator(n=2 ** 8)
+        
+        first = auth.new_hash("password123")
+        second = auth.new_hash("password123")
+        
+        assert first[0] != second[0]
+        assert first[1] != second[1]
+        assert Authenticator.derive("password123", first[1], first[2]) == first[0]
+
+
+class TestRateLimiterClass:
+    """Unit tests for RateLimiter class"""
+    
+    def test_bucket_empties_and_refills(self):
+        """Test a key is limited after its capacity and recovers at the refill rate"""
+        limiter = RateLimiter(capacity=2, refill_rate=0.5)
+        
+        assert limiter.allow("user", now=0.0)
+        assert limiter.allow("user", now=0.0)
+        assert not limiter.allow("user", now=0.0)
+        assert limiter.retry_after("user", now=0.0) == 2.0
+        assert limiter.allow("user", now=2.0)
+        assert limiter.stats()["limited"] == 1
+    
+    def test_keys_are_independent(self):
+        """Test one key running out does not limit another"""
+        limiter = RateLimiter(capacity=1, refill_rate=0.1)
+        
+        assert limiter.allow("a", now=0.0)
+        assert not limiter.allow("a", now=0.0)
+        assert limiter.allow("b", now=0.0)
+    
+    def test_bounded_memory(self):
+        """Test the number of tracked keys never exceeds the bound, dropping expired ones first"""
+        limiter = RateLimiter(capacity=1, refill_rate=1.0, max_keys=3, ttl=10.0)
+        
+        for n in range(10):
+            limiter.allow(f"user{n}", now=float(n))
+        assert limiter.stats()["keys"] == 3
+        
+        limiter.allow("late", now=100.0)
+        assert limiter.stats()["keys"] == 1
+        assert limiter.stats()["evictions"] == 10
+
+
+class TestItemTransferParsing:
+    """Unit tests for import record parsing"""
+    
+    def test_parse_csv_record(self):
+        """Test CSV strings are converted and categories may be given by name"""
+        assert parse_record({"name": " Hammer ", "category": "Parts", "quantity": "4", "defective_quantity": ""}) == ("Hammer", Category.Parts, 4, 0)
+        assert parse_record({"name": "Glue", "category": "2", "quantity": "1"}) == ("Glue", Category.Consumables, 1, 0)
+    
+    def test_parse_json_record(self):
+        """Test JSON-lines text is decoded before validation"""
+        assert parse_record('{"name": "Saw", "category": 1, "quantity": 2, "defective_quantity": 1}') == ("Saw", 1, 2, 1)
+    
+    @pytest.mark.parametrize("record, reason", [
+        ('{"name": "Saw",', "Invalid JSON"),
+        ("[1, 2]", "Record must be an object"),
+        ({"category": 1}, "name is required"),
+        ({"name": "Saw", "category": 9}, "Unknown category"),
+        ({"name": "Saw", "category": 1, "quantity": "lots"}, "quantity must be an integer"),
+        ({"name": "Saw", "category": 1, "quantity": -1}, "must be non-negative"),
+    ])
+    def test_parse_rejects_invalid_records(self, record, reason):
+        """Test invalid records raise ValueError with the reason"""
+        with pytest.raises(ValueError, match=reason):
+            parse_record(record)
+    
+    def test_readers_yield_line_numbers(self):
+        """Test readers report the file line of each record, skipping blank JSON lines"""
+        import io
+        
+        csv_file = io.StringIO("name,category,quantity\nHammer,1,3\nSaw,1,2\n")
+        assert [line for line, _ in read_csv(csv_file)] == [2, 3]
+        jsonl_file = io.StringIO('{"name": "Hammer"}\n\n{"name": "Saw"}\n')
+        assert [line for line, _ in read_jsonl(jsonl_file)] == [1, 3]
+